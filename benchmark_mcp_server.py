@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pvfUtility MCP服务器基准测试
+在本地启动模拟的pvfUtility WebApi(合成封包，可配置文件数、文件大小和延迟)，
+通过PvfUtilityMCPServer运行典型的工作负载，报告延迟分位数、吞吐量和峰值内存
+
+用法:
+    python benchmark_mcp_server.py --files 5000 --latency 5 --output run.json
+    python benchmark_mcp_server.py --compare run.json
+    python benchmark_mcp_server.py --serve --port 27000   # 仅运行模拟WebApi
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from mcp_server import PvfUtilityMCPServer
+
+logger = logging.getLogger("pvfutility-benchmark")
+
+# 合成封包的目录及文件后缀
+MOCK_DIRECTORIES = {
+    "equipment": ".equ",
+    "monster": ".mob",
+    "skill": ".skl",
+    "stackable": ".stk"
+}
+# 搜索工作负载使用的关键字(每个文件都包含[name]，约1/10的文件包含rare)
+SEARCH_KEYWORDS = ["rare", "[minimum level]", "Item 42"]
+
+
+class MockPvfUtility:
+    """内存中的合成封包及/Api/PvfUtiltiy/*接口的模拟实现"""
+
+    def __init__(self, files: int = 2000, file_size: int = 512, latency: float = 0.0, seed: int = 1):
+        """
+        初始化模拟WebApi
+
+        Args:
+            files: 合成文件总数，平均分配到各目录
+            file_size: 每个脚本文件的大致字节数
+            latency: 每个请求注入的延迟秒数
+            seed: 生成内容的随机种子
+        """
+        self.latency = latency
+        self.pack_path = "C:/benchmark/Script.pvf"
+        self.calls: Dict[str, int] = {}
+        self.files: Dict[str, str] = {}
+        self.lst: Dict[str, Dict[str, str]] = {}
+        rng = random.Random(seed)
+        per_dir = max(1, files // len(MOCK_DIRECTORIES))
+        for dir_name, suffix in MOCK_DIRECTORIES.items():
+            codes = {}
+            for i in range(per_dir):
+                path = f"{dir_name}/{dir_name}_{i}{suffix}"
+                self.files[path] = self._make_script(rng, i, file_size)
+                codes[str(10000 + i)] = f"{dir_name}_{i}{suffix}"
+            lst_path = f"{dir_name}/{dir_name}.lst"
+            self.lst[lst_path] = codes
+            self.files[lst_path] = "#PVF_File\r\n" + "".join(f"{c}\t`{p}`\r\n" for c, p in codes.items())
+        self.strings = [f"string_{i}" for i in range(len(self.files))]
+
+    @staticmethod
+    def _make_script(rng: random.Random, index: int, size: int) -> str:
+        """生成一个大致为size字节的脚本"""
+        head = (
+            f"#PVF_File\r\n\r\n[name]\r\n\t`Item {index}`\r\n\r\n"
+            f"[minimum level]\r\n\t{rng.randint(1, 90)}\r\n\r\n[grade]\r\n\t{rng.randint(0, 4)}\r\n\r\n"
+        )
+        if rng.random() < 0.1:
+            head += "[rarity]\r\n\t`rare`\r\n\r\n"
+        words = []
+        length = len(head)
+        while length < size:
+            word = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+            words.append(word)
+            length += len(word) + 1
+        return head + "[explain]\r\n\t`" + " ".join(words) + "`\r\n"
+
+    @staticmethod
+    def _ok(data: Any) -> web.Response:
+        return web.json_response({"Data": data, "IsError": False, "Msg": None})
+
+    @staticmethod
+    def _error(msg: str) -> web.Response:
+        return web.json_response({"Data": None, "IsError": True, "Msg": msg})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """按接口名分发请求"""
+        name = request.match_info["name"]
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        q = request.query
+        files = self.files
+
+        if name == "getVersion":
+            return self._ok("benchmark")
+        if name == "GetPvfPackFilePath":
+            return self._ok(self.pack_path)
+        if name == "getPvfRootDirectory":
+            return self._ok(sorted({p.split("/")[0] for p in files if "/" in p}))
+        if name == "GetFileList":
+            prefix = q.get("dirName", "").strip("/").lower()
+            prefix = prefix + "/" if prefix else ""
+            suffix = q.get("fileType", "")
+            return self._ok([p for p in files if p.startswith(prefix) and p.endswith(suffix)])
+        if name in ("GetFileContent", "getFileData"):
+            path = q.get("filePath", "").lower()
+            return self._ok(files[path]) if path in files else self._error("文件不存在")
+        if name == "GetFileContents":
+            body = await request.json()
+            return self._ok({p: files.get(p.lower()) for p in body.get("FileList", [])})
+        if name == "FileIsExists":
+            return self._ok(q.get("filePath", "").lower() in files)
+        if name == "FolderIsExists":
+            prefix = q.get("folderPath", "").strip("/").lower() + "/"
+            return self._ok(any(p.startswith(prefix) for p in files))
+        if name == "DeleteFile":
+            files.pop(q.get("filePath", "").lower(), None)
+            return self._ok(True)
+        if name == "DeleteFiles":
+            for path in await request.json():
+                files.pop(path.lower(), None)
+            return self._ok(True)
+        if name == "ImportFile":
+            files[q.get("filePath", "").lower()] = await request.text()
+            return self._ok(True)
+        if name == "ImportFiles":
+            for entry in await request.json():
+                files[entry["FilePath"].lower()] = entry["FileContent"]
+            return self._ok(True)
+        if name == "SearchPvf":
+            body = await request.json()
+            folder = (body.get("SearchFolder") or "").strip("/").lower()
+            keyword = body.get("Keyword") or ""
+            # pvfUtility的脚本内容搜索不区分大小写
+            if body.get("UseRegularExpression"):
+                pattern = re.compile(keyword, re.IGNORECASE)
+                hits = [p for p, c in files.items() if p.startswith(folder) and pattern.search(c)]
+            else:
+                hits = [p for p, c in files.items() if p.startswith(folder) and keyword.lower() in c.lower()]
+            return self._ok(hits)
+        if name == "GetAllLstFileList":
+            return self._ok(sorted(self.lst))
+        if name == "getLstFileInfo":
+            return self._ok(self.lst.get(q.get("filePath", "").lower(), {}))
+        if name == "getStringTable":
+            return self._ok(self.strings)
+        if name == "GetItemInfo":
+            return self._ok({"ItemCode": 0, "ItemName": q.get("filePath")})
+        if name == "GetItemInfos":
+            paths = await request.json()
+            return self._ok([{"FilePath": p, "ItemCode": i, "ItemName": p} for i, p in enumerate(paths)])
+        if name == "ItemCodeToFileInfo":
+            code = q.get("itemCode", "")
+            lsts = self._select_lsts(q.get("lstNames", "").split(","))
+            return self._ok([
+                {"ItemCode": int(code), "FilePath": f"{lst.rsplit('/', 1)[0]}/{codes[code]}"}
+                for lst, codes in lsts if code in codes
+            ])
+        if name == "ItemCodesToFileInfos":
+            body = await request.json()
+            lsts = self._select_lsts(body.get("lstNames") or [])
+            return self._ok([
+                {"ItemCode": code, "FilePath": f"{lst.rsplit('/', 1)[0]}/{codes[str(code)]}"}
+                for code in body.get("ItemCodes", [])
+                for lst, codes in lsts if str(code) in codes
+            ])
+        if name == "getFileIcon":
+            return self._ok("")
+        if name == "SaveAsPvfFile":
+            return self._ok(True)
+        return web.json_response({"Data": None, "IsError": True, "Msg": f"未知接口: {name}"}, status=404)
+
+    def _select_lsts(self, names: List[str]) -> List[Tuple[str, Dict[str, str]]]:
+        """按LST名称(不含目录和后缀)筛选LST，未给出名称时返回全部"""
+        wanted = {n.strip().lower() for n in names if n.strip()}
+        return [(lst, codes) for lst, codes in self.lst.items()
+                if not wanted or lst.rsplit("/", 1)[-1][:-4] in wanted]
+
+    def make_app(self) -> web.Application:
+        """创建aiohttp应用"""
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route("*", "/Api/PvfUtiltiy/{name}", self.handle)
+        return app
+
+
+# 工作负载：每个函数返回一次"代理操作"需要依次调用的 (工具名, 参数) 列表
+Workload = Callable[[random.Random, List[str]], List[Tuple[str, dict]]]
+
+
+def _browse(rng: random.Random, paths: List[str]) -> List[Tuple[str, dict]]:
+    """浏览：列目录、检查文件存在并读取一个文件"""
+    path = rng.choice(paths)
+    return [
+        ("get_file_list", {"dir_name": path.split("/")[0], "file_type": path.rsplit(".", 1)[-1]}),
+        ("file_exists", {"file_path": path}),
+        ("get_file_content", {"file_path": path})
+    ]
+
+
+def _read_batch(rng: random.Random, paths: List[str]) -> List[Tuple[str, dict]]:
+    """批量读取200个随机文件"""
+    return [("get_file_contents_batch", {"file_list": rng.sample(paths, min(200, len(paths)))})]
+
+
+def _search(rng: random.Random, paths: List[str]) -> List[Tuple[str, dict]]:
+    """全封包关键字搜索"""
+    return [("search_pvf", {"keyword": rng.choice(SEARCH_KEYWORDS), "search_folder": ""})]
+
+
+def _items(rng: random.Random, paths: List[str]) -> List[Tuple[str, dict]]:
+    """物品代码与文件信息互查"""
+    return [
+        ("item_code_to_file_info", {"lst_names": "equipment", "item_code": 10000 + rng.randrange(100)}),
+        ("get_item_infos_batch", {"file_paths": rng.sample(paths, min(50, len(paths)))})
+    ]
+
+
+def _edit(rng: random.Random, paths: List[str]) -> List[Tuple[str, dict]]:
+    """读取-修改-写回单个文件后再次读取"""
+    path = rng.choice(paths)
+    content = f"#PVF_File\r\n\r\n[name]\r\n\t`Edited {rng.random()}`\r\n"
+    return [
+        ("get_file_content", {"file_path": path}),
+        ("import_file", {"file_path": path, "file_content": content}),
+        ("get_file_content", {"file_path": path})
+    ]
+
+
+def _strings(rng: random.Random, paths: List[str]) -> List[Tuple[str, dict]]:
+    """读取字符串表"""
+    return [("get_string_table", {})]
+
+
+WORKLOADS: Dict[str, Workload] = {
+    "browse": _browse,
+    "read_batch": _read_batch,
+    "search": _search,
+    "items": _items,
+    "edit": _edit,
+    "strings": _strings
+}
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    """返回当前进程的峰值常驻内存字节数，无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux以KB为单位，macOS以字节为单位
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    except ImportError:
+        return None
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    """计算分位数(毫秒)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))
+    return round(ordered[index] * 1000, 3)
+
+
+async def _run_workload(server: PvfUtilityMCPServer, workload: Workload, paths: List[str],
+                        iterations: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    """以concurrency个并发代理执行iterations次操作，统计每次工具调用的延迟"""
+    samples: List[float] = []
+    errors = 0
+    counter = iter(range(iterations))
+
+    async def agent(agent_id: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + agent_id)
+        for _ in counter:
+            for tool_name, arguments in workload(rng, paths):
+                started = time.perf_counter()
+                text = await server._run_tool(tool_name, arguments)
+                samples.append(time.perf_counter() - started)
+                if text.startswith("错误:") or '"IsError":true' in text.replace(" ", ""):
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(agent(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": len(samples),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": _percentile(samples, 0.5),
+        "p99_ms": _percentile(samples, 0.99),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0
+    }
+
+
+def _free_port() -> int:
+    """获取一个空闲的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(base_url: str, timeout: float = 60.0):
+    """等待模拟WebApi可用"""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/Api/PvfUtiltiy/getVersion") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise Exception(f"模拟WebApi在 {timeout} 秒内未启动")
+            await asyncio.sleep(0.1)
+
+
+def _parse_server_options(options: List[str]) -> Dict[str, Any]:
+    """解析 key=value 形式的服务器参数，值按JSON解析，失败时作为字符串"""
+    kwargs = {}
+    for option in options:
+        key, _, value = option.partition("=")
+        try:
+            kwargs[key.strip()] = json.loads(value)
+        except ValueError:
+            kwargs[key.strip()] = value
+    return kwargs
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """启动模拟WebApi子进程并依次运行所选工作负载"""
+    port = args.port or _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    # 模拟WebApi在独立进程中运行，峰值内存和CPU只统计MCP服务器
+    mock = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+        "--files", str(args.files), "--file-size", str(args.file_size),
+        "--latency", str(args.latency), "--seed", str(args.seed)
+    ])
+    try:
+        await _wait_ready(base_url)
+        server_kwargs = _parse_server_options(args.server_option)
+        results = {}
+        async with PvfUtilityMCPServer(base_url, **server_kwargs) as server:
+            paths = []
+            for dir_name, suffix in MOCK_DIRECTORIES.items():
+                listing = await server._run_tool("get_file_list", {"dir_name": dir_name, "file_type": suffix})
+                paths.extend(json.loads(listing)["Data"])
+            for name in args.workloads:
+                results[name] = await _run_workload(
+                    server, WORKLOADS[name], paths, args.iterations, args.concurrency, args.seed)
+                logger.info(f"{name}: {results[name]}")
+            upstream = {
+                endpoint: stats["count"]
+                for endpoint, stats in server.metrics.stats()["endpoints"].items()
+            }
+    finally:
+        mock.terminate()
+        mock.wait()
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {
+            "files": args.files,
+            "file_size": args.file_size,
+            "latency_ms": args.latency * 1000,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "server_options": server_kwargs
+        },
+        "workloads": results,
+        "upstream_requests": upstream,
+        "peak_rss_bytes": _peak_rss_bytes()
+    }
+
+
+def _print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """打印结果表格，提供基准结果时附带变化百分比"""
+    def delta(name: str, key: str, value: float) -> str:
+        if not baseline or name not in baseline.get("workloads", {}):
+            return ""
+        old = baseline["workloads"][name].get(key)
+        if not old:
+            return ""
+        return f" ({(value - old) / old * 100:+.1f}%)"
+
+    print(f"{'工作负载':<12}{'调用数':>8}{'错误':>6}{'p50(ms)':>22}{'p99(ms)':>22}{'吞吐(次/秒)':>24}")
+    for name, r in report["workloads"].items():
+        print(f"{name:<12}{r['calls']:>8}{r['errors']:>6}"
+              f"{str(r['p50_ms']) + delta(name, 'p50_ms', r['p50_ms']):>22}"
+              f"{str(r['p99_ms']) + delta(name, 'p99_ms', r['p99_ms']):>22}"
+              f"{str(r['throughput']) + delta(name, 'throughput', r['throughput']):>24}")
+    rss = report.get("peak_rss_bytes")
+    line = f"峰值内存: {rss / 1024 / 1024:.1f} MB" if rss else "峰值内存: 无法获取"
+    if rss and baseline and baseline.get("peak_rss_bytes"):
+        line += f" ({(rss - baseline['peak_rss_bytes']) / baseline['peak_rss_bytes'] * 100:+.1f}%)"
+    print(line)
+    print(f"上游请求数: {sum(report['upstream_requests'].values())}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="pvfUtility MCP服务器基准测试")
+    parser.add_argument("--files", type=int, default=2000, help="合成封包的文件数 (默认: 2000)")
+    parser.add_argument("--file-size", type=int, default=512, help="每个脚本文件的大致字节数 (默认: 512)")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟WebApi每个请求的延迟秒数 (默认: 0)")
+    parser.add_argument("--iterations", type=int, default=200, help="每个工作负载的操作次数 (默认: 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发代理数 (默认: 8)")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子 (默认: 1)")
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=list(WORKLOADS),
+                        help="要运行的工作负载 (默认: 全部)")
+    parser.add_argument("--server-option", action="append", default=[],
+                        help="传给PvfUtilityMCPServer的参数，形如 key=value，可重复，如 cache_max_bytes=0")
+    parser.add_argument("--output", default=None, help="将结果写入该JSON文件")
+    parser.add_argument("--compare", default=None, help="与之前保存的JSON结果比较")
+    parser.add_argument("--port", type=int, default=0, help="模拟WebApi端口，默认自动选择")
+    parser.add_argument("--serve", action="store_true", help="仅运行模拟WebApi")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.serve:
+        mock = MockPvfUtility(args.files, args.file_size, args.latency, args.seed)
+        web.run_app(mock.make_app(), host="127.0.0.1", port=args.port or 27000, print=None,
+                    access_log=None)
+        return
+
+    logger.setLevel(logging.INFO)
+    logging.getLogger("pvfutility-mcp").setLevel(logging.WARNING)
+    report = asyncio.run(run_benchmark(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
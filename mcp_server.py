@@ -8,12 +8,36 @@ pvfUtility WebApi MCP Server
 版本: 1.0.0
 """
 
+from __future__ import annotations
+
+import time
+
+# 启动耗时的计时起点(不含解释器自身启动)，其后的全部导入计入_IMPORT_SECONDS
+_MODULE_STARTED = time.perf_counter()
+
 import asyncio
+import base64
+import bisect
+import contextvars
+import hashlib
 import json
 import logging
-from typing import Any, Dict, List, Optional, Union
+import os
+import posixpath
+import random
+import re
+import secrets
+import struct
+import sys
+import threading
+import weakref
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, closing
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 from urllib.parse import quote, urlencode
-import aiohttp
+
 from mcp.server.models import InitializationOptions
 from mcp.server import NotificationOptions, Server
 from mcp.types import (
@@ -22,644 +46,6348 @@ from mcp.types import (
 )
 import mcp.types as types
 
+# aiohttp在首次建立会话时导入，后台启动时在线程中导入，不阻塞MCP握手
+aiohttp = None
+
+
+def _import_aiohttp():
+    """导入aiohttp并绑定到模块全局变量"""
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as module
+        aiohttp = module
+    return aiohttp
+
+
+# 仅由可选功能使用的标准库模块在使用时导入：sqlite3(索引持久化)、mmap(离线读取)
+if TYPE_CHECKING:
+    import sqlite3
+
+
+def _sqlite_connect(db_path: str) -> sqlite3.Connection:
+    """打开索引持久化文件(首次使用时导入sqlite3)"""
+    import sqlite3
+    return sqlite3.connect(db_path)
+
+
+# 可选的高性能JSON库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("pvfutility-mcp")
 
-class PvfUtilityMCPServer:
-    """pvfUtility WebApi MCP服务器"""
+# 默认文件内容缓存上限 (字节)
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 默认封包路径校验间隔 (秒)
+DEFAULT_PACK_CHECK_INTERVAL = 10.0
+# 默认物品信息缓存条目上限
+DEFAULT_RECORD_CACHE_ENTRIES = 50000
+# 默认批量请求分块大小及最大并发块数
+DEFAULT_BATCH_CHUNK_SIZE = 500
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# 默认连接池设置
+DEFAULT_POOL_SIZE = 100
+DEFAULT_POOL_PER_HOST = 16
+DEFAULT_KEEPALIVE_TIMEOUT = 60.0
+DEFAULT_DNS_CACHE_TTL = 300
+# 默认超时 (秒)：元数据类接口 / 普通接口 / 重型接口
+DEFAULT_FAST_TIMEOUT = 10.0
+DEFAULT_REQUEST_TIMEOUT = 60.0
+DEFAULT_HEAVY_TIMEOUT = 600.0
+
+# 元数据类快速接口
+FAST_TOOLS = frozenset({
+    "get_version", "get_pvf_root_directory", "get_pvf_pack_file_path",
+    "file_exists", "folder_exists"
+})
+# 搜索、另存为及批量读写等重型接口
+HEAVY_TOOLS = frozenset({
+    "search_pvf", "save_as_pvf", "get_file_contents_batch", "get_string_table",
+    "import_files_batch", "delete_files_batch", "get_item_infos_batch",
+    "item_codes_to_file_infos_batch", "get_all_lst_file_list"
+})
+
+# 默认流式解析阈值 (字节)：超过该大小或长度未知的响应使用ijson增量解析
+DEFAULT_STREAM_JSON_THRESHOLD = 16 * 1024 * 1024
+
+# 分页结果集默认设置
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_RESULT_TTL = 300.0
+DEFAULT_RESULT_SETS = 32
+
+# 支持分页访问的工具
+PAGED_TOOLS = frozenset({"get_file_list", "get_string_table", "get_all_lst_file_list", "search_pvf"})
+# 分页参数的输入定义
+PAGING_PROPERTIES = {
+    "offset": {
+        "type": "integer",
+        "description": "分页起始位置，指定offset/limit/handle任一参数时按页返回",
+        "default": 0
+    },
+    "limit": {
+        "type": "integer",
+        "description": f"每页条目数 (默认: {DEFAULT_PAGE_SIZE})"
+    },
+    "handle": {
+        "type": "string",
+        "description": "上一页返回的结果句柄，用于从服务器缓存中继续读取而不重新查询"
+    }
+}
+
+# 工具结果输出格式：缩进JSON、紧凑JSON、列式表格(记录列表)、gzip+base64或msgpack内嵌资源
+OUTPUT_MODES = ("pretty", "compact", "columnar", "gzip", "msgpack")
+# gzip/msgpack格式下，紧凑JSON超过该字节数时才以内嵌资源返回
+DEFAULT_EMBED_THRESHOLD = 64 * 1024
+# 所有工具均可使用的输出格式参数
+OUTPUT_MODE_PROPERTY = {
+    "type": "string",
+    "enum": list(OUTPUT_MODES),
+    "description": "本次调用的输出格式：pretty缩进JSON；compact紧凑JSON；columnar将记录列表输出为columns+rows表格；"
+                   "gzip/msgpack在结果较大时以base64内嵌资源返回，默认使用服务器设置"
+}
+
+# 会修改封包内容的写类工具，不参与请求合并
+WRITE_TOOLS = frozenset({
+    "import_file", "import_files_batch", "delete_file", "delete_files_batch", "save_as_pvf"
+})
+
+# 写缓冲默认设置：达到条目数或等待时间后批量提交
+DEFAULT_WRITE_BATCH_SIZE = 100
+DEFAULT_WRITE_DELAY = 0.1
+
+# 上游请求重试、熔断与对冲默认设置
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.2
+DEFAULT_RETRY_MAX_BACKOFF = 5.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 10.0
+
+# 目录镜像：清单文件名及每组读取/写回的文件数
+MIRROR_MANIFEST = ".pvf_manifest.json"
+DEFAULT_SYNC_GROUP_SIZE = 2000
+
+# 上游请求准入分级，按优先级从高到低排列：另存为(独占)、元数据、写入、普通读取、批量读取、搜索
+ADMISSION_CLASSES = ("exclusive", "fast", "write", "read", "bulk", "search")
+# 各分级默认并发上限，0为不限制；另存为始终独占执行
+DEFAULT_ADMISSION_LIMITS = {"fast": 16, "write": 4, "read": 8, "bulk": 4, "search": 1}
+
+# 引用图：下列标签(完整标签名，小写)下的整数视为引用的代码，(分类, 标签名, 解析代码的LST名称)；
+# 代码只在该分类自己的LST中解析，如[item]下的整数只对应equipment/stackable中的条目
+REFERENCE_CATEGORIES = (
+    ("monster", ("[monster]", "[monster index]", "[summon monster]"), ("monster",)),
+    ("dungeon", ("[dungeon]", "[dungeon index]"), ("dungeon",)),
+    ("skill", ("[skill]", "[skill index]"), ("skill",)),
+    ("quest", ("[quest]", "[quest index]"), ("quest",)),
+    ("npc", ("[npc]", "[npc index]"), ("npc",)),
+    ("map", ("[map]", "[map index]"), ("map",)),
+    ("creature", ("[creature]",), ("creature",)),
+    ("item", ("[item]", "[item index]", "[reward item]", "[drop item]", "[material]", "[equipment]",
+              "[stackable]"), ("equipment", "stackable")),
+)
+# 代码引用是按标签名推断的，查询结果中附带该说明
+REFERENCE_HEURISTIC_NOTE = ("代码引用为启发式推断：REFERENCE_CATEGORIES所列标签下的正整数按该分类的LST解析为文件，"
+                            "可能包含误判(数值并非代码)或遗漏(标签不在表中)；路径引用不受影响")
+# 引用图构建时每组读取的文件数
+DEFAULT_REFERENCE_SCAN_GROUP = 2000
+
+# 网络传输模式默认监听地址，及按客户端统计保留的最大客户端数
+DEFAULT_HTTP_HOST = "127.0.0.1"
+DEFAULT_HTTP_PORT = 8000
+DEFAULT_CLIENT_STATS = 256
+
+# 当前工具调用所属的客户端，用于按客户端统计上游请求
+_CURRENT_CLIENT: contextvars.ContextVar[str] = contextvars.ContextVar("pvf_mcp_client", default="local")
+# 为真时请求必须由WebApi响应，不使用离线读取器(写回、回滚和镜像清单的基准内容)
+_UPSTREAM_ONLY: contextvars.ContextVar[bool] = contextvars.ContextVar("pvf_mcp_upstream_only", default=False)
+
+# 耗时直方图的桶上界(毫秒)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, float("inf"))
+# 保留的最近性能分析结果数及每份结果的函数行数
+DEFAULT_PROFILE_KEEP = 20
+DEFAULT_PROFILE_LINES = 25
+# 采样分析器每次采集的最大栈深度及报告的函数数
+DEFAULT_SAMPLE_DEPTH = 64
+DEFAULT_SAMPLE_TOP = 30
+
+# 不涉及封包文件内容、无需先提交写缓冲的工具
+PACK_INDEPENDENT_TOOLS = frozenset({
+    "get_version", "get_pvf_pack_file_path", "get_cache_stats", "get_server_stats", "get_string_table",
+    "get_string", "get_strings_batch", "find_strings"
+})
+
+# 离线PVF读取器可直接响应的只读工具：只包含本地结果与WebApi形态一致的工具，
+# LST信息和字符串表的上游记录形态无法由封包数据还原，始终由WebApi响应
+OFFLINE_TOOLS = frozenset({
+    "get_file_list", "get_file_content", "get_file_contents_batch", "file_exists", "folder_exists",
+    "get_all_lst_file_list", "get_pvf_root_directory", "get_pvf_pack_file_path"
+})
+
+# 支持自动分块的批量工具 -> 键列表所在的参数名
+BATCH_LIST_ARGS = {
+    "get_file_contents_batch": "file_list",
+    "import_files_batch": "files",
+    "delete_files_batch": "file_paths",
+    "get_item_infos_batch": "file_paths",
+    "item_codes_to_file_infos_batch": "item_codes"
+}
+
+
+class UpstreamEndpoint(NamedTuple):
+    """
+    pvfUtility WebApi接口定义
     
-    def __init__(self, base_url: str = "http://localhost:27000"):
-        """
-        初始化MCP服务器
-        
-        Args:
-            base_url: pvfUtility WebApi的基础URL
-        """
-        self.base_url = base_url.rstrip('/')
-        self.server = Server("pvfutility-mcp")
-        self.session: Optional[aiohttp.ClientSession] = None
-        
-        # 注册工具函数
-        self._register_tools()
-        
-    async def __aenter__(self):
-        """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession()
-        return self
+    params中每项为 (查询参数名, 工具参数名, 默认值, 转换函数)，值为None或空字符串时不发送；
+    body为请求体构造函数，text_body为True时以纯文本发送，否则以JSON发送
+    """
+    method: str
+    path: str
+    params: Tuple[Tuple[str, str, Any, Optional[Callable[[Any], Any]]], ...] = ()
+    body: Optional[Callable[[dict], Any]] = None
+    text_body: bool = False
+
+
+def _search_pvf_body(arguments: dict) -> dict:
+    """构造SearchPvf请求体"""
+    return {
+        "SearchFolder": arguments.get("search_folder", ""),
+        "Keyword": arguments.get("keyword"),
+        "Type": arguments.get("search_type", 1),
+        "SourceType": 0,
+        "NormalUsing": 1,
+        "IsStartMatch": False,
+        "SearchResult": None,
+        "ScriptContentSearchMode": 1,
+        "IsUseLikeSearchPath": False,
+        "Trait": False,
+        "UseRegularExpression": arguments.get("use_regex", False),
+        "WholeWordMatch": arguments.get("whole_word", False),
+        "RemoveOrKeep": 1,
+        "FileTypesString": None,
+        "ScriptContent": "",
+        "ScriptContentStart": "",
+        "ScriptContentStop": ""
+    }
+
+
+_API = "/Api/PvfUtiltiy"
+_FILE_PATH_PARAM = (("filePath", "file_path", None, None),)
+
+# 工具名 -> 上游接口，新增接口只需在此登记并在工具列表中添加定义
+UPSTREAM_ENDPOINTS: Dict[str, UpstreamEndpoint] = {
+    "get_version": UpstreamEndpoint("GET", f"{_API}/getVersion"),
+    "get_file_list": UpstreamEndpoint("GET", f"{_API}/GetFileList", (
+        ("dirName", "dir_name", None, None),
+        ("returnType", "return_type", 0, None),
+        ("fileType", "file_type", "", None)
+    )),
+    "get_pvf_root_directory": UpstreamEndpoint("GET", f"{_API}/getPvfRootDirectory"),
+    "get_file_content": UpstreamEndpoint("GET", f"{_API}/GetFileContent", (
+        ("filePath", "file_path", None, None),
+        ("useCompatibleDecompiler", "use_compatible_decompiler", False, None),
+        ("encodingType", "encoding_type", "UTF8", None)
+    )),
+    "get_file_data_json": UpstreamEndpoint("GET", f"{_API}/getFileData", _FILE_PATH_PARAM),
+    "delete_file": UpstreamEndpoint("GET", f"{_API}/DeleteFile", _FILE_PATH_PARAM),
+    "import_file": UpstreamEndpoint("POST", f"{_API}/ImportFile", _FILE_PATH_PARAM,
+                                    body=lambda a: a.get("file_content"), text_body=True),
+    "get_item_info": UpstreamEndpoint("GET", f"{_API}/GetItemInfo", _FILE_PATH_PARAM),
+    "item_code_to_file_info": UpstreamEndpoint("GET", f"{_API}/ItemCodeToFileInfo", (
+        ("lstNames", "lst_names", None, None),
+        ("itemCode", "item_code", None, None)
+    )),
+    "get_file_icon": UpstreamEndpoint("GET", f"{_API}/getFileIcon", _FILE_PATH_PARAM),
+    "file_exists": UpstreamEndpoint("GET", f"{_API}/FileIsExists", _FILE_PATH_PARAM),
+    "save_as_pvf": UpstreamEndpoint("GET", f"{_API}/SaveAsPvfFile", (
+        ("filePath", "file_path", "", lambda v: quote(v, safe='')),
+    )),
+    "get_pvf_pack_file_path": UpstreamEndpoint("GET", f"{_API}/GetPvfPackFilePath"),
+    "get_all_lst_file_list": UpstreamEndpoint("GET", f"{_API}/GetAllLstFileList"),
+    "get_lst_file_info": UpstreamEndpoint("GET", f"{_API}/getLstFileInfo", _FILE_PATH_PARAM),
+    "get_string_table": UpstreamEndpoint("GET", f"{_API}/getStringTable"),
+    "folder_exists": UpstreamEndpoint("GET", f"{_API}/FolderIsExists", (
+        ("folderPath", "folder_path", None, None),
+    )),
+    "get_file_contents_batch": UpstreamEndpoint("POST", f"{_API}/GetFileContents", body=lambda a: {
+        "FileList": a.get("file_list", []),
+        "UseCompatibleDecompiler": a.get("use_compatible_decompiler", False),
+        "EncodingType": a.get("encoding_type", "UTF8")
+    }),
+    "delete_files_batch": UpstreamEndpoint("POST", f"{_API}/DeleteFiles", body=lambda a: a.get("file_paths", [])),
+    "import_files_batch": UpstreamEndpoint("POST", f"{_API}/ImportFiles", body=lambda a: a.get("files", [])),
+    "get_item_infos_batch": UpstreamEndpoint("POST", f"{_API}/GetItemInfos", body=lambda a: a.get("file_paths", [])),
+    "search_pvf": UpstreamEndpoint("POST", f"{_API}/SearchPvf", body=_search_pvf_body),
+    "item_codes_to_file_infos_batch": UpstreamEndpoint("POST", f"{_API}/ItemCodesToFileInfos", body=lambda a: {
+        "lstNames": a.get("lst_names", []),
+        "ItemCodes": a.get("item_codes", [])
+    })
+}
+
+
+def _validate_tool_registry(tools: List[Tool], local_handlers: Dict[str, Any]):
+    """
+    启动时校验工具定义与接口登记表一致
+    
+    Args:
+        tools: MCP工具定义列表
+        local_handlers: 本地处理的工具名 -> 处理方法
+    """
+    names = [tool.name for tool in tools]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise Exception(f"工具定义重复: {', '.join(duplicates)}")
+    unknown = sorted(set(names) - UPSTREAM_ENDPOINTS.keys() - local_handlers.keys())
+    if unknown:
+        raise Exception(f"工具没有对应的接口或本地处理方法: {', '.join(unknown)}")
+    undeclared = sorted((UPSTREAM_ENDPOINTS.keys() | local_handlers.keys()) - set(names))
+    if undeclared:
+        raise Exception(f"接口或本地处理方法没有对应的工具定义: {', '.join(undeclared)}")
+    for group in (FAST_TOOLS, HEAVY_TOOLS, WRITE_TOOLS, OFFLINE_TOOLS, PAGED_TOOLS, BATCH_LIST_ARGS.keys()):
+        missing = sorted(set(group) - UPSTREAM_ENDPOINTS.keys())
+        if missing:
+            raise Exception(f"工具分组中存在未登记的接口: {', '.join(missing)}")
+
+
+def _json_loads(data: bytes) -> Any:
+    """直接从字节解析JSON，可用时使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(value: Any, pretty: bool = False) -> str:
+    """序列化工具结果，可用时使用orjson"""
+    if orjson is not None:
+        try:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+            return orjson.dumps(value, option=option).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False, indent=2 if pretty else None,
+                      separators=None if pretty else (",", ":"))
+
+
+def _import_msgpack():
+    """导入msgpack(可选依赖)，仅msgpack输出格式需要"""
+    try:
+        import msgpack
+    except ImportError:
+        raise Exception("msgpack输出格式需要安装msgpack")
+    return msgpack
+
+
+def _to_columnar(result: Any) -> Any:
+    """
+    将记录列表(如物品信息、代码→文件信息)转换为列式表格，省去每条记录重复的键名
+    
+    Returns:
+        Data为 {"columns": [...], "rows": [[...], ...]} 的结果；不是记录列表时原样返回
+    """
+    data = result.get("Data") if isinstance(result, dict) else result
+    if not isinstance(data, list) or len(data) < 2 or not all(isinstance(row, dict) for row in data):
+        return result
+    columns = list(dict.fromkeys(key for row in data for key in row))
+    table = {"columns": columns, "rows": [[row.get(column) for column in columns] for row in data]}
+    return {**result, "Data": table} if isinstance(result, dict) else table
+
+
+def _normalize_pvf_path(path: str) -> str:
+    """规范化PVF路径：统一分隔符、转小写并去除首尾斜杠"""
+    return (path or "").strip().replace("\\", "/").strip("/").lower()
+
+
+def _extract_contents_map(result: Any) -> Dict[str, Any]:
+    """
+    从GetFileContents的返回结果中提取 路径 -> 内容 映射
+    
+    Args:
+        result: 上游返回的JSON对象
         
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
+    Returns:
+        路径到文件内容的字典，无法识别时返回空字典
+    """
+    data = result.get("Data") if isinstance(result, dict) and "Data" in result else result
+    if isinstance(data, dict):
+        # 部分版本将映射包裹在一层对象中
+        if data and all(isinstance(v, dict) for v in data.values()) and len(data) == 1:
+            data = next(iter(data.values()))
+        return {k: v for k, v in data.items() if isinstance(v, str)}
+    if isinstance(data, list):
+        contents = {}
+        for entry in data:
+            if isinstance(entry, dict) and isinstance(entry.get("FilePath"), str):
+                content = entry.get("FileContent", entry.get("Content"))
+                if isinstance(content, str):
+                    contents[entry["FilePath"]] = content
+        return contents
+    return {}
+
+
+def _unwrap_data(result: Any) -> Any:
+    """取出上游返回结果中的Data字段"""
+    if isinstance(result, dict) and "Data" in result:
+        return result["Data"]
+    return result
+
+
+def _split_batch_result(result: Any, keys: List[Any]) -> Optional[List[Any]]:
+    """
+    将"一键一结果"的批量返回拆分为与keys对齐的逐项结果
     
-    def _register_tools(self):
-        """注册所有MCP工具函数"""
+    Args:
+        result: 上游返回的JSON对象(分块部分失败时失败块对应位置为None)
+        keys: 请求中发送的键列表
         
-        # 基础信息获取工具
-        @self.server.list_tools()
-        async def handle_list_tools() -> list[Tool]:
-            """返回可用的工具列表"""
-            return [
-                Tool(
-                    name="get_version",
-                    description="获取pvfUtility版本号",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    }
-                ),
-                Tool(
-                    name="get_file_list",
-                    description="获取指定目录的文件列表",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "dir_name": {
-                                "type": "string",
-                                "description": "目录名称，如equipment"
-                            },
-                            "return_type": {
-                                "type": "integer",
-                                "description": "返回类型，0或1",
-                                "default": 0
-                            },
-                            "file_type": {
-                                "type": "string",
-                                "description": "文件后缀名，如.equ",
-                                "default": ""
-                            }
-                        },
-                        "required": ["dir_name"]
-                    }
-                ),
-                Tool(
-                    name="get_pvf_root_directory",
-                    description="获取PVF根目录列表",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    }
-                ),
-                Tool(
-                    name="get_file_content",
-                    description="获取文件内容",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "文件路径"
-                            },
-                            "use_compatible_decompiler": {
-                                "type": "boolean",
-                                "description": "是否使用兼容性反编译器",
-                                "default": False
-                            },
-                            "encoding_type": {
-                                "type": "string",
-                                "description": "编码类型：TW/CN/KR/JP/UTF8/Unicode",
-                                "default": "UTF8"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="get_file_contents_batch",
-                    description="批量获取文件内容",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_list": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "文件路径列表"
-                            },
-                            "use_compatible_decompiler": {
-                                "type": "boolean",
-                                "description": "是否使用兼容性反编译器",
-                                "default": False
-                            },
-                            "encoding_type": {
-                                "type": "string",
-                                "description": "编码类型",
-                                "default": "UTF8"
-                            }
-                        },
-                        "required": ["file_list"]
-                    }
-                ),
-                Tool(
-                    name="get_file_data_json",
-                    description="获取PVF文件内容(JSON格式)",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "文件路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="delete_file",
-                    description="删除文件",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "要删除的文件路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="delete_files_batch",
-                    description="批量删除文件",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_paths": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "要删除的文件路径列表"
-                            }
-                        },
-                        "required": ["file_paths"]
-                    }
-                ),
-                Tool(
-                    name="import_file",
-                    description="导入/覆盖文件内容",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "文件路径"
-                            },
-                            "file_content": {
-                                "type": "string",
-                                "description": "文件内容"
-                            }
-                        },
-                        "required": ["file_path", "file_content"]
-                    }
-                ),
-                Tool(
-                    name="import_files_batch",
-                    description="批量导入文件",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "files": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "FilePath": {"type": "string"},
-                                        "FileContent": {"type": "string"}
-                                    },
-                                    "required": ["FilePath", "FileContent"]
-                                },
-                                "description": "文件列表，包含路径和内容"
-                            }
-                        },
-                        "required": ["files"]
-                    }
-                ),
-                Tool(
-                    name="get_item_info",
-                    description="获取物品信息(代码和名称)",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "物品文件路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="get_item_infos_batch",
-                    description="批量获取物品信息",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_paths": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "物品文件路径列表"
-                            }
-                        },
-                        "required": ["file_paths"]
-                    }
-                ),
-                Tool(
-                    name="search_pvf",
-                    description="搜索PVF文件",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "keyword": {
-                                "type": "string",
-                                "description": "搜索关键词"
-                            },
-                            "search_folder": {
-                                "type": "string",
-                                "description": "搜索文件夹",
-                                "default": ""
-                            },
-                            "search_type": {
-                                "type": "integer",
-                                "description": "搜索类型",
-                                "default": 1
-                            },
-                            "use_regex": {
-                                "type": "boolean",
-                                "description": "是否使用正则表达式",
-                                "default": False
-                            }
-                        },
-                        "required": ["keyword"]
-                    }
-                ),
-                Tool(
-                    name="item_code_to_file_info",
-                    description="通过物品代码获取文件信息",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "lst_names": {
-                                "type": "string",
-                                "description": "LST名称，多个用逗号分隔，如equipment,stackable"
-                            },
-                            "item_code": {
-                                "type": "integer",
-                                "description": "物品代码"
-                            }
-                        },
-                        "required": ["lst_names", "item_code"]
-                    }
-                ),
-                Tool(
-                    name="item_codes_to_file_infos_batch",
-                    description="批量通过物品代码获取文件信息",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "lst_names": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "LST名称列表"
-                            },
-                            "item_codes": {
-                                "type": "array",
-                                "items": {"type": "integer"},
-                                "description": "物品代码列表"
-                            }
-                        },
-                        "required": ["lst_names", "item_codes"]
-                    }
-                ),
-                Tool(
-                    name="get_file_icon",
-                    description="获取文件图标(Base64格式)",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "文件路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="file_exists",
-                    description="检查文件是否存在",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "文件路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="save_as_pvf",
-                    description="PVF封包另存为",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "保存路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="get_pvf_pack_file_path",
-                    description="获取当前载入的封包文件路径",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    }
-                ),
-                Tool(
-                    name="get_all_lst_file_list",
-                    description="获取所有LST文件列表",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    }
-                ),
-                Tool(
-                    name="get_lst_file_info",
-                    description="获取LST文件信息",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "LST文件路径"
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                ),
-                Tool(
-                    name="get_string_table",
-                    description="获取字符串表数据",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                        "required": []
-                    }
-                ),
-                Tool(
-                    name="folder_exists",
-                    description="检查文件夹是否存在",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "folder_path": {
-                                "type": "string",
-                                "description": "文件夹路径"
-                            }
-                        },
-                        "required": ["folder_path"]
-                    }
-                ),
-                Tool(
-                    name="get_file_contents_batch",
-                    description="批量获取文件内容",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_list": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "文件路径列表"
-                            },
-                            "use_compatible_decompiler": {
-                                "type": "boolean",
-                                "description": "是否使用兼容性反编译器",
-                                "default": False
-                            },
-                            "encoding_type": {
-                                "type": "string",
-                                "description": "编码类型",
-                                "default": "UTF8"
-                            }
-                        },
-                        "required": ["file_list"]
-                    }
-                ),
-                Tool(
-                    name="get_item_infos_batch",
-                    description="批量获取物品信息",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "file_paths": {
-                                "type": "array",
-                                "items": {"type": "string"},
-                                "description": "物品文件路径列表"
-                            }
-                        },
-                        "required": ["file_paths"]
-                    }
-                )
-            ]
+    Returns:
+        与keys等长的结果列表，无法对齐时返回None
+    """
+    data = _unwrap_data(result)
+    if isinstance(data, list) and len(data) == len(keys):
+        return data
+    if isinstance(data, dict):
+        str_keys = [str(k) for k in keys]
+        if all(k in data for k in str_keys):
+            return [data[k] for k in str_keys]
+    return None
+
+
+def _merge_batch_response(result: Optional[dict], keys: List[Any], values: List[Any],
+                          as_dict: bool) -> dict:
+    """
+    按原始顺序合并缓存结果与上游结果，保留上游返回的外层字段
+    
+    Args:
+        result: 上游返回的JSON对象，全部命中缓存时为None
+        keys: 原始请求的键列表
+        values: 与keys对齐的结果列表
+        as_dict: Data是否为以键为索引的对象(否则为列表)
+    """
+    response = dict(result) if isinstance(result, dict) else {"IsError": False, "Msg": None}
+    if as_dict:
+        response["Data"] = {str(k): v for k, v in zip(keys, values)}
+    else:
+        response["Data"] = list(values)
+    return response
+
+
+def _dedupe_import_entries(entries: List[Any]) -> Tuple[List[Any], List[int]]:
+    """
+    导入条目按路径去重，同一路径只保留最后一次写入(位于其最后出现的位置)
+    
+    没有FilePath的条目不参与合并，原样保留
+    
+    Returns:
+        (去重后的条目列表, 原始列表每项对应的去重后下标)
+    """
+    latest: Dict[Any, int] = {}
+    for index, entry in enumerate(entries):
+        path = entry.get("FilePath") if isinstance(entry, dict) else None
+        key = _normalize_pvf_path(path) if isinstance(path, str) and path.strip() else index
+        latest.pop(key, None)
+        latest[key] = index
+    kept = list(latest.values())
+    slot = {original: position for position, original in enumerate(kept)}
+    positions = []
+    for index, entry in enumerate(entries):
+        path = entry.get("FilePath") if isinstance(entry, dict) else None
+        key = _normalize_pvf_path(path) if isinstance(path, str) and path.strip() else index
+        positions.append(slot[latest[key]])
+    return [entries[i] for i in kept], positions
+
+
+def _index_runs(indices: List[int]) -> List[Tuple[int, int]]:
+    """将下标集合压缩为连续区间 (起始, 数量) 列表"""
+    runs: List[Tuple[int, int]] = []
+    for index in sorted(set(indices)):
+        if runs and runs[-1][0] + runs[-1][1] == index:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((index, 1))
+    return runs
+
+
+def _merge_chunk_results(chunks: List[List[Any]], outcomes: List[Any],
+                         positions: Optional[List[int]] = None) -> dict:
+    """
+    合并分块请求的结果，失败的块记录在ChunkErrors中而不影响其它块
+    
+    Args:
+        chunks: 各块发送的键列表
+        outcomes: 各块的返回结果或异常
+        positions: 分块前对原始列表去重时，原始列表每项对应的去重后下标；
+            给出时ChunkErrors的start/count及列表形态的Data均按原始列表给出
         
-        # 工具调用处理器
-        @self.server.call_tool()
-        async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent]:
-            """处理工具调用"""
-            try:
-                result = await self._call_api_tool(name, arguments)
-                return [types.TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
-            except Exception as e:
-                logger.error(f"工具调用失败 {name}: {e}")
-                return [types.TextContent(type="text", text=f"错误: {str(e)}")]
+    Returns:
+        合并后的JSON对象：对象形态的Data合并为一个对象，列表形态按顺序拼接
+        (失败块以None占位保持对齐)，其它形态按块给出列表
+    """
+    errors = []
+    datas: List[Any] = []
+    for index, (chunk, outcome) in enumerate(zip(chunks, outcomes)):
+        if isinstance(outcome, BaseException):
+            message = str(outcome)
+        elif isinstance(outcome, dict) and outcome.get("IsError"):
+            message = outcome.get("Msg") or "上游返回错误"
+        else:
+            datas.append(_unwrap_data(outcome))
+            continue
+        start = sum(len(c) for c in chunks[:index])
+        if positions is None:
+            errors.append({"chunk": index, "start": start, "count": len(chunk), "error": message})
+        else:
+            # 去重后的区间映射回原始列表，可能拆分为多个不连续区间
+            failed = [i for i, p in enumerate(positions) if start <= p < start + len(chunk)]
+            for run_start, run_count in _index_runs(failed):
+                errors.append({"chunk": index, "start": run_start, "count": run_count, "error": message})
+        datas.append(None)
     
-    async def _call_api_tool(self, tool_name: str, arguments: dict) -> dict:
-        """调用对应的API工具"""
-        if not self.session:
-            raise RuntimeError("HTTP会话未初始化")
+    successful = [d for d in datas if d is not None]
+    if not successful:
+        merged: Any = None
+    elif all(isinstance(d, dict) for d in successful):
+        merged = {}
+        for data in successful:
+            merged.update(data)
+    elif all(isinstance(d, list) for d in successful):
+        merged = []
+        for chunk, data in zip(chunks, datas):
+            merged.extend(data if data is not None else [None] * len(chunk))
+        if positions is not None and len(merged) == sum(len(c) for c in chunks):
+            merged = [merged[p] for p in positions]
+    elif all(isinstance(d, bool) for d in successful):
+        merged = not errors and all(successful)
+    else:
+        merged = datas
+    
+    response = {"Data": merged, "IsError": bool(errors), "Msg": None}
+    if any(isinstance(o, dict) and o.get("Source") == "offline_pvf" for o in outcomes):
+        # 任一块由离线读取器响应时整体标记，避免写入内容缓存
+        response["Source"] = "offline_pvf"
+    if errors:
+        failed_chunks = len({e["chunk"] for e in errors})
+        response["Msg"] = f"{failed_chunks}/{len(chunks)} 个分块请求失败"
+        response["ChunkErrors"] = errors
+    return response
+
+
+class RecordCache:
+    """按条目数限制的LRU结果缓存，用于物品信息等"一键一结果"的批量接口"""
+    
+    def __init__(self, max_entries: int = DEFAULT_RECORD_CACHE_ENTRIES):
+        """
+        初始化结果缓存
         
-        # API映射表
-        api_mapping = {
-            "get_version": ("GET", "/Api/PvfUtiltiy/getVersion", {}),
-            "get_file_list": ("GET", "/Api/PvfUtiltiy/GetFileList", {
-                "dirName": arguments.get("dir_name"),
-                "returnType": arguments.get("return_type", 0),
-                "fileType": arguments.get("file_type", "")
-            }),
-            "get_pvf_root_directory": ("GET", "/Api/PvfUtiltiy/getPvfRootDirectory", {}),
-            "get_file_content": ("GET", "/Api/PvfUtiltiy/GetFileContent", {
-                "filePath": arguments.get("file_path"),
-                "useCompatibleDecompiler": arguments.get("use_compatible_decompiler", False),
-                "encodingType": arguments.get("encoding_type", "UTF8")
-            }),
-            "get_file_data_json": ("GET", "/Api/PvfUtiltiy/getFileData", {
-                "filePath": arguments.get("file_path")
-            }),
-            "delete_file": ("GET", "/Api/PvfUtiltiy/DeleteFile", {
-                "filePath": arguments.get("file_path")
-            }),
-            "import_file": ("POST", "/Api/PvfUtiltiy/ImportFile", {
-                "filePath": arguments.get("file_path")
-            }, arguments.get("file_content")),
-            "get_item_info": ("GET", "/Api/PvfUtiltiy/GetItemInfo", {
-                "filePath": arguments.get("file_path")
-            }),
-            "item_code_to_file_info": ("GET", "/Api/PvfUtiltiy/ItemCodeToFileInfo", {
-                "lstNames": arguments.get("lst_names"),
-                "itemCode": arguments.get("item_code")
-            }),
-            "get_file_icon": ("GET", "/Api/PvfUtiltiy/getFileIcon", {
-                "filePath": arguments.get("file_path")
-            }),
-            "file_exists": ("GET", "/Api/PvfUtiltiy/FileIsExists", {
-                "filePath": arguments.get("file_path")
-            }),
-            "save_as_pvf": ("GET", "/Api/PvfUtiltiy/SaveAsPvfFile", {
-                "filePath": quote(arguments.get("file_path", ""), safe='')
-            }),
-            "get_pvf_pack_file_path": ("GET", "/Api/PvfUtiltiy/GetPvfPackFilePath", {}),
-            "get_all_lst_file_list": ("GET", "/Api/PvfUtiltiy/GetAllLstFileList", {}),
-            "get_lst_file_info": ("GET", "/Api/PvfUtiltiy/getLstFileInfo", {
-                "filePath": arguments.get("file_path")
-            }),
-            "get_string_table": ("GET", "/Api/PvfUtiltiy/getStringTable", {}),
-            "folder_exists": ("GET", "/Api/PvfUtiltiy/FolderIsExists", {
-                "folderPath": arguments.get("folder_path")
-            })
+        Args:
+            max_entries: 最大条目数，0表示禁用缓存
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.epoch = 0
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    def get(self, key: Any) -> Optional[Any]:
+        """读取缓存，命中时移动到LRU尾部"""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key]
+    
+    def put(self, key: Any, value: Any, epoch: Optional[int] = None):
+        """写入缓存，epoch与当前纪元不一致时丢弃"""
+        if not self.enabled or value is None or (epoch is not None and epoch != self.epoch):
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self, keys: List[Any]):
+        """使指定键失效"""
+        self.epoch += 1
+        for key in keys:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        """清空缓存"""
+        self.epoch += 1
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
         }
+
+
+class ResultSetCache:
+    """缓存完整结果集并按页提供访问的句柄表，超时或超出数量上限时淘汰"""
+    
+    def __init__(self, ttl: float = DEFAULT_RESULT_TTL, max_sets: int = DEFAULT_RESULT_SETS):
+        """
+        初始化结果集缓存
         
-        # 处理POST请求的特殊情况
-        post_tools = {
-            "get_file_contents_batch": {
-                "url": "/Api/PvfUtiltiy/GetFileContents",
-                "data": {
-                    "FileList": arguments.get("file_list", []),
-                    "UseCompatibleDecompiler": arguments.get("use_compatible_decompiler", False),
-                    "EncodingType": arguments.get("encoding_type", "UTF8")
+        Args:
+            ttl: 结果集有效期(秒)，每次访问后重新计时
+            max_sets: 同时保留的结果集数量上限
+        """
+        self.ttl = ttl
+        self.max_sets = max(1, max_sets)
+        self._sets: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_query: Dict[Tuple[str, str], str] = {}
+    
+    @staticmethod
+    def _query_key(tool_name: str, query: dict) -> Tuple[str, str]:
+        return (tool_name, json.dumps(query, sort_keys=True, ensure_ascii=False, default=str))
+    
+    def _expire(self):
+        now = time.monotonic()
+        for handle in [h for h, entry in self._sets.items() if entry["expires"] <= now]:
+            self._drop(handle)
+    
+    def _drop(self, handle: str):
+        entry = self._sets.pop(handle, None)
+        if entry is not None:
+            self._by_query.pop(entry["query_key"], None)
+    
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        """按句柄获取结果集并刷新有效期"""
+        self._expire()
+        entry = self._sets.get(handle)
+        if entry is not None:
+            entry["expires"] = time.monotonic() + self.ttl
+            self._sets.move_to_end(handle)
+        return entry
+    
+    def find(self, tool_name: str, query: dict) -> Optional[Dict[str, Any]]:
+        """查找相同查询已缓存的结果集"""
+        self._expire()
+        handle = self._by_query.get(self._query_key(tool_name, query))
+        return self.get(handle) if handle else None
+    
+    def put(self, tool_name: str, query: dict, result: dict) -> Dict[str, Any]:
+        """缓存完整结果，返回新的结果集"""
+        self._expire()
+        data = _unwrap_data(result)
+        key = self._query_key(tool_name, query)
+        if key in self._by_query:
+            self._drop(self._by_query[key])
+        entry = {
+            "handle": secrets.token_hex(8),
+            "tool": tool_name,
+            "query_key": key,
+            "result": result,
+            # 对象形态的Data按键值对分页
+            "items": list(data.items()) if isinstance(data, dict) else data,
+            "is_dict": isinstance(data, dict),
+            "expires": time.monotonic() + self.ttl
+        }
+        self._sets[entry["handle"]] = entry
+        self._by_query[key] = entry["handle"]
+        while len(self._sets) > self.max_sets:
+            self._drop(next(iter(self._sets)))
+        return entry
+    
+    def invalidate(self, tool_names: frozenset):
+        """丢弃指定工具的所有结果集"""
+        for handle in [h for h, entry in self._sets.items() if entry["tool"] in tool_names]:
+            self._drop(handle)
+    
+    def clear(self):
+        """清空所有结果集"""
+        self._sets.clear()
+        self._by_query.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回结果集缓存状态"""
+        self._expire()
+        return {"result_sets": len(self._sets), "max_sets": self.max_sets, "ttl": self.ttl}
+
+
+class LatencyHistogram:
+    """按固定桶统计耗时分布，同时记录次数、总耗时、最大值和错误数"""
+    
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def record(self, seconds: float, error: bool = False):
+        """记录一次耗时"""
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if error:
+            self.errors += 1
+    
+    def percentile(self, q: float) -> float:
+        """按桶上界估算分位数(毫秒)，不超过观测到的最大值"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return round(float(min(bound, self.max)), 3)
+        return round(self.max, 3)
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回统计摘要及非空的桶"""
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max, 3),
+            "buckets": {
+                (f"<={bound}" if bound != float("inf") else f">{LATENCY_BUCKETS_MS[-2]}"): n
+                for bound, n in zip(LATENCY_BUCKETS_MS, self.counts) if n
+            }
+        }
+
+
+class ServerMetrics:
+    """工具调用及上游接口的耗时、字节数和错误统计"""
+    
+    def __init__(self, profile_keep: int = DEFAULT_PROFILE_KEEP, client_keep: int = DEFAULT_CLIENT_STATS):
+        self.started = time.time()
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.clients: OrderedDict = OrderedDict()
+        self.client_keep = client_keep
+        self.profiles: deque = deque(maxlen=profile_keep)
+    
+    def _client(self, client: str) -> Dict[str, Any]:
+        """返回客户端统计项，超出保留数量时淘汰最久未活动的客户端"""
+        entry = self.clients.get(client)
+        if entry is None:
+            entry = self.clients[client] = {
+                "latency": LatencyHistogram(), "bytes_out": 0, "upstream_requests": 0, "tools": {}
+            }
+            while len(self.clients) > self.client_keep:
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(client)
+        return entry
+    
+    def record_client(self, client: str, name: str, seconds: float, bytes_out: int, error: bool):
+        """记录客户端的一次工具调用"""
+        entry = self._client(client)
+        entry["latency"].record(seconds, error)
+        entry["bytes_out"] += bytes_out
+        entry["tools"][name] = entry["tools"].get(name, 0) + 1
+    
+    def record_client_upstream(self, client: str):
+        """记录由客户端调用触发的一次上游HTTP请求"""
+        self._client(client)["upstream_requests"] += 1
+    
+    def record_tool(self, name: str, seconds: float, serialize_seconds: float, bytes_out: int, error: bool):
+        """记录一次MCP工具调用：处理耗时、结果序列化耗时和输出字节数"""
+        entry = self.tools.get(name)
+        if entry is None:
+            entry = self.tools[name] = {
+                "latency": LatencyHistogram(), "serialize": LatencyHistogram(), "bytes_out": 0
+            }
+        entry["latency"].record(seconds, error)
+        entry["serialize"].record(serialize_seconds)
+        entry["bytes_out"] += bytes_out
+    
+    def record_endpoint(self, endpoint: str, seconds: float, bytes_in: int, bytes_out: int, error: bool):
+        """记录一次上游HTTP请求"""
+        entry = self.endpoints.get(endpoint)
+        if entry is None:
+            entry = self.endpoints[endpoint] = {"latency": LatencyHistogram(), "bytes_in": 0, "bytes_out": 0}
+        entry["latency"].record(seconds, error)
+        entry["bytes_in"] += bytes_in
+        entry["bytes_out"] += bytes_out
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回全部统计"""
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "tools": {
+                name: {
+                    **entry["latency"].stats(),
+                    "serialize": entry["serialize"].stats(),
+                    "bytes_out": entry["bytes_out"]
                 }
+                for name, entry in sorted(self.tools.items())
             },
-            "delete_files_batch": {
-                "url": "/Api/PvfUtiltiy/DeleteFiles",
-                "data": arguments.get("file_paths", [])
-            },
-            "import_files_batch": {
-                "url": "/Api/PvfUtiltiy/ImportFiles",
-                "data": arguments.get("files", [])
+            "endpoints": {
+                endpoint: {**entry["latency"].stats(), "bytes_in": entry["bytes_in"], "bytes_out": entry["bytes_out"]}
+                for endpoint, entry in sorted(self.endpoints.items())
             },
-            "get_item_infos_batch": {
-                "url": "/Api/PvfUtiltiy/GetItemInfos",
-                "data": arguments.get("file_paths", [])
-            },
-            "search_pvf": {
-                "url": "/Api/PvfUtiltiy/SearchPvf",
-                "data": {
-                    "SearchFolder": arguments.get("search_folder", ""),
-                    "Keyword": arguments.get("keyword"),
-                    "Type": arguments.get("search_type", 1),
-                    "SourceType": 0,
-                    "NormalUsing": 1,
-                    "IsStartMatch": False,
-                    "SearchResult": None,
-                    "ScriptContentSearchMode": 1,
-                    "IsUseLikeSearchPath": False,
-                    "Trait": False,
-                    "UseRegularExpression": arguments.get("use_regex", False),
-                    "WholeWordMatch": False,
-                    "RemoveOrKeep": 1,
-                    "FileTypesString": None,
-                    "ScriptContent": "",
-                    "ScriptContentStart": "",
-                    "ScriptContentStop": ""
+            "clients": {
+                client: {
+                    **entry["latency"].stats(),
+                    "bytes_out": entry["bytes_out"],
+                    "upstream_requests": entry["upstream_requests"],
+                    "tools": dict(sorted(entry["tools"].items()))
                 }
+                for client, entry in self.clients.items()
             },
-            "item_codes_to_file_infos_batch": {
-                "url": "/Api/PvfUtiltiy/ItemCodesToFileInfos",
-                "data": {
-                    "lstNames": arguments.get("lst_names", []),
-                    "ItemCodes": arguments.get("item_codes", [])
-                }
-            }
+            "profiles": list(self.profiles)
         }
-        
-        # 执行API调用
-        if tool_name in post_tools:
-            # POST请求
-            tool_config = post_tools[tool_name]
-            url = f"{self.base_url}{tool_config['url']}"
+
+
+class _ProfiledAwaitable:
+    """
+    驱动协程并只在其自身执行的各步骤中启用cProfile
+    
+    协程挂起时停止分析，同一事件循环上其它协程、其派生的子任务及线程中的工作均不计入
+    """
+    
+    def __init__(self, coro, profiler):
+        self._coro = coro
+        self._profiler = profiler
+    
+    def __await__(self):
+        coro = self._coro
+        value: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            self._profiler.enable()
+            try:
+                yielded = coro.throw(error) if error is not None else coro.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._profiler.disable()
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class StackSampler:
+    """
+    采样分析器：后台线程按固定间隔采集事件循环线程的调用栈
+    
+    开销只与采样间隔有关，与调用频率无关，可在生产环境中常开；
+    事件循环等待IO时的样本计为空闲
+    """
+    
+    def __init__(self, interval: float, max_depth: int = DEFAULT_SAMPLE_DEPTH):
+        """
+        Args:
+            interval: 采样间隔(秒)
+            max_depth: 每次采集的最大栈深度
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.idle_samples = 0
+        self._self_counts: Dict[str, int] = {}
+        self._total_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[int] = None
+    
+    def start(self, thread_id: int):
+        """开始采样指定线程"""
+        self._target = thread_id
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pvf-mcp-sampler", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止采样"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+    
+    @staticmethod
+    def _label(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(self._label(frame))
+                frame = frame.f_back
+            with self._lock:
+                self.samples += 1
+                if labels[0].startswith("selectors.py:"):
+                    self.idle_samples += 1
+                    continue
+                self._self_counts[labels[0]] = self._self_counts.get(labels[0], 0) + 1
+                for label in set(labels):
+                    self._total_counts[label] = self._total_counts.get(label, 0) + 1
+    
+    def stats(self, top: int = DEFAULT_SAMPLE_TOP) -> Dict[str, Any]:
+        """返回样本数及自身/累计样本最多的函数"""
+        with self._lock:
+            busy = self.samples - self.idle_samples
             
-            async with self.session.post(url, json=tool_config['data']) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    raise Exception(f"API调用失败: HTTP {response.status}")
-                    
-        elif tool_name in api_mapping:
-            # GET请求
-            method, endpoint, params, *body = api_mapping[tool_name]
+            def ranked(counts: Dict[str, int]) -> List[Dict[str, Any]]:
+                items = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+                return [{"function": label, "samples": count,
+                         "ratio": round(count / busy, 4) if busy else 0.0} for label, count in items]
             
-            if method == "GET":
-                # 过滤空参数
-                filtered_params = {k: v for k, v in params.items() if v is not None and v != ""}
-                url = f"{self.base_url}{endpoint}"
-                if filtered_params:
-                    url += "?" + urlencode(filtered_params)
-                
-                async with self.session.get(url) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        raise Exception(f"API调用失败: HTTP {response.status}")
-                        
-            elif method == "POST":
-                # POST请求，带文本内容
-                filtered_params = {k: v for k, v in params.items() if v is not None and v != ""}
-                url = f"{self.base_url}{endpoint}"
-                if filtered_params:
-                    url += "?" + urlencode(filtered_params)
-                
-                content = body[0] if body else ""
-                async with self.session.post(url, data=content, headers={'Content-Type': 'text/plain'}) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        raise Exception(f"API调用失败: HTTP {response.status}")
-        else:
-            raise Exception(f"未知的工具: {tool_name}")
+            return {
+                "interval_ms": round(self.interval * 1000, 3),
+                "samples": self.samples,
+                "idle_samples": self.idle_samples,
+                "top_self": ranked(self._self_counts),
+                "top_total": ranked(self._total_counts)
+            }
 
-async def main():
-    """主函数"""
-    import argparse
-    
-    parser = argparse.ArgumentParser(description="pvfUtility WebApi MCP服务器")
-    parser.add_argument("--base-url", default="http://localhost:27000", 
-                       help="pvfUtility WebApi基础URL (默认: http://localhost:27000)")
-    args = parser.parse_args()
+
+class TransientUpstreamError(Exception):
+    """上游暂时性错误(5xx、429等)，只读请求可重试"""
+
+
+def _is_transient_error(error: BaseException) -> bool:
+    """判断是否为可重试的暂时性错误：连接失败/重置、超时或上游5xx"""
+    return isinstance(error, (TransientUpstreamError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                              asyncio.TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """上游熔断器：连续暂时性失败达到阈值后在冷却期内直接失败，冷却结束后放行一个探测请求"""
     
-    async with PvfUtilityMCPServer(args.base_url) as mcp_server:
-        # 运行MCP服务器
-        from mcp.server.stdio import stdio_server
+    def __init__(self, threshold: int = DEFAULT_BREAKER_THRESHOLD, reset_timeout: float = DEFAULT_BREAKER_RESET):
+        """
+        初始化熔断器
         
-        async with stdio_server() as (read_stream, write_stream):
-            await mcp_server.server.run(
-                read_stream,
-                write_stream,
-                InitializationOptions(
-                    server_name="pvfutility-mcp",
-                    server_version="1.0.0",
-                    capabilities=mcp_server.server.get_capabilities(
-                        notification_options=NotificationOptions(),
-                        experimental_capabilities={}
-                    )
-                )
+        Args:
+            threshold: 触发熔断的连续失败次数，0表示禁用
+            reset_timeout: 熔断后的冷却秒数
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing else "open"
+    
+    def check(self) -> bool:
+        """
+        请求前调用，熔断期间或已有探测请求时直接抛出异常
+        
+        Returns:
+            本次请求是否为冷却结束后的探测请求
+        """
+        if self.opened_at is None:
+            return False
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if remaining > 0 or self.probing:
+            self.rejected += 1
+            raise Exception(f"pvfUtility WebApi 连续 {self.failures} 次请求失败，已暂停请求，"
+                            f"{max(remaining, 0):.1f} 秒后重试")
+        self.probing = True
+        return True
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or (self.threshold > 0 and self.opened_at is None and self.failures >= self.threshold):
+            if not self.probing:
+                self.trips += 1
+                logger.warning(f"pvfUtility WebApi 连续 {self.failures} 次请求失败，熔断 {self.reset_timeout} 秒")
+            self.opened_at = time.monotonic()
+            self.probing = False
+    
+    def record_neutral(self):
+        """
+        请求到达上游但因自身原因失败(HTTP 4xx、IsError)：既不计入连续失败，也不视为上游已恢复
+        
+        探测请求得到这类结果时只释放探测名额，由下一个请求继续探测
+        """
+        self.probing = False
+    
+    def release(self):
+        """探测请求被取消时释放探测名额"""
+        self.probing = False
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "threshold": self.threshold,
+            "reset_timeout": self.reset_timeout,
+            "trips": self.trips,
+            "rejected": self.rejected
+        }
+
+
+class AdmissionScheduler:
+    """
+    上游请求准入调度
+    
+    每个分级有独立的并发上限，另有可选的全局上限；名额释放时按分级优先级放行等待中的请求，
+    同一分级内先到先得。独占请求(另存为)等待进行中的请求全部结束后单独执行，排队期间不再放行其它请求
+    """
+    
+    def __init__(self, limits: Optional[Dict[str, int]] = None, total: int = 0):
+        """
+        初始化调度器
+        
+        Args:
+            limits: 各分级的并发上限，0或缺省表示不限制
+            total: 所有分级合计的并发上限，0表示不限制
+        """
+        self.limits = dict(DEFAULT_ADMISSION_LIMITS if limits is None else limits)
+        self.total = max(0, total)
+        self.running = {name: 0 for name in ADMISSION_CLASSES}
+        self.running_total = 0
+        self._queues: Dict[str, deque] = {name: deque() for name in ADMISSION_CLASSES}
+        self._waits = {name: LatencyHistogram() for name in ADMISSION_CLASSES}
+        self._queued = {name: 0 for name in ADMISSION_CLASSES}
+    
+    def _can_admit(self, name: str) -> bool:
+        if self.running["exclusive"]:
+            return False
+        if name == "exclusive":
+            return self.running_total == 0
+        if self._queues["exclusive"]:
+            return False
+        limit = self.limits.get(name, 0)
+        if limit > 0 and self.running[name] >= limit:
+            return False
+        return not (self.total > 0 and self.running_total >= self.total)
+    
+    def _admit(self, name: str):
+        self.running[name] += 1
+        self.running_total += 1
+    
+    def _dispatch(self):
+        """按优先级放行等待中的请求"""
+        for name in ADMISSION_CLASSES:
+            queue = self._queues[name]
+            while queue:
+                if queue[0].done():
+                    queue.popleft()
+                    continue
+                if not self._can_admit(name):
+                    break
+                self._admit(name)
+                queue.popleft().set_result(None)
+            if name == "exclusive" and queue:
+                return
+    
+    async def acquire(self, name: str):
+        """
+        获取执行名额，分级或全局名额已满时排队等待
+        
+        Args:
+            name: 准入分级
+        """
+        if not self._queues[name] and self._can_admit(name):
+            self._admit(name)
+            self._waits[name].record(0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues[name].append(future)
+        self._queued[name] += 1
+        started = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                try:
+                    self._queues[name].remove(future)
+                except ValueError:
+                    pass
+                # 排在队首的独占请求被取消后，其它请求可以继续放行
+                self._dispatch()
+            else:
+                self.release(name)
+            raise
+        self._waits[name].record(time.perf_counter() - started)
+    
+    def try_acquire(self, name: str) -> bool:
+        """不等待地获取执行名额，分级或全局名额已满(或有请求排队)时返回False"""
+        if self._queues[name] or not self._can_admit(name):
+            return False
+        self._admit(name)
+        self._waits[name].record(0.0)
+        return True
+    
+    def release(self, name: str):
+        """释放执行名额并放行等待中的请求"""
+        self.running[name] -= 1
+        self.running_total -= 1
+        self._dispatch()
+    
+    @asynccontextmanager
+    async def slot(self, name: str):
+        """在名额内执行的上下文"""
+        await self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+    
+    def stats(self) -> Dict[str, Any]:
+        waits = {}
+        for name in ADMISSION_CLASSES:
+            wait = self._waits[name].stats()
+            waits[name] = {
+                "limit": 1 if name == "exclusive" else (self.limits.get(name, 0) or None),
+                "running": self.running[name],
+                "waiting": sum(1 for f in self._queues[name] if not f.done()),
+                "admitted": wait["count"],
+                "queued": self._queued[name],
+                "wait_p50_ms": wait["p50_ms"],
+                "wait_p99_ms": wait["p99_ms"],
+                "wait_max_ms": wait["max_ms"],
+                "wait_total_ms": round(self._waits[name].total, 3)
+            }
+        return {"concurrency_limit": self.total or None, "running": self.running_total, "classes": waits}
+
+
+class ContentCache:
+    """文件内容读穿缓存 (按总字节数限制的LRU)"""
+    
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        初始化内容缓存
+        
+        Args:
+            max_bytes: 缓存总字节数上限，0表示禁用缓存
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # 写入纪元：每次失效递增，用于丢弃与写入并发的读结果
+        self.epoch = 0
+        self._entries: "OrderedDict[Tuple[str, bool, str], Tuple[str, int]]" = OrderedDict()
+        self._keys_by_path: Dict[str, set] = {}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+    
+    @staticmethod
+    def make_key(file_path: str, use_compatible_decompiler: bool = False,
+                 encoding_type: str = "UTF8") -> Tuple[str, bool, str]:
+        """生成缓存键 (file_path, use_compatible_decompiler, encoding_type)"""
+        return (_normalize_pvf_path(file_path), bool(use_compatible_decompiler),
+                (encoding_type or "UTF8").upper())
+    
+    def get(self, key: Tuple[str, bool, str]) -> Optional[str]:
+        """读取缓存，命中时移动到LRU尾部"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def put(self, key: Tuple[str, bool, str], content: str, epoch: Optional[int] = None):
+        """
+        写入缓存
+        
+        Args:
+            key: 缓存键
+            content: 文件内容
+            epoch: 发起读取时的写入纪元，期间发生过失效则丢弃本次写入
+        """
+        if not self.enabled or (epoch is not None and epoch != self.epoch):
+            return
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (content, size)
+        self._keys_by_path.setdefault(key[0], set()).add(key)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def _remove(self, key: Tuple[str, bool, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry[1]
+        keys = self._keys_by_path.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_path[key[0]]
+    
+    def invalidate_paths(self, paths: List[str]):
+        """使指定路径的所有缓存项失效"""
+        self.epoch += 1
+        for path in paths:
+            for key in list(self._keys_by_path.get(_normalize_pvf_path(path), ())):
+                self._remove(key)
+                self.invalidations += 1
+    
+    def clear(self):
+        """清空缓存"""
+        self.epoch += 1
+        self._entries.clear()
+        self._keys_by_path.clear()
+        self.total_bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+_TOKEN_RE = re.compile(r"\w+")
+# 词表子串查找使用的n-gram长度，短于该长度的关键词词元退化为扫描词表
+_TOKEN_GRAM = 3
+# 正则中需要转义才表示字面量的字符
+_REGEX_META = set(".^$*+?{}[]()|\\")
+
+
+def _regex_required_literal(pattern: str) -> Optional[str]:
+    """
+    提取正则表达式匹配结果中必然出现的最长字面量片段，用于索引预筛选
+    
+    Args:
+        pattern: 正则表达式
+        
+    Returns:
+        必然出现的字面量，无法确定时返回None
+    """
+    if "|" in pattern:
+        return None
+    runs: List[str] = []
+    current: List[str] = []
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        literal = None
+        if ch == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if not nxt.isalnum():
+                literal = nxt
+        elif ch in "([":
+            depth += 1
+            i += 1
+            if ch == "[":
+                # 跳过字符类
+                end = pattern.find("]", i + 1)
+                i = end + 1 if end != -1 else len(pattern)
+                depth -= 1
+        elif ch == ")":
+            depth -= 1
+            i += 1
+            # 分组后的量词可能使整个分组可选，丢弃当前片段
+            if i < len(pattern) and pattern[i] in "?*{":
+                current = []
+        elif ch in _REGEX_META:
+            i += 1
+        else:
+            literal = ch
+            i += 1
+        if literal is not None and depth == 0:
+            # 紧跟可选量词的字符不是必然出现的
+            if i < len(pattern) and pattern[i] in "?*{":
+                runs.append("".join(current))
+                current = []
+                continue
+            current.append(literal)
+        else:
+            runs.append("".join(current))
+            current = []
+    runs.append("".join(current))
+    best = max(runs, key=len)
+    return best or None
+
+
+def _extract_path_list(result: Any) -> List[str]:
+    """从GetFileList等接口的返回结果中提取文件路径列表"""
+    data = _unwrap_data(result)
+    if isinstance(data, dict):
+        data = list(data.values()) if all(isinstance(v, str) for v in data.values()) else list(data.keys())
+    paths = []
+    for entry in data if isinstance(data, list) else []:
+        if isinstance(entry, str):
+            paths.append(entry)
+        elif isinstance(entry, dict):
+            path = entry.get("FilePath") or entry.get("Path")
+            if isinstance(path, str):
+                paths.append(path)
+    return paths
+
+
+class SearchIndex:
+    """search_pvf本地倒排索引 (词元 -> 文件)，可持久化到SQLite"""
+    
+    def __init__(self, db_path: Optional[str] = None, max_age: float = 0.0):
+        """
+        初始化搜索索引
+        
+        Args:
+            db_path: 持久化文件路径，为空时仅保存在内存中
+            max_age: 索引最长有效期(秒)，超过后视为过期，0表示不过期
+        """
+        self.db_path = db_path
+        self.max_age = max_age
+        self.pack_path: Optional[str] = None
+        self.built_at = 0.0
+        # 规范化路径 -> 原始路径
+        self.dirty: Dict[str, str] = {}
+        self.loaded = False
+        # 上游search_pvf的Data是否为路径字符串列表，None表示尚未观察到
+        self.paths_shape: Optional[bool] = None
+        # 建立索引时覆盖的目录(规范化，空字符串表示整个封包)及文件后缀，None表示范围未知
+        self.dir_names: Optional[List[str]] = None
+        self.file_type = ""
+        # 规范化路径 -> (原始路径, zlib压缩内容)
+        self._docs: Dict[str, Tuple[str, bytes]] = {}
+        self._doc_tokens: Dict[str, frozenset] = {}
+        self._postings: Dict[str, set] = {}
+        # 词表的n-gram -> 含该n-gram的词元，避免每次查询扫描整个词表
+        self._grams: Dict[str, set] = {}
+        # search在线程中执行，与事件循环上的增删互斥
+        self._lock = threading.Lock()
+    
+    @property
+    def ready(self) -> bool:
+        return bool(self.built_at)
+    
+    def is_stale(self, pack_path: Optional[str]) -> bool:
+        """判断索引是否过期(未建立、封包不一致或超过有效期)"""
+        if not self.ready or pack_path is None or pack_path != self.pack_path:
+            return True
+        return self.max_age > 0 and time.time() - self.built_at > self.max_age
+    
+    def covers(self, search_folder: str) -> bool:
+        """
+        搜索目录是否完全位于索引覆盖的范围内
+        
+        按后缀建立的索引不含其它类型的文件，不能回答任何搜索
+        """
+        if self.dir_names is None or self.file_type:
+            return False
+        folder = _normalize_pvf_path(search_folder)
+        return any(not d or folder == d or folder.startswith(d + "/") for d in self.dir_names)
+    
+    def _in_scope(self, key: str) -> bool:
+        if self.dir_names is None:
+            return False
+        if self.file_type and not key.endswith(self.file_type):
+            return False
+        return any(not d or key.startswith(d + "/") for d in self.dir_names)
+    
+    @staticmethod
+    def _tokenize(content: str) -> frozenset:
+        return frozenset(_TOKEN_RE.findall(content.lower()))
+    
+    @staticmethod
+    def _token_grams(token: str) -> set:
+        return {token[i:i + _TOKEN_GRAM] for i in range(len(token) - _TOKEN_GRAM + 1)}
+    
+    def _add(self, key: str, original: str, blob: bytes, tokens: frozenset):
+        self._remove(key)
+        self._docs[key] = (original, blob)
+        self._doc_tokens[key] = tokens
+        for token in tokens:
+            keys = self._postings.get(token)
+            if keys is None:
+                keys = self._postings[token] = set()
+                for gram in self._token_grams(token):
+                    self._grams.setdefault(gram, set()).add(token)
+            keys.add(key)
+    
+    def _remove(self, key: str):
+        self._docs.pop(key, None)
+        for token in self._doc_tokens.pop(key, ()):
+            keys = self._postings.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[token]
+                    for gram in self._token_grams(token):
+                        tokens = self._grams.get(gram)
+                        if tokens is not None:
+                            tokens.discard(token)
+                            if not tokens:
+                                del self._grams[gram]
+    
+    def begin_build(self) -> Dict[str, str]:
+        """
+        开始全量重建：此前标记的路径将随重建重新拉取，重建期间的写入继续记录
+        
+        Returns:
+            此前标记的路径，重建失败时通过restore_dirty放回
+        """
+        previous = dict(self.dirty)
+        self.dirty.clear()
+        return previous
+    
+    def restore_dirty(self, previous: Dict[str, str]):
+        """放回取出后未能处理的路径(重建或刷新失败)，期间重新标记的路径保留新值"""
+        for key, path in previous.items():
+            self.dirty.setdefault(key, path)
+    
+    def replace_all(self, pack_path: Optional[str], contents: Dict[str, str],
+                    dir_names: Optional[List[str]] = None, file_type: str = ""):
+        """
+        以完整的文件内容重建索引
+        
+        Args:
+            pack_path: 封包路径
+            contents: 文件路径 -> 内容
+            dir_names: 索引覆盖的目录，为空时表示整个封包
+            file_type: 建立索引时限定的文件后缀
+        
+        不清除dirty：begin_build之后写入的路径可能晚于内容读取，需由调用方随后刷新
+        """
+        docs = [(_normalize_pvf_path(path), path, zlib.compress(content.encode("utf-8")),
+                 self._tokenize(content)) for path, content in contents.items()]
+        with self._lock:
+            self._docs.clear()
+            self._doc_tokens.clear()
+            self._postings.clear()
+            self._grams.clear()
+            for key, path, blob, tokens in docs:
+                self._add(key, path, blob, tokens)
+            self.pack_path = pack_path
+            self.dir_names = [_normalize_pvf_path(d) for d in dir_names or [""]]
+            self.file_type = (file_type or "").lower()
+            self.built_at = time.time()
+            self.loaded = True
+    
+    def apply_updates(self, contents: Dict[str, Optional[str]]):
+        """
+        增量更新：内容为None或不在索引范围内的路径从索引中移除
+        
+        调用方负责从dirty中取出这些路径(可在线程中执行)
+        """
+        rows = []
+        for path, content in contents.items():
+            key = _normalize_pvf_path(path)
+            if content is None or not self._in_scope(key):
+                with self._lock:
+                    self._remove(key)
+                rows.append((key, None, None, None))
+            else:
+                blob = zlib.compress(content.encode("utf-8"))
+                tokens = self._tokenize(content)
+                with self._lock:
+                    self._add(key, path, blob, tokens)
+                rows.append((key, path, " ".join(tokens), blob))
+        self._write_rows(rows)
+    
+    def mark_dirty(self, paths: List[str]):
+        """标记需要重新拉取内容的路径(索引建立前同样记录，供建立或加载后刷新)"""
+        self.dirty.update((_normalize_pvf_path(p), p) for p in paths)
+    
+    def probe_query(self) -> Optional[Tuple[str, str]]:
+        """
+        返回一个必然有结果的搜索 (关键词, 搜索目录)，用于向上游确认search_pvf的结果形态
+        
+        取任一已索引文件中最长的词元，并限定在该文件所在目录以减小上游的搜索量
+        """
+        with self._lock:
+            for key, tokens in self._doc_tokens.items():
+                if tokens:
+                    original = self._docs[key][0].replace("\\", "/").strip("/")
+                    folder = original.rsplit("/", 1)[0] if "/" in original else ""
+                    return max(tokens, key=len), folder
+        return None
+    
+    def observe_result(self, data: Any):
+        """记录上游search_pvf返回的Data形态，仅当其为路径字符串列表时才由本地索引响应"""
+        if isinstance(data, list) and data:
+            self.paths_shape = all(isinstance(entry, str) for entry in data)
+        elif data is not None and not isinstance(data, list):
+            self.paths_shape = False
+    
+    def _candidates(self, needle: str) -> set:
+        """返回含有包含needle的词元的文件(调用方需持有_lock)"""
+        if len(needle) < _TOKEN_GRAM:
+            tokens = [token for token in self._postings if needle in token]
+        else:
+            grams = sorted((self._grams.get(g, set()) for g in self._token_grams(needle)), key=len)
+            tokens = [token for token in set.intersection(*grams) if needle in token] if grams[0] else []
+        candidates = set()
+        for token in tokens:
+            candidates.update(self._postings[token])
+        return candidates
+    
+    def search(self, keyword: str, search_folder: str = "", use_regex: bool = False,
+               whole_word: bool = False) -> List[str]:
+        """
+        在索引中搜索脚本内容
+        
+        Args:
+            keyword: 搜索关键词或正则表达式
+            search_folder: 限定的搜索目录
+            use_regex: 是否按正则表达式匹配
+            whole_word: 是否全字匹配
+            
+        Returns:
+            匹配的文件路径列表(按路径排序)，与上游一致不区分大小写
+        """
+        if use_regex:
+            pattern = keyword
+            literal = _regex_required_literal(keyword)
+        else:
+            pattern = re.escape(keyword)
+            literal = keyword
+        if whole_word:
+            pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+        matcher = re.compile(pattern, re.IGNORECASE)
+        
+        folder = _normalize_pvf_path(search_folder)
+        prefix = folder + "/" if folder else ""
+        # 通过词元预筛选候选文件：包含关键词的文件必然含有一个包含关键词最长词元的词元
+        tokens = _TOKEN_RE.findall(literal.lower()) if literal else []
+        with self._lock:
+            candidates = self._candidates(max(tokens, key=len)) if tokens else self._docs.keys()
+            docs = [self._docs[key] for key in candidates if key.startswith(prefix)]
+        
+        # 解压与匹配在锁外进行
+        results = []
+        for original, blob in docs:
+            if matcher.search(zlib.decompress(blob).decode("utf-8")):
+                results.append(original)
+        return sorted(results)
+    
+    def load(self) -> bool:
+        """从持久化文件加载索引"""
+        self.loaded = True
+        if not self.db_path or not os.path.exists(self.db_path):
+            return False
+        with closing(_sqlite_connect(self.db_path)) as conn, self._lock:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            for key, original, tokens, blob in conn.execute(
+                    "SELECT path, original, tokens, content FROM docs"):
+                self._add(key, original, blob, frozenset(tokens.split(" ")) if tokens else frozenset())
+        self.pack_path = meta.get("pack_path")
+        self.built_at = float(meta.get("built_at", 0) or 0)
+        # 没有记录范围的旧索引不用于回答搜索
+        self.dir_names = json.loads(meta["dir_names"]) if meta.get("dir_names") else None
+        self.file_type = meta.get("file_type") or ""
+        shape = meta.get("paths_shape")
+        self.paths_shape = None if not shape else shape == "1"
+        logger.info(f"已加载搜索索引 {self.db_path}: {len(self._docs)} 个文件")
+        return self.ready
+    
+    def save(self):
+        """将完整索引写入持久化文件"""
+        if not self.db_path:
+            return
+        with self._lock:
+            rows = [(key, original, self._doc_tokens[key], blob)
+                    for key, (original, blob) in self._docs.items()]
+        with closing(_sqlite_connect(self.db_path)) as conn, conn:
+            self._create_tables(conn)
+            conn.execute("DELETE FROM docs")
+            conn.executemany(
+                "INSERT INTO docs (path, original, tokens, content) VALUES (?, ?, ?, ?)",
+                ((key, original, " ".join(tokens), blob) for key, original, tokens, blob in rows)
+            )
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [("pack_path", self.pack_path or ""), ("built_at", str(self.built_at)),
+                              ("paths_shape", "" if self.paths_shape is None else str(int(self.paths_shape))),
+                              ("dir_names", "" if self.dir_names is None else json.dumps(self.dir_names)),
+                              ("file_type", self.file_type)])
+    
+    def _write_rows(self, rows: List[Tuple[str, Optional[str], Optional[str], Optional[bytes]]]):
+        if not self.db_path or not rows:
+            return
+        with closing(_sqlite_connect(self.db_path)) as conn, conn:
+            self._create_tables(conn)
+            for key, original, tokens, blob in rows:
+                if original is None:
+                    conn.execute("DELETE FROM docs WHERE path = ?", (key,))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO docs (path, original, tokens, content) "
+                                 "VALUES (?, ?, ?, ?)", (key, original, tokens, blob))
+    
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection):
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, original TEXT, "
+                     "tokens TEXT, content BLOB)")
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回索引状态"""
+        return {
+            "ready": self.ready,
+            "db_path": self.db_path,
+            "pack_path": self.pack_path,
+            "built_at": self.built_at,
+            "files": len(self._docs),
+            "tokens": len(self._postings),
+            "dirty": len(self.dirty),
+            "paths_shape": self.paths_shape,
+            "dir_names": self.dir_names,
+            "file_type": self.file_type
+        }
+
+
+def _lst_name(path: str) -> str:
+    """由LST文件路径或名称得到LST名称，如equipment/equipment.lst -> equipment"""
+    name = _normalize_pvf_path(path).rsplit("/", 1)[-1]
+    return name[:-4] if name.endswith(".lst") else name
+
+
+def _extract_lst_entries(result: Any) -> List[Tuple[int, str]]:
+    """从getLstFileInfo的返回结果中提取 (代码, 路径) 列表"""
+    data = _unwrap_data(result)
+    entries = []
+    if isinstance(data, dict):
+        for code, path in data.items():
+            if isinstance(path, str) and str(code).lstrip("-").isdigit():
+                entries.append((int(code), path))
+    elif isinstance(data, list):
+        for entry in data:
+            if not isinstance(entry, dict):
+                continue
+            code = next((entry[k] for k in ("Code", "ItemCode", "Index", "Key") if k in entry), None)
+            path = next((entry[k] for k in ("FilePath", "Path", "Value") if k in entry), None)
+            if isinstance(path, str) and str(code).lstrip("-").isdigit():
+                entries.append((int(code), path))
+    return entries
+
+
+def _pack_mtime(pack_path: Optional[str]) -> Optional[float]:
+    """读取封包文件的修改时间，服务器与pvfUtility不在同一台机器时返回None"""
+    try:
+        return os.stat(pack_path).st_mtime if pack_path else None
+    except OSError:
+        return None
+
+
+# 上游物品记录字段 -> 本地索引中对应的取值
+_ITEM_RECORD_FIELDS = {
+    "ItemCode": "code", "Code": "code",
+    "FilePath": "path", "Path": "path",
+    "ItemName": "name", "Name": "name"
+}
+
+
+def _split_lst_names(lst_names: Any) -> List[str]:
+    """解析逗号分隔或列表形式的LST名称，去除空白和空项"""
+    names = lst_names if isinstance(lst_names, list) else str(lst_names or "").split(",")
+    return [str(name).strip() for name in names if str(name).strip()]
+
+
+def _record_shape(value: Any) -> Optional[Tuple[bool, Tuple[str, ...]]]:
+    """
+    识别上游物品记录的形态
+    
+    Returns:
+        (是否包裹在列表中, 字段名)，空列表或多条记录等无法确定时返回None
+    """
+    wrapped = isinstance(value, list)
+    if wrapped:
+        if len(value) != 1:
+            return None
+        value = value[0]
+    if not isinstance(value, dict) or not value:
+        return None
+    return wrapped, tuple(value)
+
+
+def _render_item_record(shape: Tuple[bool, Tuple[str, ...]], matches: List[Dict[str, Any]]) -> Optional[Any]:
+    """按上游记录形态输出本地查询结果，没有结果或无法填充全部字段时返回None"""
+    wrapped, fields = shape
+    records = []
+    for values in matches if wrapped else matches[:1]:
+        record = {}
+        for field in fields:
+            value = values.get(_ITEM_RECORD_FIELDS.get(field))
+            if value is None:
+                return None
+            record[field] = value
+        records.append(record)
+    if not records:
+        return None
+    return records if wrapped else records[0]
+
+
+class LstIndex:
+    """由LST文件预计算的物品代码 <-> 文件路径双向索引，可持久化到SQLite"""
+    
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化LST索引
+        
+        Args:
+            db_path: 持久化文件路径，为空时仅保存在内存中
+        """
+        self.db_path = db_path
+        self.pack_path: Optional[str] = None
+        self.pack_mtime: Optional[float] = None
+        self.include_names = False
+        self.built_at = 0.0
+        self.stale = False
+        self.loaded = False
+        # LST名称 -> {代码: 文件路径}
+        self._code_to_path: Dict[str, Dict[int, str]] = {}
+        # 规范化文件路径 -> (LST名称, 代码)
+        self._path_to_code: Dict[str, Tuple[str, int]] = {}
+        # 规范化文件路径 -> 物品名称
+        self._names: Dict[str, str] = {}
+        # 工具名 -> 观察到的上游记录形态，本地结果按此形态输出
+        self.record_shapes: Dict[str, Tuple[bool, Tuple[str, ...]]] = {}
+    
+    @property
+    def ready(self) -> bool:
+        return bool(self.built_at) and not self.stale
+    
+    def matches(self, pack_path: Optional[str]) -> bool:
+        """判断索引是否对应当前载入的封包(路径一致且修改时间未变)"""
+        if not self.ready or pack_path is None or pack_path != self.pack_path:
+            return False
+        mtime = _pack_mtime(pack_path)
+        return mtime is None or self.pack_mtime is None or mtime == self.pack_mtime
+    
+    def replace_all(self, pack_path: Optional[str], entries: Dict[str, List[Tuple[int, str]]],
+                    names: Optional[Dict[str, str]] = None):
+        """
+        以完整数据重建索引
+        
+        Args:
+            pack_path: 封包路径
+            entries: LST名称 -> (代码, 文件路径) 列表
+            names: 文件路径 -> 物品名称，为None时不索引名称
+        """
+        self._code_to_path = {lst: {code: path for code, path in items} for lst, items in entries.items()}
+        self._path_to_code = {}
+        for lst, items in entries.items():
+            for code, path in items:
+                self._path_to_code.setdefault(_normalize_pvf_path(path), (lst, code))
+        self._names = {_normalize_pvf_path(p): n for p, n in (names or {}).items() if n is not None}
+        self.include_names = names is not None
+        self.pack_path = pack_path
+        self.pack_mtime = _pack_mtime(pack_path)
+        self.built_at = time.time()
+        self.stale = False
+        self.loaded = True
+    
+    def lookup_code(self, lst_names: List[str], code: int) -> Optional[Dict[str, Any]]:
+        """按LST名称顺序查找物品代码对应的文件信息(供引用查询内部使用，不是上游记录形态)"""
+        for lst in lst_names:
+            path = self._code_to_path.get(_lst_name(lst), {}).get(code)
+            if path is not None:
+                record = {"ItemCode": code, "FilePath": path, "LstName": _lst_name(lst)}
+                name = self._names.get(_normalize_pvf_path(path))
+                if name is not None:
+                    record["ItemName"] = name
+                return record
+        return None
+    
+    def observe_shape(self, tool_name: str, value: Any):
+        """记录上游返回的单条物品记录形态"""
+        shape = _record_shape(value)
+        if shape is not None:
+            self.record_shapes[tool_name] = shape
+    
+    def code_record(self, tool_name: str, lst_names: List[str], code: int) -> Optional[Any]:
+        """
+        以上游形态返回物品代码对应的记录
+        
+        Returns:
+            与上游记录字段一致的结果，尚未观察到上游形态、代码未登记或字段无法填充时返回None
+        """
+        shape = self.record_shapes.get(tool_name)
+        if shape is None:
+            return None
+        matches = []
+        for lst in dict.fromkeys(_lst_name(n) for n in lst_names):
+            path = self._code_to_path.get(lst, {}).get(code)
+            if path is not None:
+                matches.append({"code": code, "path": path, "name": self._names.get(_normalize_pvf_path(path))})
+        return _render_item_record(shape, matches)
+    
+    def path_record(self, tool_name: str, path: str) -> Optional[Any]:
+        """以上游形态返回文件路径对应的物品记录，条件同code_record"""
+        shape = self.record_shapes.get(tool_name)
+        key = _normalize_pvf_path(path)
+        found = self._path_to_code.get(key)
+        if shape is None or found is None:
+            return None
+        return _render_item_record(shape, [{"code": found[1], "path": path, "name": self._names.get(key)}])
+    
+    def lst_names(self) -> List[str]:
+        """已索引的LST名称"""
+        return list(self._code_to_path)
+    
+    def code_of(self, path: str) -> Optional[Tuple[str, int]]:
+        """返回文件在LST中登记的 (LST名称, 代码)"""
+        return self._path_to_code.get(_normalize_pvf_path(path))
+    
+    def on_paths_written(self, paths: List[str]):
+        """写入LST文件时整体标记过期，写入物品文件时丢弃其名称"""
+        for path in paths:
+            key = _normalize_pvf_path(path)
+            if key.endswith(".lst"):
+                self.stale = True
+            self._names.pop(key, None)
+    
+    def load(self) -> bool:
+        """从持久化文件加载索引"""
+        self.loaded = True
+        if not self.db_path or not os.path.exists(self.db_path):
+            return False
+        entries: Dict[str, List[Tuple[int, str]]] = {}
+        names: Dict[str, str] = {}
+        with closing(_sqlite_connect(self.db_path)) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            for lst, code, path, name in conn.execute("SELECT lst_name, code, path, name FROM entries"):
+                entries.setdefault(lst, []).append((code, path))
+                if name is not None:
+                    names[path] = name
+        self.replace_all(meta.get("pack_path") or None, entries,
+                         names if meta.get("include_names") == "1" else None)
+        if meta.get("record_shapes"):
+            self.record_shapes = {tool: (bool(wrapped), tuple(fields)) for tool, (wrapped, fields)
+                                  in json.loads(meta["record_shapes"]).items()}
+        self.pack_mtime = float(meta["pack_mtime"]) if meta.get("pack_mtime") else None
+        self.built_at = float(meta.get("built_at", 0) or 0)
+        logger.info(f"已加载LST索引 {self.db_path}: {len(self._path_to_code)} 条")
+        return self.ready
+    
+    def save(self):
+        """将索引写入持久化文件"""
+        if not self.db_path:
+            return
+        with closing(_sqlite_connect(self.db_path)) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (lst_name TEXT, code INTEGER, path TEXT, "
+                         "name TEXT, PRIMARY KEY (lst_name, code))")
+            conn.execute("DELETE FROM entries")
+            conn.executemany(
+                "INSERT INTO entries (lst_name, code, path, name) VALUES (?, ?, ?, ?)",
+                ((lst, code, path, self._names.get(_normalize_pvf_path(path)))
+                 for lst, items in self._code_to_path.items() for code, path in items.items())
+            )
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("pack_path", self.pack_path or ""),
+                ("pack_mtime", "" if self.pack_mtime is None else repr(self.pack_mtime)),
+                ("include_names", "1" if self.include_names else "0"),
+                ("built_at", str(self.built_at)),
+                ("record_shapes", json.dumps({t: [w, list(f)] for t, (w, f) in self.record_shapes.items()},
+                                             ensure_ascii=False))
+            ])
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回索引状态"""
+        return {
+            "ready": self.ready,
+            "db_path": self.db_path,
+            "pack_path": self.pack_path,
+            "pack_mtime": self.pack_mtime,
+            "built_at": self.built_at,
+            "lst_files": len(self._code_to_path),
+            "entries": len(self._path_to_code),
+            "names": len(self._names),
+            "record_shapes": sorted(self.record_shapes)
+        }
+
+
+# 脚本中以反引号包裹、以脚本后缀结尾的字符串视为文件路径引用
+_REFERENCE_SUFFIX_RE = re.compile(
+    r"\.(equ|stk|ani|als|act|skl|mob|dgn|map|obj|ptl|apd|aic|atk|lst|nut|til|etc|ai|npc|qst|cre|str|key)$", re.I)
+_REFERENCE_TAG_CATEGORIES: Dict[str, str] = {
+    tag: name for name, tags, _ in REFERENCE_CATEGORIES for tag in tags
+}
+
+
+def _reference_category(tag: str) -> Optional[str]:
+    """返回标签(小写完整标签名)对应的代码引用分类，标签不在REFERENCE_CATEGORIES中时返回None"""
+    return _REFERENCE_TAG_CATEGORIES.get(tag)
+
+
+def _lst_categories(lst_name: str) -> List[str]:
+    """返回LST中的代码可被哪些引用分类引用(按LST名称精确匹配)"""
+    lst_name = _lst_name(lst_name)
+    return [name for name, _, lst_names in REFERENCE_CATEGORIES if lst_name in lst_names]
+
+
+def _resolve_reference_path(base: str, value: str, known: Optional[set]) -> str:
+    """
+    解析脚本中的路径引用
+    
+    Args:
+        base: 引用所在脚本的目录
+        value: 引用的路径
+        known: 已知文件的规范化路径集合，用于判断引用是否相对于封包根目录
+        
+    Returns:
+        默认相对于脚本所在目录解析；该路径不存在而根目录下存在同名路径时返回后者
+    """
+    value = value.replace("\\", "/").strip("/")
+    relative = posixpath.normpath(f"{base}/{value}") if base else value
+    if known is not None and _normalize_pvf_path(relative) not in known and _normalize_pvf_path(value) in known:
+        return value
+    return relative
+
+
+def _extract_references(path: str, content: str, known: Optional[set] = None
+                        ) -> Tuple[Tuple[Tuple[str, str], ...], Tuple[Tuple[str, int, str], ...]]:
+    """
+    提取脚本对其它文件的引用
+    
+    Args:
+        path: 脚本路径
+        content: 脚本文本
+        known: 已知文件的规范化路径集合
+        
+    Returns:
+        (路径引用 (目标路径, 标签), 代码引用 (分类, 代码, 标签))，同一目标只记录第一次出现
+    """
+    normalized = path.replace("\\", "/").strip("/")
+    base = normalized.rsplit("/", 1)[0] if "/" in normalized else ""
+    paths: Dict[str, Tuple[str, str]] = {}
+    codes: Dict[Tuple[str, int], str] = {}
+    tag = ""
+    category = None
+    for token in _SCRIPT_TOKEN_RE.findall(content):
+        first = token[0]
+        if first == "[" and token.endswith("]"):
+            tag = "" if token.startswith("[/") else sys.intern(token.lower())
+            category = _reference_category(tag) if tag else None
+        elif first == "`":
+            value = token[1:-1]
+            if _REFERENCE_SUFFIX_RE.search(value):
+                target = _resolve_reference_path(base, value, known)
+                paths.setdefault(_normalize_pvf_path(target), (target, tag))
+        elif category is not None and token.isdigit():
+            code = int(token)
+            if code > 0:
+                codes.setdefault((category, code), tag)
+    return tuple(paths.values()), tuple((name, code, ref_tag) for (name, code), ref_tag in codes.items())
+
+
+class ReferenceGraph:
+    """
+    脚本间引用图 (路径引用及按LST解析的代码引用)，可持久化到SQLite
+    
+    只保存从脚本中提取的原始引用，代码在查询时通过LST索引解析为文件，LST变化后无需重建
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化引用图
+        
+        Args:
+            db_path: 持久化文件路径，为空时仅保存在内存中
+        """
+        self.db_path = db_path
+        self.pack_path: Optional[str] = None
+        self.pack_mtime: Optional[float] = None
+        self.dir_names: List[str] = []
+        self.built_at = 0.0
+        # 规范化路径 -> 原始路径
+        self.dirty: Dict[str, str] = {}
+        self.loaded = False
+        # 规范化路径 -> (原始路径, 路径引用, 代码引用)
+        self._docs: Dict[str, Tuple[str, Tuple[Tuple[str, str], ...], Tuple[Tuple[str, int, str], ...]]] = {}
+        self._reverse_paths: Dict[str, set] = {}
+        self._reverse_codes: Dict[Tuple[str, int], set] = {}
+        # 重建和增量更新在线程中执行，与事件循环上的查询互斥
+        self._lock = threading.Lock()
+    
+    @property
+    def ready(self) -> bool:
+        return bool(self.built_at)
+    
+    def matches(self, pack_path: Optional[str]) -> bool:
+        """判断引用图是否对应当前载入的封包"""
+        return self.ready and pack_path is not None and pack_path == self.pack_path
+    
+    def _add(self, key: str, original: str, paths: Tuple[Tuple[str, str], ...],
+             codes: Tuple[Tuple[str, int, str], ...]):
+        self._remove(key)
+        self._docs[key] = (original, paths, codes)
+        for target, _ in paths:
+            self._reverse_paths.setdefault(_normalize_pvf_path(target), set()).add(key)
+        for category, code, _ in codes:
+            self._reverse_codes.setdefault((category, code), set()).add(key)
+    
+    def _remove(self, key: str):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for target, _ in doc[1]:
+            sources = self._reverse_paths.get(_normalize_pvf_path(target))
+            if sources is not None:
+                sources.discard(key)
+                if not sources:
+                    del self._reverse_paths[_normalize_pvf_path(target)]
+        for category, code, _ in doc[2]:
+            sources = self._reverse_codes.get((category, code))
+            if sources is not None:
+                sources.discard(key)
+                if not sources:
+                    del self._reverse_codes[(category, code)]
+    
+    def replace_all(self, pack_path: Optional[str], dir_names: List[str], docs: Dict[str, Tuple[Any, Any]]):
+        """
+        以完整扫描结果重建引用图
+        
+        Args:
+            pack_path: 封包路径
+            dir_names: 扫描的目录
+            docs: 原始路径 -> (路径引用, 代码引用)
+        """
+        with self._lock:
+            self._docs.clear()
+            self._reverse_paths.clear()
+            self._reverse_codes.clear()
+            for path, (paths, codes) in docs.items():
+                self._add(_normalize_pvf_path(path), path, paths, codes)
+        self.pack_path = pack_path
+        self.pack_mtime = _pack_mtime(pack_path)
+        self.dir_names = list(dir_names)
+        self.built_at = time.time()
+        self.dirty.clear()
+        self.loaded = True
+    
+    def covers(self, path: str) -> bool:
+        """路径是否位于扫描过的目录下"""
+        key = _normalize_pvf_path(path)
+        return any(not d or key.startswith(d + "/") for d in map(_normalize_pvf_path, self.dir_names))
+    
+    def mark_dirty(self, paths: List[str]):
+        """标记扫描目录下需要重新提取引用的路径"""
+        if self.ready:
+            self.dirty.update((_normalize_pvf_path(p), p) for p in paths if self.covers(p))
+    
+    def apply_updates(self, contents: Dict[str, Optional[str]]):
+        """
+        增量更新：内容为None的路径从引用图中移除
+        
+        调用方负责从dirty中取出这些路径；引用在锁外提取，只有修改引用图时持有锁
+        """
+        with self._lock:
+            known = set(self._docs)
+        known |= {_normalize_pvf_path(p) for p, c in contents.items() if c is not None}
+        known -= {_normalize_pvf_path(p) for p, c in contents.items() if c is None}
+        updates = []
+        rows = []
+        for path, content in contents.items():
+            key = _normalize_pvf_path(path)
+            if content is None:
+                updates.append((key, path, None))
+                rows.append((key, None, None))
+            else:
+                paths, codes = _extract_references(path, content, known)
+                updates.append((key, path, (paths, codes)))
+                rows.append((key, path, json.dumps([paths, codes], ensure_ascii=False)))
+        with self._lock:
+            for key, path, refs in updates:
+                if refs is None:
+                    self._remove(key)
+                else:
+                    self._add(key, path, *refs)
+        self._write_rows(rows)
+    
+    def forward(self, path: str, lst_index: "LstIndex") -> Optional[Dict[str, Any]]:
+        """
+        查询脚本引用的文件
+        
+        Returns:
+            路径引用及可在LST中解析的代码引用，脚本不在引用图中时返回None
+        """
+        with self._lock:
+            doc = self._docs.get(_normalize_pvf_path(path))
+            if doc is None:
+                return None
+            original, paths, codes = doc
+            lst_by_category: Dict[str, List[str]] = {}
+            for lst in lst_index.lst_names():
+                for category in _lst_categories(lst):
+                    lst_by_category.setdefault(category, []).append(lst)
+            references = [{"kind": "path", "tag": tag, "target": target,
+                           "indexed": _normalize_pvf_path(target) in self._docs}
+                          for target, tag in paths]
+            unresolved = 0
+            for category, code, tag in codes:
+                found = False
+                for lst in lst_by_category.get(category, ()):
+                    record = lst_index.lookup_code([lst], code)
+                    if record is not None:
+                        found = True
+                        references.append({"kind": "code", "tag": tag, "code": code, "lst": lst,
+                                           "target": record["FilePath"], "heuristic": True})
+                unresolved += not found
+            return {"path": original, "references": references, "unresolved_codes": unresolved}
+    
+    def reverse(self, path: str, lst_index: "LstIndex", exclude: Optional[set] = None) -> Dict[str, Any]:
+        """
+        查询引用该文件的脚本
+        
+        Args:
+            path: 文件路径
+            lst_index: 用于将文件解析为代码的LST索引
+            exclude: 不计入结果的脚本(规范化路径)
+            
+        Returns:
+            通过路径引用和通过代码引用该文件的脚本，以及登记该文件的LST条目
+        """
+        with self._lock:
+            key = _normalize_pvf_path(path)
+            exclude = exclude or set()
+            referrers = []
+            for source in sorted(self._reverse_paths.get(key, ())):
+                if source not in exclude:
+                    original, paths, _ = self._docs[source]
+                    tag = next((t for target, t in paths if _normalize_pvf_path(target) == key), "")
+                    referrers.append({"kind": "path", "source": original, "tag": tag})
+            listed = lst_index.code_of(path)
+            if listed is not None:
+                lst, code = listed
+                for category in _lst_categories(lst):
+                    for source in sorted(self._reverse_codes.get((category, code), ())):
+                        if source not in exclude and source != key:
+                            original, _, codes = self._docs[source]
+                            tag = next((t for c, n, t in codes if c == category and n == code), "")
+                            referrers.append({"kind": "code", "source": original, "tag": tag, "code": code, "lst": lst,
+                                              "heuristic": True})
+            return {
+                "path": self._docs[key][0] if key in self._docs else path,
+                "listed_in": {"lst": listed[0], "code": listed[1]} if listed is not None else None,
+                "referrers": referrers
+            }
+    
+    def referrers_of(self, key: str) -> set:
+        """通过路径引用该文件的脚本(规范化路径)"""
+        with self._lock:
+            return set(self._reverse_paths.get(key, ()))
+    
+    def load(self) -> bool:
+        """从持久化文件加载引用图，封包在此期间被修改时视为无效"""
+        self.loaded = True
+        if not self.db_path or not os.path.exists(self.db_path):
+            return False
+        with closing(_sqlite_connect(self.db_path)) as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            pack_path = meta.get("pack_path") or None
+            pack_mtime = float(meta["pack_mtime"]) if meta.get("pack_mtime") else None
+            mtime = _pack_mtime(pack_path)
+            if mtime is not None and pack_mtime is not None and mtime != pack_mtime:
+                logger.info(f"封包已被修改，忽略引用图 {self.db_path}")
+                return False
+            rows = conn.execute("SELECT path, original, refs FROM docs").fetchall()
+        with self._lock:
+            for key, original, refs in rows:
+                paths, codes = json.loads(refs)
+                self._add(key, original, tuple(map(tuple, paths)), tuple(map(tuple, codes)))
+        self.pack_path = pack_path
+        self.pack_mtime = pack_mtime
+        self.dir_names = json.loads(meta.get("dir_names") or "[]")
+        self.built_at = float(meta.get("built_at", 0) or 0)
+        logger.info(f"已加载引用图 {self.db_path}: {len(self._docs)} 个文件")
+        return self.ready
+    
+    def save(self):
+        """将完整引用图写入持久化文件"""
+        if not self.db_path:
+            return
+        with self._lock:
+            docs = list(self._docs.items())
+        with closing(_sqlite_connect(self.db_path)) as conn, conn:
+            self._create_tables(conn)
+            conn.execute("DELETE FROM docs")
+            conn.executemany(
+                "INSERT INTO docs (path, original, refs) VALUES (?, ?, ?)",
+                ((key, original, json.dumps([paths, codes], ensure_ascii=False))
+                 for key, (original, paths, codes) in docs)
+            )
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("pack_path", self.pack_path or ""),
+                ("pack_mtime", "" if self.pack_mtime is None else repr(self.pack_mtime)),
+                ("dir_names", json.dumps(self.dir_names, ensure_ascii=False)),
+                ("built_at", str(self.built_at))
+            ])
+    
+    def _write_rows(self, rows: List[Tuple[str, Optional[str], Optional[str]]]):
+        if not self.db_path or not rows:
+            return
+        with closing(_sqlite_connect(self.db_path)) as conn, conn:
+            self._create_tables(conn)
+            for key, original, refs in rows:
+                if original is None:
+                    conn.execute("DELETE FROM docs WHERE path = ?", (key,))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO docs (path, original, refs) VALUES (?, ?, ?)",
+                                 (key, original, refs))
+    
+    @staticmethod
+    def _create_tables(conn: sqlite3.Connection):
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS docs (path TEXT PRIMARY KEY, original TEXT, refs TEXT)")
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回引用图状态"""
+        with self._lock:
+            files = len(self._docs)
+            path_references = sum(len(doc[1]) for doc in self._docs.values())
+            code_references = sum(len(doc[2]) for doc in self._docs.values())
+        return {
+            "ready": self.ready,
+            "db_path": self.db_path,
+            "pack_path": self.pack_path,
+            "built_at": self.built_at,
+            "dir_names": self.dir_names,
+            "files": files,
+            "path_references": path_references,
+            "code_references": code_references,
+            "dirty": len(self.dirty)
+        }
+
+
+class StringTable:
+    """紧凑的字符串表：有序ID数组 + 偏移表 + 连续UTF-8缓冲区，避免大量小str对象"""
+    
+    def __init__(self, ids: array, offsets: array, buffer: bytes):
+        """
+        初始化字符串表
+        
+        Args:
+            ids: 升序排列的字符串ID
+            offsets: 各字符串在buffer中的起始偏移，长度为len(ids)+1
+            buffer: 所有字符串UTF-8编码后的连续缓冲区
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.buffer = buffer
+        # ID从0开始连续时可直接下标访问
+        self.dense = len(ids) == 0 or (ids[0] == 0 and ids[-1] == len(ids) - 1)
+    
+    @classmethod
+    def from_data(cls, data: Any) -> "StringTable":
+        """
+        由getStringTable的Data构建字符串表
+        
+        Args:
+            data: 字符串列表(下标即ID)或 ID -> 字符串 的对象
+        """
+        if isinstance(data, dict):
+            pairs = sorted((int(k), v) for k, v in data.items() if str(k).lstrip("-").isdigit())
+        elif isinstance(data, list):
+            pairs = enumerate(data)
+        else:
+            raise Exception("无法识别的字符串表格式")
+        ids = array("q")
+        offsets = array("q", [0])
+        buffer = bytearray()
+        for string_id, text in pairs:
+            ids.append(string_id)
+            buffer += str(text if text is not None else "").encode("utf-8")
+            offsets.append(len(buffer))
+        return cls(ids, offsets, bytes(buffer))
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def nbytes(self) -> int:
+        """字符串表占用的字节数"""
+        return len(self.buffer) + self.ids.itemsize * len(self.ids) + self.offsets.itemsize * len(self.offsets)
+    
+    def _slot(self, string_id: int) -> Optional[int]:
+        if self.dense:
+            return string_id if 0 <= string_id < len(self.ids) else None
+        slot = bisect.bisect_left(self.ids, string_id)
+        return slot if slot < len(self.ids) and self.ids[slot] == string_id else None
+    
+    def _text(self, slot: int) -> str:
+        return self.buffer[self.offsets[slot]:self.offsets[slot + 1]].decode("utf-8")
+    
+    def get(self, string_id: int) -> Optional[str]:
+        """按ID获取字符串，不存在时返回None"""
+        slot = self._slot(string_id)
+        return None if slot is None else self._text(slot)
+    
+    def find(self, text: str, exact: bool = True, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按文本反查字符串ID
+        
+        Args:
+            text: 要查找的文本
+            exact: True为完全匹配，False为包含匹配
+            limit: 最多返回的条目数
+        """
+        needle = text.encode("utf-8")
+        results: List[Dict[str, Any]] = []
+        if not needle:
+            return results
+        start = 0
+        last_slot = -1
+        while len(results) < limit:
+            pos = self.buffer.find(needle, start)
+            if pos < 0:
+                break
+            slot = bisect.bisect_right(self.offsets, pos) - 1
+            start = pos + 1
+            if slot == last_slot or self.offsets[slot + 1] < pos + len(needle):
+                # 同一字符串内的重复命中，或跨越了字符串边界
+                continue
+            if exact and (self.offsets[slot] != pos or self.offsets[slot + 1] != pos + len(needle)):
+                continue
+            last_slot = slot
+            results.append({"id": self.ids[slot], "text": self._text(slot)})
+        return results
+
+
+# PVF文件树及文件数据的解密密钥
+PVF_KEY = 0x81A79011
+# 二进制脚本文件头
+PVF_SCRIPT_MAGIC = b"\xb0\xd0"
+# pvfUtility编码类型 -> Python编码
+PVF_ENCODINGS = {
+    "TW": "cp950",
+    "CN": "gbk",
+    "KR": "cp949",
+    "JP": "cp932",
+    "UTF8": "utf-8",
+    "UNICODE": "utf-16-le"
+}
+
+
+def _pvf_decrypt(data: bytes, crc: int) -> bytes:
+    """
+    解密PVF数据块：每个uint32与(PVF_KEY ^ crc)异或后循环右移6位
+    
+    以大整数整体运算代替逐个uint32循环，纯Python下也能以接近内存拷贝的速度完成
+    """
+    words = len(data) // 4
+    if not words:
+        return b""
+    size = words * 4
+    key = ((PVF_KEY ^ crc) & 0xFFFFFFFF).to_bytes(4, "little")
+    value = int.from_bytes(data[:size], "little") ^ int.from_bytes(key * words, "little")
+    high = int.from_bytes(b"\xff\xff\xff\x03" * words, "little")
+    low = int.from_bytes(b"\x3f\x00\x00\x00" * words, "little")
+    value = ((value >> 6) & high) | ((value & low) << 26)
+    return value.to_bytes(size, "little")
+
+
+class PvfPack:
+    """
+    离线PVF封包读取器
+    
+    以mmap方式打开.pvf文件，解析文件头、文件树和stringtable.bin，
+    在本地反编译脚本文件，无需pvfUtility WebApi即可响应只读工具
+    """
+    
+    def __init__(self, pack_path: str, encoding: str = "cp950"):
+        """
+        打开PVF封包
+        
+        Args:
+            pack_path: .pvf文件路径
+            encoding: 封包内字符串使用的编码，台服为cp950
+        """
+        self.pack_path = pack_path
+        self.encoding = encoding
+        self.mtime = os.stat(pack_path).st_mtime
+        import mmap
+        self._file = open(pack_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        # 规范化路径 -> (原始路径, 数据偏移, 长度, 校验值)
+        self._entries: Dict[str, Tuple[str, int, int, int]] = {}
+        self._dirs: set = {""}
+        self._strings: Optional[List[str]] = None
+        self._nstring: Optional[Dict[int, str]] = None
+        self._str_files: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        # 字符串链接缓存由多个线程按需填充，单独加锁(填充时会读取字符串表，不能持有_lock)
+        self._nstring_lock = threading.Lock()
+        # 进行中的读取数，close在最后一个读取结束后才释放mmap
+        self._use_lock = threading.Lock()
+        self._readers = 0
+        self._closed = False
+        self._parse_header()
+    
+    def _parse_header(self):
+        mm = self._mmap
+        uuid_len = struct.unpack_from("<i", mm, 0)[0]
+        pos = 4 + uuid_len
+        self.version, tree_len, tree_crc, file_count = struct.unpack_from("<iiIi", mm, pos)
+        pos += 16
+        tree = _pvf_decrypt(mm[pos:pos + tree_len], tree_crc)
+        data_start = pos + tree_len
+        
+        offset = 0
+        for _ in range(file_count):
+            _, path_len = struct.unpack_from("<Ii", tree, offset)
+            offset += 8
+            path = tree[offset:offset + path_len].decode(self.encoding, errors="replace")
+            offset += path_len
+            length, crc, relative = struct.unpack_from("<iIi", tree, offset)
+            offset += 12
+            path = path.replace("\\", "/").strip("/")
+            key = path.lower()
+            self._entries[key] = (path, data_start + relative, length, crc)
+            parts = key.split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                self._dirs.add("/".join(parts[:i]))
+        logger.info(f"已打开PVF封包 {self.pack_path}: {len(self._entries)} 个文件")
+    
+    def acquire(self) -> bool:
+        """登记一次读取，封包已关闭时返回False"""
+        with self._use_lock:
+            if self._closed:
+                return False
+            self._readers += 1
+            return True
+    
+    def release(self):
+        """结束一次读取"""
+        with self._use_lock:
+            self._readers -= 1
+            release = self._closed and not self._readers
+        if release:
+            self._release_handles()
+    
+    def close(self):
+        """关闭封包，仍有读取进行中时在最后一个读取结束后关闭"""
+        with self._use_lock:
+            if self._closed:
+                return
+            self._closed = True
+            release = not self._readers
+        if release:
+            self._release_handles()
+    
+    @property
+    def closed(self) -> bool:
+        return self._closed
+    
+    def _release_handles(self):
+        self._mmap.close()
+        self._file.close()
+    
+    def is_modified(self) -> bool:
+        """封包文件是否已在磁盘上被修改"""
+        try:
+            return os.stat(self.pack_path).st_mtime != self.mtime
+        except OSError:
+            return True
+    
+    def crc(self, path: str) -> Optional[int]:
+        """返回文件在封包中的CRC，文件不存在时返回None"""
+        entry = self._entries.get(_normalize_pvf_path(path))
+        return entry[3] if entry is not None else None
+    
+    def read_raw(self, path: str) -> Optional[bytes]:
+        """读取并解密文件原始数据，文件不存在时返回None"""
+        entry = self._entries.get(_normalize_pvf_path(path))
+        if entry is None:
+            return None
+        _, offset, length, crc = entry
+        aligned = (length + 3) & ~3
+        # memoryview切片不复制mmap数据，仅解密时产生一份结果
+        return _pvf_decrypt(memoryview(self._mmap)[offset:offset + aligned], crc)[:length]
+    
+    def file_exists(self, path: str) -> bool:
+        return _normalize_pvf_path(path) in self._entries
+    
+    def folder_exists(self, path: str) -> bool:
+        return _normalize_pvf_path(path) in self._dirs
+    
+    def root_directories(self) -> List[str]:
+        """根目录列表"""
+        return sorted(d for d in self._dirs if d and "/" not in d)
+    
+    def list_files(self, dir_name: str, file_type: str = "") -> List[str]:
+        """列出目录(含子目录)下的文件，可按后缀过滤；与WebApi相同返回小写路径"""
+        folder = _normalize_pvf_path(dir_name)
+        prefix = folder + "/" if folder else ""
+        suffix = (file_type or "").lower()
+        return [key for key in self._entries if key.startswith(prefix) and key.endswith(suffix)]
+    
+    @property
+    def strings(self) -> List[str]:
+        """stringtable.bin中的字符串列表(下标即ID)"""
+        if self._strings is None:
+            with self._lock:
+                if self._strings is None:
+                    data = self.read_raw("stringtable.bin") or b"\x00\x00\x00\x00"
+                    count = struct.unpack_from("<i", data, 0)[0]
+                    offsets = struct.unpack_from(f"<{count + 1}I", data, 4) if count > 0 else ()
+                    self._strings = [
+                        data[offsets[i] + 4:offsets[i + 1] + 4].decode(self.encoding, errors="replace")
+                        for i in range(count)
+                    ]
+        return self._strings
+    
+    def _string(self, index: int) -> str:
+        strings = self.strings
+        return strings[index] if 0 <= index < len(strings) else ""
+    
+    @staticmethod
+    def _units(data: bytes):
+        """遍历二进制脚本的 (类型, 值字节) 单元"""
+        for pos in range(2, len(data) - 4, 5):
+            yield data[pos], data[pos + 1:pos + 5]
+    
+    def lst_entries(self, path: str) -> Optional[Dict[int, str]]:
+        """解析二进制LST文件，返回 代码 -> 路径"""
+        data = self.read_raw(path)
+        if data is None or not data.startswith(PVF_SCRIPT_MAGIC):
+            return None
+        entries: Dict[int, str] = {}
+        code = None
+        for kind, raw in self._units(data):
+            if kind == 2:
+                code = struct.unpack("<i", raw)[0]
+            elif kind == 7 and code is not None:
+                entries[code] = self._string(struct.unpack("<i", raw)[0])
+                code = None
+        return entries
+    
+    def _nstring_text(self, nstring_index: int, key: str) -> str:
+        """由n_string.lst和.str文件解析字符串链接的文本"""
+        with self._nstring_lock:
+            if self._nstring is None:
+                self._nstring = self.lst_entries("n_string.lst") or {}
+            str_path = self._nstring.get(nstring_index)
+            if str_path is None:
+                return ""
+            table = self._str_files.get(str_path)
+            if table is None:
+                table = {}
+                raw = self.read_raw(str_path) or b""
+                for line in raw.decode(self.encoding, errors="replace").splitlines():
+                    name, sep, text = line.partition(">")
+                    if sep:
+                        table[name.strip()] = text
+                self._str_files[str_path] = table
+        return table.get(key, "")
+    
+    def decompile(self, path: str) -> Optional[str]:
+        """
+        反编译文件为文本，文件不存在或无法识别其格式时返回None
+        
+        二进制脚本每个单元为1字节类型 + 4字节值：2整数、4浮点、5/6/8标签、7字符串、9/10字符串链接
+        """
+        data = self.read_raw(path)
+        if data is None:
+            return None
+        if not data.startswith(PVF_SCRIPT_MAGIC):
+            if b"\x00" in data:
+                return None
+            return data.decode(self.encoding, errors="replace")
+        
+        parts = ["#PVF_File\r\n"]
+        link = None
+        for kind, raw in self._units(data):
+            if kind in (2, 3):
+                parts.append(f"{struct.unpack('<i', raw)[0]}\t")
+            elif kind == 4:
+                parts.append(f"{struct.unpack('<f', raw)[0]:.2f}\t")
+            elif kind in (5, 6, 8):
+                parts.append(f"\r\n{self._string(struct.unpack('<i', raw)[0])}\r\n")
+            elif kind == 7:
+                parts.append(f"`{self._string(struct.unpack('<i', raw)[0])}`\r\n")
+            elif kind == 9:
+                link = struct.unpack("<i", raw)[0]
+            elif kind == 10 and link is not None:
+                key = self._string(struct.unpack("<i", raw)[0])
+                parts.append(f"<{link}::{key}`{self._nstring_text(link, key)}`>\r\n")
+                link = None
+        return "".join(parts)
+
+
+def _patch_script_field(content: str, field: str, value: Any) -> Tuple[str, int]:
+    """
+    替换脚本中标签的值，保留标签后的空行
+    
+    Args:
+        content: 脚本文本
+        field: 标签名，如 [name] 或 name
+        value: 新值，多行文本按行写入
+        
+    Returns:
+        (新文本, 替换的标签数)
+    """
+    tag = field.strip()
+    if not tag.startswith("["):
+        tag = f"[{tag}]"
+    tag = tag.lower()
+    newline = "\r\n" if "\r\n" in content else "\n"
+    value_lines = [f"\t{line}{newline}" for line in (str(value).splitlines() or [""])]
+    lines = content.splitlines(keepends=True)
+    out = []
+    count = 0
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        if line.strip().lower() != tag:
+            out.append(line)
+            continue
+        out.append(line if line.endswith("\n") else line + newline)
+        # 值为下一个标签(含闭合标签)之前的所有行
+        end = i
+        while end < len(lines) and not lines[end].lstrip().startswith("["):
+            end += 1
+        keep = end
+        while keep > i and not lines[keep - 1].strip():
+            keep -= 1
+        out.extend(value_lines)
+        out.extend(lines[keep:end])
+        i = end
+        count += 1
+    return "".join(out), count
+
+
+def _apply_file_edit(content: str, pattern: Optional[re.Pattern], replacement: str, count: int,
+                     field_patches: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """对单个文件应用文本替换和标签修改，返回(新文本, 修改处数)"""
+    changes = 0
+    if pattern is not None:
+        content, changes = pattern.subn(replacement, content, count=count)
+    for patch in field_patches:
+        content, patched = _patch_script_field(content, patch.get("field", ""), patch.get("value", ""))
+        changes += patched
+    return content, changes
+
+
+def _summarize_diff(old: str, new: str, max_lines: int) -> List[str]:
+    """生成不含上下文的统一diff行，最多返回max_lines行"""
+    import difflib
+    
+    diff = difflib.unified_diff(old.splitlines(), new.splitlines(), lineterm="", n=0)
+    lines = [line for line in diff if not line.startswith(("---", "+++"))]
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... 省略 {len(lines) - max_lines} 行"]
+    return lines
+
+
+_SCRIPT_TOKEN_RE = re.compile(r"`[^`]*`|<[^>]*>|\[[^\]\r\n]+\]|[^\s`\[<]+")
+
+
+def _script_value(token: str) -> Any:
+    """将脚本中的单个值转换为数字或去掉反引号的字符串"""
+    if token.startswith("`"):
+        return token[1:-1]
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return token
+
+
+def _parse_script(content: str) -> Tuple[Tuple[str, Tuple[Any, ...]], ...]:
+    """
+    将反编译后的脚本解析为紧凑文档
+    
+    Args:
+        content: 脚本文本
+        
+    Returns:
+        按出现顺序排列的 (标签名, 值元组) 元组，标签名已驻留且为小写，闭合标签不单独记录
+    """
+    doc = []
+    tag = None
+    values: List[Any] = []
+    for token in _SCRIPT_TOKEN_RE.findall(content):
+        if token.startswith("[") and token.endswith("]"):
+            if tag is not None:
+                doc.append((tag, tuple(values)))
+            if token.startswith("[/"):
+                tag = None
+            else:
+                tag = sys.intern(token.lower())
+            values = []
+        elif tag is not None:
+            values.append(_script_value(token))
+    if tag is not None:
+        doc.append((tag, tuple(values)))
+    return tuple(doc)
+
+
+def _script_tag(name: str) -> str:
+    """规范化查询中的标签名为 [name] 形式"""
+    name = name.strip().lower()
+    return name if name.startswith("[") else f"[{name}]"
+
+
+def _match_predicate(doc: Tuple[Tuple[str, Tuple[Any, ...]], ...], predicate: Dict[str, Any]) -> bool:
+    """判断文档中是否有任一同名标签满足条件"""
+    tag = _script_tag(predicate.get("tag", ""))
+    op = predicate.get("op", "exists")
+    index = int(predicate.get("index", 0))
+    expected = predicate.get("value")
+    found = [values for name, values in doc if name == tag]
+    if op == "exists":
+        return bool(found)
+    if op == "not_exists":
+        return not found
+    for values in found:
+        if index >= len(values):
+            continue
+        actual = values[index]
+        try:
+            if op == "contains":
+                if str(expected) in str(actual):
+                    return True
+            elif op in ("=", "=="):
+                if actual == expected or str(actual) == str(expected):
+                    return True
+            elif op == "!=":
+                if actual != expected and str(actual) != str(expected):
+                    return True
+            elif isinstance(actual, str) or isinstance(expected, str):
+                continue
+            elif op == ">" and actual > expected or op == ">=" and actual >= expected \
+                    or op == "<" and actual < expected or op == "<=" and actual <= expected:
+                return True
+        except TypeError:
+            continue
+    return False
+
+
+def _project_fields(doc: Tuple[Tuple[str, Tuple[Any, ...]], ...], fields: List[str]) -> Dict[str, Any]:
+    """取出文档中各字段第一次出现时的值，单值字段直接返回该值"""
+    projected = {}
+    for field in fields:
+        tag = _script_tag(field)
+        for name, values in doc:
+            if name == tag:
+                projected[field] = values[0] if len(values) == 1 else list(values)
+                break
+        else:
+            projected[field] = None
+    return projected
+
+
+def _content_hash(content: str) -> str:
+    """文件内容(UTF-8)的SHA-1摘要"""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def _mirror_path(root: str, pvf_path: str) -> str:
+    """
+    将PVF路径映射为镜像目录下的本地路径
+    
+    Args:
+        root: 镜像根目录(绝对路径)
+        pvf_path: PVF文件路径
+        
+    Returns:
+        本地文件路径，路径越出镜像根目录时抛出异常
+    """
+    local = os.path.normpath(os.path.join(root, *pvf_path.replace("\\", "/").strip("/").split("/")))
+    if os.path.commonpath([root, local]) != root or local == root:
+        raise Exception(f"非法的文件路径: {pvf_path}")
+    return local
+
+
+def _mirror_prefix(dir_name: str) -> str:
+    """镜像目录下文件的规范化路径前缀，根目录为空字符串"""
+    key = _normalize_pvf_path(dir_name)
+    return key + "/" if key else ""
+
+
+def _read_local_text(path: str) -> Optional[str]:
+    """读取镜像中的本地文件，不存在时返回None，不是UTF-8文本时抛出UnicodeDecodeError"""
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _local_modified(path: str, sha1: str) -> Optional[bool]:
+    """镜像中的本地文件相对清单摘要是否已修改，不存在时返回None；无法按UTF-8解码视为已修改"""
+    try:
+        current = _read_local_text(path)
+    except UnicodeDecodeError:
+        return True
+    return None if current is None else _content_hash(current) != sha1
+
+
+def _write_local_text(path: str, content: str):
+    """写入镜像中的本地文件，保留原有换行符"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+
+
+class _TreeNode:
+    """目录树节点"""
+    __slots__ = ("children", "path", "complete", "is_dir")
+    
+    def __init__(self):
+        self.children: Dict[str, "_TreeNode"] = {}
+        # 文件节点的原始路径，目录节点为None
+        self.path: Optional[str] = None
+        # 该目录已由GetFileList完整填充(是否包含子目录取决于PathTree.recursive)
+        self.complete = False
+        # 已确认存在的目录
+        self.is_dir = False
+
+
+class PathTree:
+    """
+    封包目录树快照
+    
+    - 只有get_file_list的结果会整体填充目录；填充过的目录(complete)可在本地回答其直接子文件的
+      存在性和文件列表
+    - GetFileList是否递归返回子目录中的文件由结果推断：出现过子目录中的文件后(recursive为True)
+      已填充目录的结论才推广到整个子树，否则子目录仍需询问上游
+    - 未覆盖路径的file_exists逐个询问上游并记录结果(存在或不存在)，不为单个检查拉取整个目录
+    - 只有上游列表项为完整路径字符串时才在本地组装文件列表，否则列表请求始终转发上游
+    """
+    
+    def __init__(self):
+        self.root = _TreeNode()
+        self.roots_known = False
+        self.hits = 0
+        self.misses = 0
+        # 写入纪元：列表请求期间发生写入时不使用该列表填充
+        self.epoch = 0
+        # GetFileList是否递归，None表示尚未观察到
+        self.recursive: Optional[bool] = None
+        # 上游列表项是否为完整路径字符串
+        self.entries_are_paths = True
+        # 上游列表结果中Data以外的字段，本地组装列表时原样保留
+        self.envelope: Dict[str, Any] = {"IsError": False, "Msg": None}
+        # 已确认不存在的文件(规范化路径)
+        self._absent: set = set()
+    
+    def clear(self):
+        """清空目录树(保留对上游列表语义的观察结果)"""
+        self.root = _TreeNode()
+        self.roots_known = False
+        self._absent.clear()
+        self.epoch += 1
+    
+    def _walk(self, key: str, create: bool = False) -> Tuple[Optional[_TreeNode], bool]:
+        """
+        查找路径对应的节点
+        
+        Returns:
+            (节点或None, 路径的存在性能否由已填充的目录确定：父目录已填充，
+            或列表为递归且任一祖先目录已填充)
+        """
+        node = self.root
+        covered = False
+        parts = key.split("/") if key else []
+        for depth, part in enumerate(parts):
+            if node.complete and (self.recursive or depth == len(parts) - 1):
+                covered = True
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    return None, covered
+                child = node.children[part] = _TreeNode()
+            node = child
+        return node, covered
+    
+    def covers(self, key: str) -> bool:
+        """路径的存在性是否可由已填充的目录确定"""
+        return self._walk(key)[1]
+    
+    def fill(self, dir_name: str, entries: List[Any]):
+        """用GetFileList(不带后缀过滤)的完整结果填充目录"""
+        key = _normalize_pvf_path(dir_name)
+        node, _ = self._walk(key, create=True)
+        node.children = {}
+        # 不存在的目录同样返回空列表，无法据此确认目录存在
+        node.is_dir = bool(entries)
+        prefix = key + "/" if key else ""
+        nested = False
+        for entry in entries:
+            if not isinstance(entry, str):
+                self.entries_are_paths = False
+        for path in _extract_path_list(entries):
+            path = path.replace("\\", "/").strip("/")
+            if prefix and not path.lower().startswith(prefix):
+                self.entries_are_paths = False
+                path = f"{dir_name.strip('/')}/{path}"
+            nested = nested or "/" in _normalize_pvf_path(path)[len(prefix):]
+            self._absent.discard(_normalize_pvf_path(path))
+            self._add(path)
+        if nested:
+            self.recursive = True
+        node.complete = True
+    
+    def set_roots(self, names: List[str]):
+        """记录根目录列表"""
+        for name in names:
+            node, _ = self._walk(_normalize_pvf_path(name), create=True)
+            node.is_dir = True
+        self.roots_known = True
+    
+    def _add(self, path: str) -> List[_TreeNode]:
+        """插入文件节点，返回其祖先目录节点(不含根节点)"""
+        node = self.root
+        chain = []
+        parts = _normalize_pvf_path(path).split("/")
+        for part in parts[:-1]:
+            node = node.children.setdefault(part, _TreeNode())
+            node.is_dir = True
+            chain.append(node)
+        leaf = node.children.setdefault(parts[-1], _TreeNode())
+        leaf.path = path.replace("\\", "/").strip("/")
+        return chain
+    
+    def add_file(self, path: str):
+        """添加文件(导入后原地更新)"""
+        self._absent.discard(_normalize_pvf_path(path))
+        ancestors = [self.root] + self._add(path)
+        if self.recursive is not True:
+            # 是否递归未知时，子目录中的新文件是否会出现在上层目录的列表中无法确定
+            for node in ancestors[:-1]:
+                node.complete = False
+    
+    def record_file(self, path: str, exists: bool):
+        """记录上游file_exists的结果"""
+        key = _normalize_pvf_path(path)
+        if not exists:
+            self._absent.add(key)
+            return
+        self._absent.discard(key)
+        ancestors = [self.root] + self._add(path)
+        if self.recursive is None and any(node.complete for node in ancestors[:-1]):
+            # 父目录以上的完整列表中没有该文件，说明GetFileList不递归
+            self.recursive = False
+    
+    def mark_dir(self, path: str):
+        """记录已确认存在的目录"""
+        node, _ = self._walk(_normalize_pvf_path(path), create=True)
+        node.is_dir = True
+    
+    def remove_file(self, path: str):
+        """删除文件(删除后原地更新)，并移除因此变空的目录"""
+        parts = _normalize_pvf_path(path).split("/")
+        self._absent.add("/".join(parts))
+        chain = [self.root]
+        for part in parts:
+            child = chain[-1].children.get(part)
+            if child is None:
+                return
+            chain.append(child)
+        chain[-1].path = None
+        for depth in range(len(parts), 0, -1):
+            node = chain[depth]
+            if node.path is None and not node.children:
+                del chain[depth - 1].children[parts[depth - 1]]
+            else:
+                break
+    
+    def file_exists(self, path: str) -> Optional[bool]:
+        """本地判断文件是否存在，无法确定时返回None"""
+        key = _normalize_pvf_path(path)
+        node, covered = self._walk(key)
+        if node is not None and node.path is not None:
+            self.hits += 1
+            return True
+        if covered or key in self._absent:
+            self.hits += 1
+            return False
+        self.misses += 1
+        return None
+    
+    def folder_exists(self, path: str) -> Optional[bool]:
+        """本地判断目录是否存在，无法确定时返回None"""
+        key = _normalize_pvf_path(path)
+        node, covered = self._walk(key)
+        if node is not None and (node.children or node.is_dir):
+            self.hits += 1
+            return True
+        if covered and (node is not None or self.recursive):
+            # 已填充目录下的文件节点不是目录；递归列表中没有出现的子目录不存在
+            self.hits += 1
+            return False
+        if "/" not in key and self.roots_known and node is None:
+            self.hits += 1
+            return False
+        self.misses += 1
+        return None
+    
+    def list_files(self, dir_name: str, file_type: str = "") -> Optional[List[str]]:
+        """本地列出目录下的文件(与上游相同是否包含子目录)，无法确定时返回None"""
+        key = _normalize_pvf_path(dir_name)
+        node, covered = self._walk(key)
+        listable = node is not None and node.complete if not self.recursive else \
+            covered or (node is not None and node.complete)
+        if not self.entries_are_paths or not listable:
+            self.misses += 1
+            return None
+        self.hits += 1
+        suffix = (file_type or "").lower()
+        files: List[str] = []
+        if node is None:
+            return files
+        if not self.recursive:
+            return [child.path for child in node.children.values()
+                    if child.path is not None and child.path.lower().endswith(suffix)]
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.path is not None and current.path.lower().endswith(suffix):
+                files.append(current.path)
+            stack.extend(reversed(list(current.children.values())))
+        return files
+    
+    def stats(self) -> Dict[str, Any]:
+        """返回目录树统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "roots_known": self.roots_known,
+            "recursive_listing": self.recursive,
+            "complete_dirs": sum(1 for _ in self._complete_nodes()),
+            "absent_files": len(self._absent),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _complete_nodes(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.complete:
+                yield node
+            stack.extend(node.children.values())
+
+
+class _AsgiEndpoint:
+    """将 (scope, receive, send) 协程包装为Starlette路由直接调用的ASGI应用"""
+    
+    def __init__(self, handler: Callable[[dict, Callable, Callable], Awaitable[None]]):
+        self.handler = handler
+    
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        await self.handler(scope, receive, send)
+
+
+class PvfUtilityMCPServer:
+    """pvfUtility WebApi MCP服务器"""
+    
+    def __init__(self, base_url: str = "http://localhost:27000",
+                 cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+                 pack_check_interval: float = DEFAULT_PACK_CHECK_INTERVAL,
+                 record_cache_entries: int = DEFAULT_RECORD_CACHE_ENTRIES,
+                 batch_chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE,
+                 batch_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                 search_index_path: Optional[str] = None,
+                 search_index_max_age: float = 0.0,
+                 lst_index_path: Optional[str] = None,
+                 ref_graph_path: Optional[str] = None,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 pool_per_host: int = DEFAULT_POOL_PER_HOST,
+                 keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+                 dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL,
+                 fast_timeout: float = DEFAULT_FAST_TIMEOUT,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+                 heavy_timeout: float = DEFAULT_HEAVY_TIMEOUT,
+                 stream_json_threshold: int = DEFAULT_STREAM_JSON_THRESHOLD,
+                 pretty_json: bool = True,
+                 output_mode: Optional[str] = None,
+                 embed_threshold: int = DEFAULT_EMBED_THRESHOLD,
+                 result_ttl: float = DEFAULT_RESULT_TTL,
+                 result_sets: int = DEFAULT_RESULT_SETS,
+                 offline_pvf: Optional[str] = None,
+                 pvf_encoding: str = "cp950",
+                 write_behind: bool = False,
+                 write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+                 write_delay: float = DEFAULT_WRITE_DELAY,
+                 stats_file: Optional[str] = None,
+                 profile_tools: Optional[List[str]] = None,
+                 sample_interval: float = 0.0,
+                 retries: int = DEFAULT_RETRIES,
+                 retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+                 retry_max_backoff: float = DEFAULT_RETRY_MAX_BACKOFF,
+                 breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 breaker_reset: float = DEFAULT_BREAKER_RESET,
+                 hedge_delay: float = 0.0,
+                 upstream_concurrency: int = 0,
+                 admission_limits: Optional[Dict[str, int]] = None,
+                 background_startup: bool = False,
+                 warm_up: bool = False):
+        """
+        初始化MCP服务器
+        
+        Args:
+            base_url: pvfUtility WebApi的基础URL
+            cache_max_bytes: 文件内容缓存总字节数上限，0表示禁用
+            pack_check_interval: 命中缓存前校验当前封包路径的最小间隔(秒)，0表示仅在调用get_pvf_pack_file_path时校验
+            record_cache_entries: 物品信息/物品代码查询结果缓存条目上限，0表示禁用
+            batch_chunk_size: 批量工具单次请求的最大条目数，0表示不分块
+            batch_concurrency: 分块请求的最大并发数
+            search_index_path: 本地搜索索引的持久化文件路径，为空时索引仅保存在内存中
+            search_index_max_age: 本地搜索索引的有效期(秒)，0表示不过期
+            lst_index_path: 物品代码索引的持久化文件路径，指定后封包变化时自动重建
+            ref_graph_path: 引用图的持久化文件路径，为空时引用图仅保存在内存中
+            pool_size: 连接池总连接数上限，0表示不限制
+            pool_per_host: 单主机连接数上限，0表示不限制
+            keepalive_timeout: 空闲连接保活时间(秒)
+            dns_cache_ttl: DNS缓存时间(秒)，0表示禁用DNS缓存
+            fast_timeout: 元数据类接口的总超时(秒)，0表示不限制
+            request_timeout: 普通接口的总超时(秒)，0表示不限制
+            heavy_timeout: 搜索、另存为及批量读写接口的总超时(秒)，0表示不限制
+            stream_json_threshold: 响应超过该字节数时使用ijson增量解析，0表示禁用
+            pretty_json: 工具结果是否以缩进格式输出(未指定output_mode时生效)
+            output_mode: 默认输出格式(pretty/compact/columnar/gzip/msgpack)，可被调用参数output_mode覆盖
+            embed_threshold: gzip/msgpack格式下紧凑JSON超过该字节数时以内嵌资源返回
+            result_ttl: 分页结果集的有效期(秒)
+            result_sets: 同时保留的分页结果集数量上限
+            offline_pvf: 离线读取的.pvf文件路径，"auto"表示使用pvfUtility当前载入的封包，为空时不启用
+            pvf_encoding: 离线读取时封包字符串的编码，可为Python编码名或TW/CN/KR/JP
+            write_behind: 是否缓冲import_file/delete_file并合并为批量请求提交
+            write_batch_size: 写缓冲达到该条目数时立即提交
+            write_delay: 写缓冲中最早的写入等待该秒数后提交
+            stats_file: 退出时写入运行统计(JSON)的文件路径
+            profile_tools: 使用cProfile分析的工具名列表，包含all时分析全部工具(只统计工具协程自身的执行)
+            sample_interval: 采样分析器的采样间隔(秒)，0为禁用
+            retries: 只读请求遇到暂时性错误时的最大重试次数，写类请求从不重试
+            retry_backoff: 重试退避基数秒数，第n次重试在 [0, retry_backoff * 2^n] 内随机等待
+            retry_max_backoff: 单次重试等待的上限秒数
+            breaker_threshold: 连续暂时性失败达到该次数后熔断，0为禁用
+            breaker_reset: 熔断冷却秒数，之后放行一个探测请求
+            hedge_delay: 只读请求超过该秒数未返回时并发发送第二个相同请求，取先返回者，0为禁用
+            upstream_concurrency: 同时发往pvfUtility WebApi的最大请求数(所有客户端共享)，0为仅受连接池限制
+            admission_limits: 各准入分级(fast/write/read/bulk/search)的并发上限，None使用默认值
+            background_startup: 进入上下文时在后台导入aiohttp并建立会话，首个工具调用前等待完成
+            warm_up: 会话建立后在后台预取版本号、封包路径、根目录、LST列表和字符串表
+        """
+        self.base_url = base_url.rstrip('/')
+        self.server = Server("pvfutility-mcp")
+        self.session: Optional[aiohttp.ClientSession] = None
+        
+        # 文件内容缓存及封包变更检测
+        self.content_cache = ContentCache(cache_max_bytes)
+        self.item_info_cache = RecordCache(record_cache_entries)
+        self.item_code_cache = RecordCache(record_cache_entries)
+        # 已解析脚本文档：规范化路径 -> (标签名, 值元组) 元组
+        self.script_cache = RecordCache(record_cache_entries)
+        # 记录各批量接口Data的形态(对象/列表)，全部命中缓存时按相同形态返回
+        self._batch_data_is_dict: Dict[str, bool] = {"get_file_contents_batch": True}
+        
+        # 批量请求分块
+        self.batch_chunk_size = batch_chunk_size
+        self.batch_concurrency = max(1, batch_concurrency)
+        self._chunk_semaphore = asyncio.Semaphore(self.batch_concurrency)
+        
+        # search_pvf本地索引
+        self.search_index = SearchIndex(search_index_path, search_index_max_age)
+        
+        # 物品代码 <-> 文件路径索引
+        self.lst_index = LstIndex(lst_index_path)
+        self.lst_index_auto = lst_index_path is not None
+        self._lst_index_lock = asyncio.Lock()
+        
+        # 脚本间引用图
+        self.ref_graph = ReferenceGraph(ref_graph_path)
+        self._ref_graph_lock = asyncio.Lock()
+        
+        # 连接池及分级超时
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._timeout_seconds = {"fast": fast_timeout, "default": request_timeout, "heavy": heavy_timeout}
+        self._timeouts: Dict[str, aiohttp.ClientTimeout] = {}
+        
+        # 相同只读请求合并(single-flight)：请求键 -> 进行中的任务
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.coalesced_requests = 0
+        
+        # 重试、熔断与对冲请求
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self.retry_max_backoff = retry_max_backoff
+        self.hedge_delay = hedge_delay
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.resilience_stats = {"retries": 0, "hedged": 0, "hedge_wins": 0, "hedge_skipped": 0}
+        
+        # 上游请求准入调度(分级并发上限、全局上限)、同一路径写入串行化及按客户端统计
+        self.scheduler = AdmissionScheduler(admission_limits, upstream_concurrency)
+        self._path_locks: Dict[str, List[Any]] = {}
+        self.upstream_stats = {"in_flight": 0}
+        self._client_labels: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+        self._client_seq = 0
+        
+        # 响应解析及结果输出
+        self.stream_json_threshold = stream_json_threshold
+        self.pretty_json = pretty_json
+        self.output_mode = output_mode or ("pretty" if pretty_json else "compact")
+        if self.output_mode not in OUTPUT_MODES:
+            raise Exception(f"未知的输出格式: {self.output_mode}")
+        if self.output_mode == "msgpack":
+            _import_msgpack()
+        self.embed_threshold = max(0, embed_threshold)
+        self._resource_seq = 0
+        
+        # 分页结果集
+        self.result_sets = ResultSetCache(result_ttl, result_sets)
+        
+        # 目录树快照
+        self.path_tree = PathTree()
+        
+        # 写缓冲：规范化路径 -> 待提交的写入，同一路径只保留最后一次
+        self.write_behind = write_behind
+        self.write_batch_size = max(1, write_batch_size)
+        self.write_delay = write_delay
+        self._pending_writes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # 后台提交任务，保留引用直到完成，退出时等待
+        self._write_tasks: set = set()
+        self.write_stats = {"queued": 0, "coalesced": 0, "flushes": 0, "superseded": 0}
+        
+        # 批量编辑事务串行执行，避免交叉读改写
+        self._edit_lock = asyncio.Lock()
+        
+        # 运行统计与按需性能分析
+        self.metrics = ServerMetrics()
+        self.stats_file = stats_file
+        self.profile_tools = set(profile_tools or [])
+        self.sampler = StackSampler(sample_interval) if sample_interval > 0 else None
+        
+        # 紧凑字符串表，封包切换时重新加载
+        self.string_table: Optional[StringTable] = None
+        self._string_table_lock = asyncio.Lock()
+        
+        # 离线PVF读取器：通过本服务写入过的路径在封包重新保存前回退到WebApi
+        self.offline_pvf = offline_pvf
+        self.pvf_encoding = PVF_ENCODINGS.get((pvf_encoding or "").upper(), pvf_encoding)
+        self._offline_pack: Optional[PvfPack] = None
+        self._offline_dirty: set = set()
+        self._offline_error: Optional[str] = None
+        self._offline_lock = asyncio.Lock()
+        self.pack_check_interval = pack_check_interval
+        self._pack_path: Optional[str] = None
+        self._last_pack_check = 0.0
+        
+        # 后台启动与元数据预取
+        self.background_startup = background_startup
+        self.warm_up = warm_up
+        self._startup: Optional[asyncio.Task] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        self.startup_times: Dict[str, float] = {"import": round(_IMPORT_SECONDS, 3)}
+        
+        # 版本号、根目录列表、LST列表：工具名 -> 结果，写入或封包切换时失效
+        self._metadata: Dict[str, Any] = {}
+        self._metadata_epoch = 0
+        
+        # 由本地缓存/索引处理的工具：工具名 -> 处理方法，其余工具直接请求上游
+        self._local_handlers: Dict[str, Callable[[dict], Awaitable[dict]]] = {
+            "get_cache_stats": self._cache_stats,
+            "get_version": lambda arguments: self._metadata_cached("get_version", arguments),
+            "get_pvf_root_directory": lambda arguments: self._metadata_cached("get_pvf_root_directory", arguments),
+            "get_all_lst_file_list": lambda arguments: self._metadata_cached("get_all_lst_file_list", arguments),
+            "get_server_stats": self._server_stats,
+            "get_string": self._get_string,
+            "get_strings_batch": self._get_strings_batch,
+            "find_strings": self._find_strings,
+            "build_lst_index": self._build_lst_index_locked,
+            "build_search_index": self._build_search_index,
+            "build_reference_graph": self._build_reference_graph_locked,
+            "get_references": self._get_references,
+            "analyze_delete_impact": self._analyze_delete_impact,
+            "query_scripts": self._query_scripts,
+            "edit_files_batch": self._edit_files_batch_locked,
+            "sync_directory": self._sync_directory,
+            "item_code_to_file_info": self._item_code_to_file_info_indexed,
+            "get_item_info": self._get_item_info_indexed,
+            "search_pvf": self._search_pvf,
+            "get_file_content": self._get_file_content_cached,
+            "get_file_contents_batch": self._get_file_contents_batch_cached,
+            "file_exists": self._file_exists_cached,
+            "folder_exists": self._folder_exists_cached,
+            "get_file_list": self._get_file_list_cached,
+            "get_item_infos_batch": self._get_item_infos_batch_indexed,
+            "item_codes_to_file_infos_batch": self._item_codes_to_file_infos_batch_indexed
+        }
+        
+        # 注册工具函数
+        self._register_tools()
+        
+    async def __aenter__(self):
+        """异步上下文管理器入口"""
+        if self.sampler is not None:
+            self.sampler.start(threading.get_ident())
+        if self.background_startup:
+            self._startup = asyncio.ensure_future(self._start_session())
+        else:
+            await self._start_session()
+        return self
+    
+    async def _start_session(self):
+        """导入aiohttp并建立HTTP会话，按需启动后台预取"""
+        if aiohttp is None:
+            await asyncio.to_thread(_import_aiohttp)
+        self._timeouts = {
+            name: aiohttp.ClientTimeout(total=seconds or None) for name, seconds in self._timeout_seconds.items()
+        }
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=self.dns_cache_ttl > 0,
+            ttl_dns_cache=self.dns_cache_ttl or None
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self._timeouts["default"])
+        self.startup_times["session_ready"] = round(time.perf_counter() - _MODULE_STARTED, 3)
+        if self.warm_up:
+            self._warm_up_task = asyncio.ensure_future(self._warm_up_metadata())
+    
+    async def _warm_up_metadata(self):
+        """并发预取常用元数据，结果进入各自的缓存，失败时不影响后续调用"""
+        started = time.perf_counter()
+        names = ["get_pvf_pack_file_path", "get_version", "get_pvf_root_directory", "get_all_lst_file_list",
+                 "get_string_table"]
+        outcomes = await asyncio.gather(
+            self._ensure_pack_current(force=True),
+            self._call_api_tool("get_version", {}),
+            self._call_api_tool("get_pvf_root_directory", {}),
+            self._call_api_tool("get_all_lst_file_list", {}),
+            self._get_string_table(),
+            return_exceptions=True
+        )
+        failed = [name for name, outcome in zip(names, outcomes) if isinstance(outcome, BaseException)]
+        self.startup_times["warm_up"] = round(time.perf_counter() - started, 3)
+        if failed:
+            logger.warning(f"预取元数据失败: {', '.join(failed)}")
+        logger.info(f"元数据预取完成，耗时 {self.startup_times['warm_up']} 秒")
+        
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器出口"""
+        for task in (self._warm_up_task, self._startup):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self._write_tasks:
+            await asyncio.gather(*self._write_tasks, return_exceptions=True)
+        if self._pending_writes and self.session:
+            try:
+                await self._flush_writes()
+            except Exception as e:
+                logger.error(f"退出时提交写缓冲失败: {e}")
+        if self.stats_file:
+            try:
+                stats = await self._server_stats({})
+                with open(self.stats_file, "w", encoding="utf-8") as f:
+                    json.dump(stats, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                logger.error(f"写入运行统计失败: {e}")
+        if self.session:
+            await self.session.close()
+        if self._offline_pack is not None:
+            self._offline_pack.close()
+        if self.sampler is not None:
+            self.sampler.stop()
+    
+    @staticmethod
+    def _build_tool_list() -> List[Tool]:
+        """构建MCP工具定义列表(启动时调用一次)"""
+        tools = [
+            Tool(
+                name="get_version",
+                description="获取pvfUtility版本号",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_file_list",
+                description="获取指定目录的文件列表",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "dir_name": {
+                            "type": "string",
+                            "description": "目录名称，如equipment"
+                        },
+                        "return_type": {
+                            "type": "integer",
+                            "description": "返回类型，0或1",
+                            "default": 0
+                        },
+                        "file_type": {
+                            "type": "string",
+                            "description": "文件后缀名，如.equ",
+                            "default": ""
+                        },
+                        **PAGING_PROPERTIES
+                    },
+                    "required": ["dir_name"]
+                }
+            ),
+            Tool(
+                name="get_pvf_root_directory",
+                description="获取PVF根目录列表",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_file_content",
+                description="获取文件内容",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "文件路径"
+                        },
+                        "use_compatible_decompiler": {
+                            "type": "boolean",
+                            "description": "是否使用兼容性反编译器",
+                            "default": False
+                        },
+                        "encoding_type": {
+                            "type": "string",
+                            "description": "编码类型：TW/CN/KR/JP/UTF8/Unicode",
+                            "default": "UTF8"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="get_file_contents_batch",
+                description="批量获取文件内容",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_list": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "文件路径列表"
+                        },
+                        "use_compatible_decompiler": {
+                            "type": "boolean",
+                            "description": "是否使用兼容性反编译器",
+                            "default": False
+                        },
+                        "encoding_type": {
+                            "type": "string",
+                            "description": "编码类型",
+                            "default": "UTF8"
+                        }
+                    },
+                    "required": ["file_list"]
+                }
+            ),
+            Tool(
+                name="get_file_data_json",
+                description="获取PVF文件内容(JSON格式)",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "文件路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="delete_file",
+                description="删除文件",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "要删除的文件路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="delete_files_batch",
+                description="批量删除文件",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要删除的文件路径列表"
+                        }
+                    },
+                    "required": ["file_paths"]
+                }
+            ),
+            Tool(
+                name="import_file",
+                description="导入/覆盖文件内容",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "文件路径"
+                        },
+                        "file_content": {
+                            "type": "string",
+                            "description": "文件内容"
+                        }
+                    },
+                    "required": ["file_path", "file_content"]
+                }
+            ),
+            Tool(
+                name="import_files_batch",
+                description="批量导入文件",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "FilePath": {"type": "string"},
+                                    "FileContent": {"type": "string"}
+                                },
+                                "required": ["FilePath", "FileContent"]
+                            },
+                            "description": "文件列表，包含路径和内容"
+                        }
+                    },
+                    "required": ["files"]
+                }
+            ),
+            Tool(
+                name="get_item_info",
+                description="获取物品信息(代码和名称)",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "物品文件路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="get_item_infos_batch",
+                description="批量获取物品信息",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "物品文件路径列表"
+                        }
+                    },
+                    "required": ["file_paths"]
+                }
+            ),
+            Tool(
+                name="search_pvf",
+                description="搜索PVF文件",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "keyword": {
+                            "type": "string",
+                            "description": "搜索关键词"
+                        },
+                        "search_folder": {
+                            "type": "string",
+                            "description": "搜索文件夹",
+                            "default": ""
+                        },
+                        "search_type": {
+                            "type": "integer",
+                            "description": "搜索类型",
+                            "default": 1
+                        },
+                        "use_regex": {
+                            "type": "boolean",
+                            "description": "是否使用正则表达式",
+                            "default": False
+                        },
+                        "whole_word": {
+                            "type": "boolean",
+                            "description": "是否全字匹配",
+                            "default": False
+                        },
+                        "use_local_index": {
+                            "type": "boolean",
+                            "description": "本地索引可用时是否使用本地索引搜索脚本内容(不可用时自动回退到pvfUtility)",
+                            "default": True
+                        },
+                        **PAGING_PROPERTIES
+                    },
+                    "required": ["keyword"]
+                }
+            ),
+            Tool(
+                name="item_code_to_file_info",
+                description="通过物品代码获取文件信息",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "lst_names": {
+                            "type": "string",
+                            "description": "LST名称，多个用逗号分隔，如equipment,stackable"
+                        },
+                        "item_code": {
+                            "type": "integer",
+                            "description": "物品代码"
+                        }
+                    },
+                    "required": ["lst_names", "item_code"]
+                }
+            ),
+            Tool(
+                name="item_codes_to_file_infos_batch",
+                description="批量通过物品代码获取文件信息",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "lst_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "LST名称列表"
+                        },
+                        "item_codes": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "物品代码列表"
+                        }
+                    },
+                    "required": ["lst_names", "item_codes"]
+                }
+            ),
+            Tool(
+                name="get_file_icon",
+                description="获取文件图标(Base64格式)",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "文件路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="file_exists",
+                description="检查文件是否存在",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "文件路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="save_as_pvf",
+                description="PVF封包另存为",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "保存路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="get_pvf_pack_file_path",
+                description="获取当前载入的封包文件路径",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_all_lst_file_list",
+                description="获取所有LST文件列表",
+                inputSchema={
+                    "type": "object",
+                    "properties": {**PAGING_PROPERTIES},
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_lst_file_info",
+                description="获取LST文件信息",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "LST文件路径"
+                        }
+                    },
+                    "required": ["file_path"]
+                }
+            ),
+            Tool(
+                name="get_string_table",
+                description="获取字符串表数据",
+                inputSchema={
+                    "type": "object",
+                    "properties": {**PAGING_PROPERTIES},
+                    "required": []
+                }
+            ),
+            Tool(
+                name="folder_exists",
+                description="检查文件夹是否存在",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "folder_path": {
+                            "type": "string",
+                            "description": "文件夹路径"
+                        }
+                    },
+                    "required": ["folder_path"]
+                }
+            ),
+            Tool(
+                name="build_search_index",
+                description="从文件列表和批量内容构建search_pvf本地索引并持久化",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "dir_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要建立索引的目录列表，默认为整个封包；只有这些目录内的搜索由本地索引响应"
+                        },
+                        "file_type": {
+                            "type": "string",
+                            "description": "仅索引指定后缀的文件，如.equ；限定后缀的索引不用于响应search_pvf",
+                            "default": ""
+                        }
+                    },
+                    "required": []
+                }
+            ),
+            Tool(
+                name="build_reference_graph",
+                description="批量读取脚本，提取文件路径引用和物品/怪物/副本/技能等代码引用，构建脚本间引用图并持久化；之后的导入/删除会增量更新",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "dir_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要扫描的目录列表，默认为全部根目录"
+                        },
+                        "file_type": {
+                            "type": "string",
+                            "description": "仅扫描指定后缀的文件，如.equ",
+                            "default": ""
+                        }
+                    },
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_references",
+                description="查询文件引用了哪些文件(forward)以及被哪些脚本引用(reverse)，如某物品被哪些脚本掉落或使用；代码引用按标签名推断并通过对应分类的LST解析为文件，结果中标记为heuristic",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "文件路径"
+                        },
+                        "item_code": {
+                            "type": "integer",
+                            "description": "代码，未提供file_path时按lst_names在LST中解析为文件"
+                        },
+                        "lst_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "解析item_code时依次查找的LST名称",
+                            "default": ["equipment", "stackable"]
+                        },
+                        "direction": {
+                            "type": "string",
+                            "enum": ["forward", "reverse", "both"],
+                            "description": "查询方向",
+                            "default": "both"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "每个方向最多返回的条目数",
+                            "default": 500
+                        }
+                    },
+                    "required": []
+                }
+            ),
+            Tool(
+                name="analyze_delete_impact",
+                description="删除文件前分析影响：列出删除集合以外仍引用这些文件的脚本、登记它们的LST条目，以及删除后不再被引用的文件；按代码的引用为启发式推断，标记为heuristic",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "准备删除的文件路径列表"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "每个文件最多返回的引用方数量",
+                            "default": 100
+                        }
+                    },
+                    "required": ["file_paths"]
+                }
+            ),
+            Tool(
+                name="build_lst_index",
+                description="从全部LST文件构建物品代码与文件路径的双向索引，供物品代码查询本地使用",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "include_names": {
+                            "type": "boolean",
+                            "description": "是否同时批量获取物品名称(供get_item_info(s)本地使用)",
+                            "default": False
+                        }
+                    },
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_string",
+                description="按ID获取字符串表中的单个字符串(服务端缓存字符串表，无需获取整张表)",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "string_id": {
+                            "type": "integer",
+                            "description": "字符串ID"
+                        }
+                    },
+                    "required": ["string_id"]
+                }
+            ),
+            Tool(
+                name="get_strings_batch",
+                description="按ID批量获取字符串表中的字符串",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "string_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "字符串ID列表"
+                        }
+                    },
+                    "required": ["string_ids"]
+                }
+            ),
+            Tool(
+                name="find_strings",
+                description="按文本反查字符串表中的字符串ID",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "text": {
+                            "type": "string",
+                            "description": "要查找的文本"
+                        },
+                        "exact": {
+                            "type": "boolean",
+                            "description": "是否完全匹配，否则为包含匹配",
+                            "default": True
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "最多返回的条目数",
+                            "default": 100
+                        }
+                    },
+                    "required": ["text"]
+                }
+            ),
+            Tool(
+                name="query_scripts",
+                description="按标签条件筛选脚本文件并返回指定字段，解析结果在本地缓存，重复查询无需再请求pvfUtility",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "dir_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要查询的目录列表"
+                        },
+                        "file_type": {
+                            "type": "string",
+                            "description": "目录查询时的文件后缀过滤，如.equ",
+                            "default": ""
+                        },
+                        "file_paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要查询的文件路径列表"
+                        },
+                        "where": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "tag": {"type": "string"},
+                                    "op": {
+                                        "type": "string",
+                                        "enum": ["exists", "not_exists", "=", "!=", ">", ">=", "<", "<=",
+                                                 "contains"]
+                                    },
+                                    "value": {},
+                                    "index": {"type": "integer", "default": 0}
+                                },
+                                "required": ["tag"]
+                            },
+                            "description": "筛选条件(全部满足)，如 {\"tag\": \"[minimum level]\", \"op\": \">=\", \"value\": 70}，index为标签下第几个值"
+                        },
+                        "fields": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要返回的标签，如[\"[name]\", \"[minimum level]\"]，为空时只返回路径"
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "最多返回的结果数",
+                            "default": 1000
+                        }
+                    },
+                    "required": []
+                }
+            ),
+            Tool(
+                name="sync_directory",
+                description="将封包目录镜像到本地目录并记录内容摘要清单(pull)，或将本地修改过的文件写回封包(push)，均只传输有变化的文件",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "local_dir": {
+                            "type": "string",
+                            "description": "本地镜像目录"
+                        },
+                        "mode": {
+                            "type": "string",
+                            "enum": ["pull", "push"],
+                            "description": "pull：封包到本地；push：本地修改写回封包",
+                            "default": "pull"
+                        },
+                        "dir_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要镜像的封包目录，如[\"equipment\", \"skill\"]，默认沿用上次同步的目录"
+                        },
+                        "file_type": {
+                            "type": "string",
+                            "description": "仅同步指定后缀的文件，如.equ",
+                            "default": ""
+                        },
+                        "delete": {
+                            "type": "boolean",
+                            "description": "pull时删除上游已删除的本地文件(默认是)；push时删除本地已删除的封包文件(默认否)"
+                        },
+                        "force": {
+                            "type": "boolean",
+                            "description": "push时即使上游内容在上次pull后发生变化也写回",
+                            "default": False
+                        },
+                        "dry_run": {
+                            "type": "boolean",
+                            "description": "只统计将要传输的文件，不写入",
+                            "default": False
+                        }
+                    },
+                    "required": ["local_dir"]
+                }
+            ),
+            Tool(
+                name="edit_files_batch",
+                description="在服务端批量读取-修改-写回文件：按文本/正则替换或修改脚本标签值，仅上传有变化的文件，失败时回滚",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "file_paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "要编辑的文件路径列表"
+                        },
+                        "pattern": {
+                            "type": "string",
+                            "description": "要查找的文本，is_regex为true时为正则表达式"
+                        },
+                        "replacement": {
+                            "type": "string",
+                            "description": "替换文本，正则模式下可使用\\1等分组引用",
+                            "default": ""
+                        },
+                        "is_regex": {
+                            "type": "boolean",
+                            "description": "pattern是否为正则表达式",
+                            "default": False
+                        },
+                        "ignore_case": {
+                            "type": "boolean",
+                            "description": "是否忽略大小写",
+                            "default": False
+                        },
+                        "count": {
+                            "type": "integer",
+                            "description": "每个文件最多替换的次数，0表示全部",
+                            "default": 0
+                        },
+                        "field_patches": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "field": {"type": "string"},
+                                    "value": {"type": "string"}
+                                },
+                                "required": ["field", "value"]
+                            },
+                            "description": "脚本标签修改列表，如 {\"field\": \"[attack speed]\", \"value\": \"10\"}"
+                        },
+                        "dry_run": {
+                            "type": "boolean",
+                            "description": "仅返回差异，不写回",
+                            "default": False
+                        },
+                        "diff_lines": {
+                            "type": "integer",
+                            "description": "每个文件最多返回的差异行数",
+                            "default": 10
+                        }
+                    },
+                    "required": ["file_paths"]
+                }
+            ),
+            Tool(
+                name="get_server_stats",
+                description="获取运行统计：各工具及上游接口的耗时分布、收发字节数、序列化耗时、错误数、缓存命中率及性能分析结果",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                }
+            ),
+            Tool(
+                name="get_cache_stats",
+                description="获取文件内容及物品信息缓存统计(命中/未命中/淘汰次数)",
+                inputSchema={
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                }
+            )
+        ]
+        for tool in tools:
+            tool.inputSchema.setdefault("properties", {})["output_mode"] = OUTPUT_MODE_PROPERTY
+        return tools
+    
+    def _register_tools(self):
+        """注册所有MCP工具函数"""
+        # 工具列表只构建一次，list_tools直接返回同一列表
+        self._tool_list = self._build_tool_list()
+        _validate_tool_registry(self._tool_list, self._local_handlers)
+        
+        @self.server.list_tools()
+        async def handle_list_tools() -> list[Tool]:
+            """返回可用的工具列表"""
+            return self._tool_list
+        
+        # 工具调用处理器
+        @self.server.call_tool()
+        async def handle_call_tool(name: str,
+                                   arguments: dict) -> list[Union[types.TextContent, types.EmbeddedResource]]:
+            """处理工具调用"""
+            _CURRENT_CLIENT.set(self._client_label())
+            return await self._run_tool_contents(name, arguments)
+    
+    def _client_label(self) -> str:
+        """按MCP会话为客户端分配标识(客户端名称-序号)，同一会话的调用使用同一标识"""
+        try:
+            session = self.server.request_context.session
+        except LookupError:
+            return "local"
+        label = self._client_labels.get(session)
+        if label is None:
+            params = getattr(session, "client_params", None)
+            name = params.clientInfo.name if params is not None else "client"
+            self._client_seq += 1
+            label = self._client_labels[session] = f"{name}-{self._client_seq}"
+        return label
+    
+    async def _run_tool(self, name: str, arguments: dict) -> str:
+        """执行工具并返回文本输出(内嵌资源格式时为结果摘要)"""
+        return (await self._run_tool_contents(name, arguments))[0].text
+    
+    def _encode_result(self, name: str, result: Any,
+                       mode: str) -> List[Union[types.TextContent, types.EmbeddedResource]]:
+        """
+        按输出格式编码工具结果
+        
+        Args:
+            name: 工具名称
+            result: 工具结果
+            mode: 输出格式
+            
+        Returns:
+            MCP内容列表；内嵌资源格式时为结果摘要文本及base64编码的资源
+        """
+        if mode == "pretty":
+            return [types.TextContent(type="text", text=_json_dumps(result, pretty=True))]
+        if mode == "columnar":
+            return [types.TextContent(type="text", text=_json_dumps(_to_columnar(result)))]
+        text = _json_dumps(result)
+        if mode == "compact":
+            return [types.TextContent(type="text", text=text)]
+        # 阈值按UTF-8字节数比较，中文内容的字符数远小于字节数
+        payload = text.encode("utf-8")
+        if len(payload) < self.embed_threshold:
+            return [types.TextContent(type="text", text=text)]
+        
+        if mode == "msgpack":
+            blob = _import_msgpack().packb(result, use_bin_type=True)
+            mime_type, encoding = "application/msgpack", "msgpack+base64"
+        else:
+            import gzip
+            
+            blob = gzip.compress(payload, compresslevel=6)
+            mime_type, encoding = "application/gzip", "gzip+base64"
+        self._resource_seq += 1
+        summary = {
+            "Encoding": encoding,
+            "ContentType": "application/json" if mode == "gzip" else mime_type,
+            "Bytes": len(payload),
+            "EncodedBytes": len(blob),
+            "IsError": result.get("IsError", False) if isinstance(result, dict) else False,
+            "Msg": result.get("Msg") if isinstance(result, dict) else None
+        }
+        del text, payload
+        return [
+            types.TextContent(type="text", text=_json_dumps(summary)),
+            types.EmbeddedResource(type="resource", resource=types.BlobResourceContents(
+                uri=f"pvf-result://{name}/{self._resource_seq}",
+                mimeType=mime_type,
+                blob=base64.b64encode(blob).decode("ascii")
+            ))
+        ]
+    
+    async def _run_tool_contents(self, name: str,
+                                 arguments: dict) -> List[Union[types.TextContent, types.EmbeddedResource]]:
+        """执行工具并按输出格式编码结果，记录耗时与输出大小，按配置进行性能分析"""
+        mode = self.output_mode
+        if "output_mode" in arguments:
+            arguments = dict(arguments)
+            mode = arguments.pop("output_mode") or mode
+        started = time.perf_counter()
+        profiler = None
+        if name in self.profile_tools or "all" in self.profile_tools:
+            import cProfile
+            
+            profiler = cProfile.Profile()
+        
+        async def execute() -> Tuple[List[Any], bool, float]:
+            if mode not in OUTPUT_MODES:
+                raise Exception(f"未知的输出格式: {mode}")
+            if mode == "msgpack":
+                _import_msgpack()
+            result = await self._call_api_tool(name, arguments)
+            serialize_started = time.perf_counter()
+            encoded = self._encode_result(name, result, mode)
+            return (encoded, isinstance(result, dict) and bool(result.get("IsError")),
+                    time.perf_counter() - serialize_started)
+        
+        serialize_seconds = 0.0
+        try:
+            # 分析器只在本次调用的协程执行时启用，不计入并发运行的其它调用
+            contents, error, serialize_seconds = await (
+                _ProfiledAwaitable(execute(), profiler) if profiler is not None else execute())
+        except Exception as e:
+            error = True
+            logger.error(f"工具调用失败 {name}: {e}")
+            contents = [types.TextContent(type="text", text=f"错误: {str(e)}")]
+        seconds = time.perf_counter() - started
+        if "first_tool_response" not in self.startup_times:
+            self.startup_times["first_tool_response"] = round(time.perf_counter() - _MODULE_STARTED, 3)
+            logger.info(f"启动耗时: {self.startup_times}")
+        bytes_out = sum(len(content.text.encode("utf-8")) if content.type == "text" else len(content.resource.blob)
+                        for content in contents)
+        self.metrics.record_tool(name, seconds, serialize_seconds, bytes_out, error)
+        self.metrics.record_client(_CURRENT_CLIENT.get(), name, seconds, bytes_out, error)
+        if profiler is not None:
+            import io
+            import pstats
+            
+            buffer = io.StringIO()
+            pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(DEFAULT_PROFILE_LINES)
+            self.metrics.profiles.append({
+                "tool": name,
+                "arguments": {k: v for k, v in arguments.items() if not isinstance(v, (list, dict))},
+                "seconds": round(seconds, 3),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "stats": buffer.getvalue()
+            })
+        return contents
+    
+    async def _call_api_tool(self, tool_name: str, arguments: dict) -> dict:
+        """调用对应的API工具"""
+        if not self.session and self._startup is not None:
+            await asyncio.shield(self._startup)
+        if not self.session:
+            raise RuntimeError("HTTP会话未初始化")
+        
+        if self.write_behind and tool_name in ("import_file", "delete_file"):
+            return await self._enqueue_write(tool_name, arguments)
+        if self._pending_writes:
+            paths = self._read_paths(tool_name, arguments)
+            if paths is None or any(_normalize_pvf_path(p) in self._pending_writes for p in paths):
+                await self._flush_writes()
+        return await self._dispatch_tool(tool_name, arguments)
+    
+    @staticmethod
+    def _read_paths(tool_name: str, arguments: dict) -> Optional[List[str]]:
+        """
+        返回工具会读取的文件路径
+        
+        Returns:
+            路径列表；涉及目录、搜索、另存为等无法按路径判断的操作返回None
+        """
+        if tool_name in PACK_INDEPENDENT_TOOLS:
+            return []
+        if tool_name in ("get_file_content", "get_file_data_json", "get_item_info", "get_file_icon",
+                         "get_lst_file_info", "file_exists"):
+            return [arguments.get("file_path", "")]
+        if tool_name == "get_file_contents_batch":
+            return list(arguments.get("file_list", []))
+        if tool_name == "get_item_infos_batch":
+            return list(arguments.get("file_paths", []))
+        return None
+    
+    async def _enqueue_write(self, tool_name: str, arguments: dict) -> dict:
+        """将单个写入放入写缓冲，等待其所在批次提交后返回该写入的结果"""
+        path = arguments.get("file_path", "")
+        key = _normalize_pvf_path(path)
+        future = asyncio.get_running_loop().create_future()
+        entry = self._pending_writes.get(key)
+        if entry is None:
+            entry = self._pending_writes[key] = {"futures": []}
+        else:
+            # 同一路径的多次写入合并为最后一次
+            self.write_stats["coalesced"] += 1
+        entry["op"] = "import" if tool_name == "import_file" else "delete"
+        entry["path"] = path
+        entry["content"] = arguments.get("file_content", "")
+        entry["futures"].append((future, entry["op"]))
+        self.write_stats["queued"] += 1
+        
+        if len(self._pending_writes) >= self.write_batch_size:
+            self._spawn_write_task(self._flush_writes())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._spawn_write_task(self._delayed_flush())
+        return await future
+    
+    def _spawn_write_task(self, coro: Awaitable[None]) -> asyncio.Task:
+        """启动后台提交任务并保留引用，完成时取出异常记录日志"""
+        task = asyncio.ensure_future(coro)
+        self._write_tasks.add(task)
+        
+        def _done(finished: asyncio.Task):
+            self._write_tasks.discard(finished)
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.error(f"提交写缓冲失败: {finished.exception()}")
+        
+        task.add_done_callback(_done)
+        return task
+    
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.write_delay)
+        await self._flush_writes()
+    
+    async def _flush_writes(self):
+        """将写缓冲中的写入以ImportFiles/DeleteFiles批量提交，并向各调用方返回各自的结果"""
+        async with self._flush_lock:
+            if not self._pending_writes:
+                return
+            pending = list(self._pending_writes.values())
+            self._pending_writes.clear()
+            self.write_stats["flushes"] += 1
+            imports = [e for e in pending if e["op"] == "import"]
+            deletes = [e for e in pending if e["op"] == "delete"]
+            batches = []
+            if imports:
+                batches.append((imports, "import_files_batch", {
+                    "files": [{"FilePath": e["path"], "FileContent": e["content"]} for e in imports]
+                }))
+            if deletes:
+                batches.append((deletes, "delete_files_batch", {"file_paths": [e["path"] for e in deletes]}))
+            
+            outcomes = await asyncio.gather(
+                *(self._dispatch_tool(tool, args) for _, tool, args in batches), return_exceptions=True
             )
+            for (entries, _, _), outcome in zip(batches, outcomes):
+                self._resolve_writes(entries, outcome, len(pending))
+    
+    def _resolve_writes(self, entries: List[Dict[str, Any]], outcome: Any, batched: int):
+        """
+        按批量结果(含分块错误)设置每个写入的结果
+        
+        被同一路径后续写入覆盖的写入从未提交，报告为未应用(Data为false)而不是成功
+        """
+        failed: Dict[int, str] = {}
+        if isinstance(outcome, dict) and outcome.get("IsError"):
+            chunk_errors = outcome.get("ChunkErrors")
+            if chunk_errors:
+                for error in chunk_errors:
+                    for index in range(error["start"], error["start"] + error["count"]):
+                        failed[index] = error["error"]
+            else:
+                failed = {i: outcome.get("Msg") or "批量写入失败" for i in range(len(entries))}
+        for index, entry in enumerate(entries):
+            last = len(entry["futures"]) - 1
+            for position, (future, op) in enumerate(entry["futures"]):
+                if future.done():
+                    continue
+                if position < last:
+                    self.write_stats["superseded"] += 1
+                    future.set_result({
+                        "Data": False,
+                        "IsError": False,
+                        "Msg": f"已被同一路径之后的{'导入' if entry['op'] == 'import' else '删除'}覆盖，未提交",
+                        "WriteBehind": {"batched": batched, "superseded": True, "applied": False, "op": op}
+                    })
+                    continue
+                if isinstance(outcome, BaseException):
+                    future.set_exception(outcome)
+                    continue
+                future.set_result({
+                    "Data": index not in failed,
+                    "IsError": index in failed,
+                    "Msg": failed.get(index),
+                    "WriteBehind": {"batched": batched, "superseded": False, "applied": index not in failed, "op": op}
+                })
+    
+    async def _dispatch_tool(self, tool_name: str, arguments: dict) -> dict:
+        """分发工具调用到本地缓存/索引或上游接口"""
+        if tool_name in PAGED_TOOLS and any(k in arguments for k in ("offset", "limit", "handle")):
+            return await self._call_paged(tool_name, arguments)
+        handler = self._local_handlers.get(tool_name)
+        if handler is not None:
+            return await handler(arguments)
+        
+        written = self._written_paths(tool_name, arguments)
+        try:
+            result = await self._request_upstream(tool_name, arguments)
+        except Exception:
+            if written:
+                self.path_tree.clear()
+            raise
+        finally:
+            # 写操作无论成功与否都使相关缓存失效
+            if written:
+                self._invalidate_paths(written)
+        
+        if written:
+            self._apply_tree_writes(tool_name, written, result)
+        elif tool_name == "get_pvf_pack_file_path":
+            self._observe_pack_path(result)
+        return result
+    
+    async def _metadata_cached(self, tool_name: str, arguments: dict) -> dict:
+        """版本号、根目录列表、LST列表：成功的结果缓存到写入或封包切换为止"""
+        if tool_name != "get_version":
+            await self._ensure_pack_current()
+        result = self._metadata.get(tool_name)
+        if result is not None:
+            return result
+        epoch = self._metadata_epoch
+        result = await self._request_upstream(tool_name, arguments)
+        if not (isinstance(result, dict) and result.get("IsError")):
+            if epoch == self._metadata_epoch:
+                self._metadata[tool_name] = result
+            if tool_name == "get_pvf_root_directory":
+                self.path_tree.set_roots(_extract_path_list(result))
+        return result
+    
+    async def _cache_stats(self, arguments: dict) -> dict:
+        """get_cache_stats：各缓存与索引的统计"""
+        return {
+            "content": self.content_cache.stats(),
+            "item_info": self.item_info_cache.stats(),
+            "item_code": self.item_code_cache.stats(),
+            "script": self.script_cache.stats(),
+            "search_index": self.search_index.stats(),
+            "lst_index": self.lst_index.stats(),
+            "reference_graph": self.ref_graph.stats(),
+            "single_flight": {
+                "in_flight": len(self._inflight),
+                "coalesced": self.coalesced_requests
+            },
+            "paging": self.result_sets.stats(),
+            "path_tree": self.path_tree.stats(),
+            "write_behind": {
+                "enabled": self.write_behind,
+                "pending": len(self._pending_writes),
+                **self.write_stats
+            },
+            "offline_pvf": {
+                "enabled": bool(self.offline_pvf),
+                "pack_path": self._offline_pack.pack_path if self._offline_pack else None,
+                "files": len(self._offline_pack._entries) if self._offline_pack else 0,
+                "dirty_paths": len(self._offline_dirty),
+                "error": self._offline_error
+            },
+            "string_table": {
+                "loaded": self.string_table is not None,
+                "strings": len(self.string_table) if self.string_table else 0,
+                "bytes": self.string_table.nbytes if self.string_table else 0
+            }
+        }
+    
+    async def _server_stats(self, arguments: dict) -> dict:
+        """get_server_stats：运行统计及缓存统计"""
+        return {
+            **self.metrics.stats(),
+            "startup_seconds": self.startup_times,
+            "resilience": {**self.resilience_stats, "circuit_breaker": self.breaker.stats()},
+            "upstream": {**self.upstream_stats, **self.scheduler.stats()},
+            "active_clients": len(self._client_labels),
+            "sampling": self.sampler.stats() if self.sampler is not None else None,
+            "caches": await self._cache_stats({})
+        }
+    
+    async def _get_string(self, arguments: dict) -> dict:
+        table = await self._get_string_table()
+        return {"Data": table.get(int(arguments.get("string_id", -1))), "IsError": False, "Msg": None}
+    
+    async def _get_strings_batch(self, arguments: dict) -> dict:
+        table = await self._get_string_table()
+        ids = [int(i) for i in arguments.get("string_ids", [])]
+        return {"Data": {str(i): table.get(i) for i in ids}, "IsError": False, "Msg": None}
+    
+    async def _find_strings(self, arguments: dict) -> dict:
+        table = await self._get_string_table()
+        return {
+            "Data": table.find(arguments.get("text", ""), arguments.get("exact", True),
+                               int(arguments.get("limit", 100))),
+            "IsError": False,
+            "Msg": None
+        }
+    
+    async def _build_lst_index_locked(self, arguments: dict) -> dict:
+        async with self._lst_index_lock:
+            return await self._build_lst_index(arguments.get("include_names", False))
+    
+    async def _edit_files_batch_locked(self, arguments: dict) -> dict:
+        async with self._edit_lock:
+            return await self._edit_files_batch(arguments)
+    
+    async def _get_item_infos_batch_indexed(self, arguments: dict) -> dict:
+        tool_name = "get_item_infos_batch"
+        return await self._lookup_batch_indexed(
+            tool_name, arguments, "file_paths",
+            lambda path: self.lst_index.path_record(tool_name, path), self._get_item_infos_batch_cached)
+    
+    async def _item_codes_to_file_infos_batch_indexed(self, arguments: dict) -> dict:
+        tool_name = "item_codes_to_file_infos_batch"
+        lst_names = _split_lst_names(arguments.get("lst_names", []))
+        return await self._lookup_batch_indexed(
+            tool_name, arguments, "item_codes",
+            lambda code: self.lst_index.code_record(tool_name, lst_names, code),
+            self._item_codes_to_file_infos_batch_cached)
+    
+    def _apply_tree_writes(self, tool_name: str, paths: List[str], result: Any):
+        """写入成功后原地更新目录树，结果不明确时清空目录树"""
+        tree = self.path_tree
+        tree.epoch += 1
+        if isinstance(result, dict) and result.get("IsError"):
+            tree.clear()
+        elif tool_name in ("import_file", "import_files_batch"):
+            for path in paths:
+                tree.add_file(path)
+        else:
+            for path in paths:
+                tree.remove_file(path)
+    
+    async def _fill_directory(self, dir_name: str) -> dict:
+        """获取目录的完整文件列表并填充目录树"""
+        epoch = self.path_tree.epoch
+        result = await self._request_upstream("get_file_list", {"dir_name": dir_name})
+        data = _unwrap_data(result)
+        if isinstance(data, list) and not (isinstance(result, dict) and result.get("IsError")) \
+                and epoch == self.path_tree.epoch:
+            self.path_tree.fill(dir_name, data)
+            if isinstance(result, dict):
+                self.path_tree.envelope = {k: v for k, v in result.items() if k != "Data"}
+        return result
+    
+    async def _file_exists_cached(self, arguments: dict) -> dict:
+        """file_exists：目录树可确定时本地判断，否则询问上游并记录结果"""
+        await self._ensure_pack_current()
+        path = arguments.get("file_path", "")
+        found = self.path_tree.file_exists(path)
+        if found is not None:
+            return {"Data": found, "IsError": False, "Msg": None}
+        epoch = self.path_tree.epoch
+        result = await self._request_upstream("file_exists", arguments)
+        data = _unwrap_data(result)
+        if isinstance(data, bool) and not (isinstance(result, dict) and result.get("IsError")) \
+                and epoch == self.path_tree.epoch:
+            self.path_tree.record_file(path, data)
+        return result
+    
+    async def _folder_exists_cached(self, arguments: dict) -> dict:
+        """folder_exists：根据目录树和根目录列表本地判断，无法确定时请求上游并记录存在的目录"""
+        await self._ensure_pack_current()
+        path = arguments.get("folder_path", "")
+        found = self.path_tree.folder_exists(path)
+        if found is None and not self.path_tree.roots_known:
+            result = await self._request_upstream("get_pvf_root_directory", {})
+            if not (isinstance(result, dict) and result.get("IsError")):
+                self.path_tree.set_roots(_extract_path_list(result))
+                found = self.path_tree.folder_exists(path)
+        if found is None:
+            result = await self._request_upstream("folder_exists", arguments)
+            if _unwrap_data(result) is True:
+                self.path_tree.mark_dir(path)
+            return result
+        return {"Data": found, "IsError": False, "Msg": None}
+    
+    async def _get_file_list_cached(self, arguments: dict) -> dict:
+        """get_file_list：目录已填充时本地列出并按后缀过滤，否则获取完整列表填充后再过滤"""
+        if arguments.get("return_type", 0) != 0:
+            return await self._request_upstream("get_file_list", arguments)
+        await self._ensure_pack_current()
+        dir_name = arguments.get("dir_name", "")
+        file_type = arguments.get("file_type", "")
+        files = self.path_tree.list_files(dir_name, file_type)
+        if files is None:
+            if not self.path_tree.entries_are_paths:
+                # 列表项不是路径字符串，无法在本地组装，原样返回上游结果
+                return await self._request_upstream("get_file_list", arguments)
+            result = await self._fill_directory(dir_name)
+            if not file_type or not isinstance(_unwrap_data(result), list) \
+                    or (isinstance(result, dict) and result.get("IsError")):
+                return result
+            files = self.path_tree.list_files(dir_name, file_type)
+            if files is None:
+                # 列表请求期间发生了写入，或列表项无法在本地组装
+                return await self._request_upstream("get_file_list", arguments)
+            return {**result, "Data": files}
+        return {**self.path_tree.envelope, "Data": files}
+    
+    async def _get_string_table(self) -> StringTable:
+        """获取紧凑字符串表，首次使用或封包切换后从getStringTable加载"""
+        await self._ensure_pack_current()
+        if self.string_table is not None:
+            return self.string_table
+        async with self._string_table_lock:
+            if self.string_table is None:
+                result = await self._request_upstream("get_string_table", {})
+                if isinstance(result, dict) and result.get("IsError"):
+                    raise Exception(f"获取字符串表失败: {result.get('Msg')}")
+                table = StringTable.from_data(_unwrap_data(result))
+                del result
+                logger.info(f"已加载字符串表: {len(table)} 条, {table.nbytes} 字节")
+                self.string_table = table
+            return self.string_table
+    
+    async def _call_paged(self, tool_name: str, arguments: dict) -> dict:
+        """
+        分页访问大结果：首次查询时完整获取并缓存结果集，后续页面从内存返回
+        
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数，offset/limit/handle为分页参数，其余为查询参数
+        """
+        offset = max(0, int(arguments.get("offset") or 0))
+        limit = int(arguments.get("limit") or DEFAULT_PAGE_SIZE)
+        if limit <= 0:
+            raise Exception("limit必须大于0")
+        query = {k: v for k, v in arguments.items() if k not in PAGING_PROPERTIES}
+        
+        handle = arguments.get("handle")
+        if handle:
+            entry = self.result_sets.get(handle)
+            if entry is None or entry["tool"] != tool_name:
+                raise Exception(f"结果句柄不存在或已过期: {handle}")
+        else:
+            entry = self.result_sets.find(tool_name, query)
+            if entry is None:
+                result = await self._call_api_tool(tool_name, query)
+                if isinstance(result, dict) and result.get("IsError"):
+                    return result
+                entry = self.result_sets.put(tool_name, query, result)
+        
+        items = entry["items"]
+        if not isinstance(items, list):
+            # 非列表结果无法分页，直接返回完整结果
+            return entry["result"]
+        page = items[offset:offset + limit]
+        end = offset + len(page)
+        response = dict(entry["result"]) if isinstance(entry["result"], dict) else {"IsError": False, "Msg": None}
+        response["Data"] = dict(page) if entry["is_dict"] else page
+        response["Page"] = {
+            "handle": entry["handle"],
+            "offset": offset,
+            "limit": limit,
+            "total": len(items),
+            "next_offset": end if end < len(items) else None,
+            "expires_in": self.result_sets.ttl
+        }
+        return response
+    
+    def _invalidate_paths(self, paths: List[str]):
+        """写入/删除文件后使相关缓存失效"""
+        self.content_cache.invalidate_paths(paths)
+        self.item_info_cache.invalidate([_normalize_pvf_path(p) for p in paths])
+        self.script_cache.invalidate([_normalize_pvf_path(p) for p in paths])
+        # 物品代码映射依赖LST及目标文件，任意写入都整体失效
+        self.item_code_cache.clear()
+        self.search_index.mark_dirty(paths)
+        self.lst_index.on_paths_written(paths)
+        self.ref_graph.mark_dirty(paths)
+        # 写入前发起的读请求可能返回旧内容，之后的请求不再合并到这些请求上
+        self._inflight.clear()
+        self._offline_dirty.update(_normalize_pvf_path(p) for p in paths)
+        # 写入可能新增/删除根目录或LST文件
+        self._metadata_epoch += 1
+        self._metadata.pop("get_pvf_root_directory", None)
+        if any(_normalize_pvf_path(p).endswith(".lst") for p in paths):
+            self._metadata.pop("get_all_lst_file_list", None)
+        self.result_sets.invalidate(PAGED_TOOLS - {"get_string_table"})
+    
+    @staticmethod
+    def _written_paths(tool_name: str, arguments: dict) -> List[str]:
+        """返回写类工具会修改的文件路径列表"""
+        if tool_name in ("import_file", "delete_file"):
+            path = arguments.get("file_path")
+            return [path] if path else []
+        if tool_name == "delete_files_batch":
+            return [p for p in arguments.get("file_paths", []) if p]
+        if tool_name == "import_files_batch":
+            return [f.get("FilePath") for f in arguments.get("files", [])
+                    if isinstance(f, dict) and f.get("FilePath")]
+        return []
+    
+    async def _get_file_content_cached(self, arguments: dict) -> dict:
+        """带读穿缓存的get_file_content"""
+        key = ContentCache.make_key(
+            arguments.get("file_path", ""),
+            arguments.get("use_compatible_decompiler", False),
+            arguments.get("encoding_type", "UTF8")
+        )
+        if self.content_cache.enabled:
+            await self._ensure_pack_current()
+            content = self.content_cache.get(key)
+            if content is not None:
+                return {"Data": content, "IsError": False, "Msg": None}
+        
+        epoch = self.content_cache.epoch
+        result = await self._request_upstream("get_file_content", arguments)
+        # 离线反编译的文本不进入缓存，缓存内容始终与pvfUtility一致
+        if isinstance(result, dict) and not result.get("IsError") and isinstance(result.get("Data"), str) \
+                and result.get("Source") != "offline_pvf":
+            self.content_cache.put(key, result["Data"], epoch)
+        return result
+    
+    async def _get_file_contents_batch_cached(self, arguments: dict) -> dict:
+        """带缓存的get_file_contents_batch：命中部分本地返回，仅将未命中部分转发上游"""
+        file_list = arguments.get("file_list", [])
+        if not self.content_cache.enabled or not file_list:
+            return await self._request_upstream("get_file_contents_batch", arguments)
+        
+        await self._ensure_pack_current()
+        use_compat = arguments.get("use_compatible_decompiler", False)
+        encoding = arguments.get("encoding_type", "UTF8")
+        cached: Dict[str, str] = {}
+        misses: List[str] = []
+        miss_paths = set()
+        for path in file_list:
+            if path in cached or path in miss_paths:
+                continue
+            content = self.content_cache.get(ContentCache.make_key(path, use_compat, encoding))
+            if content is None:
+                misses.append(path)
+                miss_paths.add(path)
+            else:
+                cached[path] = content
+        as_dict = self._batch_data_is_dict.get("get_file_contents_batch", True)
+        if not misses:
+            values = [cached[p] for p in file_list]
+            if not as_dict:
+                values = [{"FilePath": p, "FileContent": c} for p, c in zip(file_list, values)]
+            return _merge_batch_response(None, file_list, values, as_dict)
+        
+        epoch = self.content_cache.epoch
+        result = await self._request_upstream("get_file_contents_batch", {**arguments, "file_list": misses})
+        fetched = _extract_contents_map(result)
+        if not (isinstance(result, dict) and result.get("Source") == "offline_pvf"):
+            for path, content in fetched.items():
+                self.content_cache.put(ContentCache.make_key(path, use_compat, encoding), content, epoch)
+        if not cached or not isinstance(_unwrap_data(result), (dict, list)):
+            return result
+        as_dict = isinstance(_unwrap_data(result), dict)
+        self._batch_data_is_dict["get_file_contents_batch"] = as_dict
+        
+        # 上游返回的路径大小写可能与请求不同，按规范化路径回查
+        fetched_normalized = {_normalize_pvf_path(p): c for p, c in fetched.items()}
+        values = [cached[p] if p in cached else fetched_normalized.get(_normalize_pvf_path(p))
+                  for p in file_list]
+        if not as_dict:
+            values = [{"FilePath": p, "FileContent": c} for p, c in zip(file_list, values)]
+        return _merge_batch_response(result, file_list, values, as_dict)
+    
+    async def _get_keyed_batch_cached(self, tool_name: str, arguments: dict, list_arg: str,
+                                      cache: RecordCache, make_key) -> dict:
+        """
+        "一键一结果"批量接口的通用缓存拆分
+        
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            list_arg: 键列表所在的参数名
+            cache: 使用的结果缓存
+            make_key: 将单个键转换为缓存键的函数
+        """
+        keys = arguments.get(list_arg, [])
+        if not cache.enabled or not keys:
+            return await self._request_upstream(tool_name, arguments)
+        
+        await self._ensure_pack_current()
+        cached: Dict[Any, Any] = {}
+        misses: List[Any] = []
+        miss_keys = set()
+        for key in keys:
+            cache_key = make_key(key)
+            if cache_key in cached or cache_key in miss_keys:
+                continue
+            value = cache.get(cache_key)
+            if value is None:
+                misses.append(key)
+                miss_keys.add(cache_key)
+            else:
+                cached[cache_key] = value
+        if not misses:
+            return _merge_batch_response(None, keys, [cached[make_key(k)] for k in keys],
+                                         self._batch_data_is_dict.get(tool_name, False))
+        
+        epoch = cache.epoch
+        result = await self._request_upstream(tool_name, {**arguments, list_arg: misses})
+        values = _split_batch_result(result, misses)
+        if values is None:
+            # 无法按键对齐时不缓存，直接返回上游结果
+            return result
+        for key, value in zip(misses, values):
+            cache.put(make_key(key), value, epoch)
+            cached.setdefault(make_key(key), value)
+        as_dict = isinstance(_unwrap_data(result), dict)
+        self._batch_data_is_dict[tool_name] = as_dict
+        return _merge_batch_response(result, keys, [cached.get(make_key(k)) for k in keys], as_dict)
+    
+    async def _get_item_infos_batch_cached(self, arguments: dict) -> dict:
+        """带缓存的get_item_infos_batch"""
+        return await self._get_keyed_batch_cached(
+            "get_item_infos_batch", arguments, "file_paths",
+            self.item_info_cache, _normalize_pvf_path
+        )
+    
+    async def _item_codes_to_file_infos_batch_cached(self, arguments: dict) -> dict:
+        """带缓存的item_codes_to_file_infos_batch"""
+        lst_names = tuple(sorted(str(n).strip().lower() for n in arguments.get("lst_names", [])))
+        return await self._get_keyed_batch_cached(
+            "item_codes_to_file_infos_batch", arguments, "item_codes",
+            self.item_code_cache, lambda code: (lst_names, code)
+        )
+    
+    def _observe_pack_path(self, result: Any):
+        """记录当前封包路径，发现封包切换时清空缓存"""
+        pack_path = result.get("Data") if isinstance(result, dict) else result
+        if not isinstance(pack_path, str):
+            return
+        self._last_pack_check = time.monotonic()
+        if self._pack_path is not None and pack_path != self._pack_path:
+            logger.info(f"检测到封包切换: {self._pack_path} -> {pack_path}，清空缓存")
+            self._on_pack_changed()
+        self._pack_path = pack_path
+    
+    def _on_pack_changed(self):
+        """封包切换时的回调"""
+        self._inflight.clear()
+        self.path_tree.clear()
+        self.string_table = None
+        self.result_sets.clear()
+        self.content_cache.clear()
+        self.item_info_cache.clear()
+        self.item_code_cache.clear()
+        self.script_cache.clear()
+        self._metadata_epoch += 1
+        self._metadata = {k: v for k, v in self._metadata.items() if k == "get_version"}
+    
+    async def _build_search_index(self, arguments: dict) -> dict:
+        """
+        构建search_pvf本地索引
+        
+        索引记录覆盖的目录和文件后缀，只回答范围内的搜索；列表或内容读取有任何失败时不安装不完整的索引
+        """
+        started = time.monotonic()
+        index = self.search_index
+        scope = arguments.get("dir_names") or []
+        dir_names = scope or _extract_path_list(await self._request_upstream("get_pvf_root_directory", {}))
+        file_type = arguments.get("file_type", "")
+        listings = await asyncio.gather(*(
+            self._request_upstream("get_file_list", {"dir_name": d, "file_type": file_type})
+            for d in dir_names
+        ))
+        file_list = list(dict.fromkeys(p for listing in listings for p in _extract_path_list(listing)))
+        failed_listings = [d for d, listing in zip(dir_names, listings)
+                           if isinstance(listing, dict) and listing.get("IsError")]
+        data: Dict[str, Any] = {"directories": dir_names, "listed_files": len(file_list)}
+        if failed_listings:
+            return {
+                "Data": {**data, "failed_directories": failed_listings, **index.stats()},
+                "IsError": True,
+                "Msg": f"{len(failed_listings)} 个目录获取文件列表失败，未更新索引"
+            }
+        
+        if self._pending_writes:
+            await self._flush_writes()
+        await self._ensure_pack_current(force=True)
+        pack_path = self._pack_path
+        # 此后的写入记录在dirty中，重建完成后再刷新
+        previous = index.begin_build()
+        result = await self._read_contents_upstream(file_list)
+        if isinstance(result, dict) and result.get("IsError"):
+            index.restore_dirty(previous)
+            response = {
+                "Data": {**data, **index.stats()},
+                "IsError": True,
+                "Msg": f"{result.get('Msg') or '读取文件内容失败'}，未更新索引"
+            }
+            if "ChunkErrors" in result:
+                response["ChunkErrors"] = result["ChunkErrors"]
+            return response
+        contents = _extract_contents_map(result)
+        data["indexed_files"] = len(contents)
+        # 未给出目录时索引覆盖整个封包
+        await asyncio.to_thread(index.replace_all, pack_path, contents, scope, file_type)
+        del contents, result
+        try:
+            await self._refresh_search_index()
+        except Exception as e:
+            logger.warning(f"刷新重建期间写入的文件失败，将在下次搜索时重试: {e}")
+        if index.paths_shape is None:
+            await self._probe_search_shape()
+        await asyncio.to_thread(index.save)
+        
+        data["seconds"] = round(time.monotonic() - started, 3)
+        return {"Data": {**data, **index.stats()}, "IsError": False, "Msg": None}
+    
+    async def _probe_search_shape(self):
+        """向上游执行一次必然有结果的搜索，确认search_pvf的结果形态后本地索引即可响应"""
+        probe = self.search_index.probe_query()
+        if probe is None:
+            return
+        keyword, folder = probe
+        try:
+            result = await self._request_upstream("search_pvf", {"keyword": keyword, "search_folder": folder})
+        except Exception as e:
+            logger.warning(f"确认search_pvf结果形态失败，将由首次上游搜索确认: {e}")
+            return
+        if isinstance(result, dict) and not result.get("IsError"):
+            self.search_index.observe_result(result.get("Data"))
+    
+    async def _build_reference_graph_locked(self, arguments: dict) -> dict:
+        async with self._ref_graph_lock:
+            return await self._build_reference_graph(arguments)
+    
+    async def _build_reference_graph(self, arguments: dict) -> dict:
+        """扫描脚本构建引用图(调用方需持有_ref_graph_lock)"""
+        started = time.monotonic()
+        dir_names = arguments.get("dir_names") or []
+        if not dir_names:
+            dir_names = _extract_path_list(await self._request_upstream("get_pvf_root_directory", {}))
+        file_type = arguments.get("file_type", "")
+        listings = await asyncio.gather(*(
+            self._request_upstream("get_file_list", {"dir_name": d, "file_type": file_type})
+            for d in dir_names
+        ))
+        file_list = list(dict.fromkeys(p for listing in listings for p in _extract_path_list(listing)))
+        failed_listings = [d for d, listing in zip(dir_names, listings)
+                           if isinstance(listing, dict) and listing.get("IsError")]
+        if failed_listings:
+            return {
+                "Data": {"directories": dir_names, "listed_files": len(file_list),
+                         "failed_directories": failed_listings, **self.ref_graph.stats()},
+                "IsError": True,
+                "Msg": f"{len(failed_listings)} 个目录获取文件列表失败，未更新引用图"
+            }
+        
+        if self._pending_writes:
+            await self._flush_writes()
+        await self._ensure_pack_current(force=True)
+        pack_path = self._pack_path
+        known = {_normalize_pvf_path(p) for p in file_list}
+        groups = [file_list[i:i + DEFAULT_REFERENCE_SCAN_GROUP]
+                  for i in range(0, len(file_list), DEFAULT_REFERENCE_SCAN_GROUP)]
+        
+        def extract(contents: Dict[str, Any]) -> Dict[str, Any]:
+            return {path: _extract_references(path, content, known)
+                    for path, content in contents.items() if isinstance(content, str)}
+        
+        def fetch(group: List[str]) -> asyncio.Future:
+            return asyncio.ensure_future(self._request_upstream("get_file_contents_batch", {"file_list": group}))
+        
+        docs: Dict[str, Any] = {}
+        chunk_errors = []
+        pending = fetch(groups[0]) if groups else None
+        try:
+            for index in range(len(groups)):
+                result = await pending
+                # 提取本组引用的同时读取下一组
+                pending = fetch(groups[index + 1]) if index + 1 < len(groups) else None
+                if isinstance(result, dict) and result.get("IsError"):
+                    if not result.get("ChunkErrors"):
+                        raise Exception(f"读取文件内容失败: {result.get('Msg')}")
+                    chunk_errors.extend(result["ChunkErrors"])
+                docs.update(await asyncio.to_thread(extract, _extract_contents_map(result)))
+                del result
+        finally:
+            if pending is not None:
+                pending.cancel()
+        
+        await asyncio.to_thread(self.ref_graph.replace_all, pack_path, dir_names, docs)
+        await asyncio.to_thread(self.ref_graph.save)
+        response = {
+            "Data": {
+                "directories": dir_names,
+                "listed_files": len(file_list),
+                "unreadable": len(file_list) - len(docs),
+                "seconds": round(time.monotonic() - started, 3),
+                **self.ref_graph.stats()
+            },
+            "IsError": False,
+            "Msg": None
+        }
+        if chunk_errors:
+            response["ChunkErrors"] = chunk_errors
+        return response
+    
+    async def _ensure_reference_graph(self):
+        """确保引用图对应当前封包并已应用写入，同时确保用于解析代码的LST索引可用"""
+        graph = self.ref_graph
+        async with self._ref_graph_lock:
+            if not graph.loaded:
+                await asyncio.to_thread(graph.load)
+            await self._ensure_pack_current(force=self._pack_path is None)
+            if not graph.matches(self._pack_path):
+                raise Exception("引用图未建立或与当前封包不一致，请先调用build_reference_graph")
+            if graph.dirty:
+                pending = dict(graph.dirty)
+                graph.dirty.clear()
+                dirty = sorted(pending.values())
+                try:
+                    result = await self._call_api_tool("get_file_contents_batch", {"file_list": dirty})
+                except BaseException:
+                    for key, path in pending.items():
+                        graph.dirty.setdefault(key, path)
+                    raise
+                if isinstance(result, dict) and result.get("IsError"):
+                    for key, path in pending.items():
+                        graph.dirty.setdefault(key, path)
+                    raise Exception(f"刷新引用图失败: {result.get('Msg')}")
+                fetched = {_normalize_pvf_path(p): c for p, c in _extract_contents_map(result).items()}
+                await asyncio.to_thread(graph.apply_updates, {p: fetched.get(_normalize_pvf_path(p)) for p in dirty})
+        index = self.lst_index
+        async with self._lst_index_lock:
+            if not index.loaded:
+                await asyncio.to_thread(index.load)
+            if not index.matches(self._pack_path):
+                await self._build_lst_index(index.include_names)
+    
+    async def _get_references(self, arguments: dict) -> dict:
+        """get_references：查询文件的正向引用和反向引用"""
+        direction = arguments.get("direction", "both")
+        if direction not in ("forward", "reverse", "both"):
+            raise Exception(f"未知的查询方向: {direction}")
+        limit = int(arguments.get("limit", 500))
+        await self._ensure_reference_graph()
+        path = arguments.get("file_path")
+        if not path:
+            code = arguments.get("item_code")
+            if code is None:
+                raise Exception("需要提供file_path或item_code")
+            lst_names = _split_lst_names(arguments.get("lst_names")) or ["equipment", "stackable"]
+            record = self.lst_index.lookup_code(lst_names, int(code))
+            if record is None:
+                raise Exception(f"LST中不存在代码: {code}")
+            path = record["FilePath"]
+        
+        data: Dict[str, Any] = {"path": path}
+        if direction in ("forward", "both"):
+            forward = self.ref_graph.forward(path, self.lst_index)
+            if forward is None:
+                data["forward"] = None
+                data["indexed"] = False
+            else:
+                data["forward"] = forward["references"][:limit]
+                data["forward_total"] = len(forward["references"])
+                data["unresolved_codes"] = forward["unresolved_codes"]
+        if direction in ("reverse", "both"):
+            reverse = self.ref_graph.reverse(path, self.lst_index)
+            data["listed_in"] = reverse["listed_in"]
+            data["reverse"] = reverse["referrers"][:limit]
+            data["reverse_total"] = len(reverse["referrers"])
+        data["scanned_dirs"] = self.ref_graph.dir_names
+        data["heuristic_note"] = REFERENCE_HEURISTIC_NOTE
+        return {"Data": data, "IsError": False, "Msg": None}
+    
+    async def _analyze_delete_impact(self, arguments: dict) -> dict:
+        """analyze_delete_impact：分析删除一组文件后会失效的引用"""
+        paths = list(dict.fromkeys(arguments.get("file_paths") or []))
+        if not paths:
+            raise Exception("需要提供file_paths")
+        limit = int(arguments.get("limit", 100))
+        await self._ensure_reference_graph()
+        graph = self.ref_graph
+        deleting = {_normalize_pvf_path(p) for p in paths}
+        files = []
+        blocked = 0
+        orphans: Dict[str, str] = {}
+        for path in paths:
+            reverse = graph.reverse(path, self.lst_index, exclude=deleting)
+            referrers = reverse["referrers"]
+            if referrers or reverse["listed_in"]:
+                blocked += 1
+            files.append({
+                "path": path,
+                "listed_in": reverse["listed_in"],
+                "referrer_count": len(referrers),
+                "heuristic_referrer_count": sum(1 for r in referrers if r.get("heuristic")),
+                "referrers": referrers[:limit]
+            })
+            forward = graph.forward(path, self.lst_index)
+            for ref in (forward or {}).get("references", ()):
+                key = _normalize_pvf_path(ref["target"])
+                if ref["kind"] == "path" and key not in deleting and not (graph.referrers_of(key) - deleting):
+                    orphans.setdefault(key, ref["target"])
+        return {
+            "Data": {
+                "safe": blocked == 0,
+                "blocked_files": blocked,
+                "files": files,
+                "orphaned_after_delete": sorted(orphans.values()),
+                "scanned_dirs": graph.dir_names,
+                "heuristic_note": REFERENCE_HEURISTIC_NOTE
+            },
+            "IsError": False,
+            "Msg": None
+        }
+    
+    async def _get_script_docs(self, paths: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        获取已解析的脚本文档，未缓存的文件通过批量读取获取后解析
+        
+        Returns:
+            (路径 -> 文档, 读取失败的路径列表)
+        """
+        await self._ensure_pack_current()
+        docs = {}
+        missing = []
+        for path in paths:
+            doc = self.script_cache.get(_normalize_pvf_path(path))
+            if doc is None:
+                missing.append(path)
+            else:
+                docs[path] = doc
+        if not missing:
+            return docs, []
+        
+        epoch = self.script_cache.epoch
+        result = await self._call_api_tool("get_file_contents_batch", {"file_list": missing})
+        contents = {_normalize_pvf_path(k): v for k, v in _extract_contents_map(result).items()}
+        
+        def parse_all() -> Dict[str, Any]:
+            return {
+                path: _parse_script(contents[_normalize_pvf_path(path)])
+                for path in missing if _normalize_pvf_path(path) in contents
+            }
+        
+        parsed = await asyncio.to_thread(parse_all)
+        for path, doc in parsed.items():
+            self.script_cache.put(_normalize_pvf_path(path), doc, epoch)
+        docs.update(parsed)
+        return docs, [p for p in missing if p not in parsed]
+    
+    async def _query_scripts(self, arguments: dict) -> dict:
+        """按标签条件筛选脚本文件并投影指定字段"""
+        started = time.monotonic()
+        paths = list(arguments.get("file_paths") or [])
+        file_type = arguments.get("file_type", "")
+        for dir_name in arguments.get("dir_names") or []:
+            listing = await self._call_api_tool("get_file_list", {"dir_name": dir_name, "file_type": file_type})
+            if isinstance(listing, dict) and listing.get("IsError"):
+                return listing
+            paths.extend(_extract_path_list(listing))
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            raise Exception("需要提供file_paths或dir_names")
+        
+        where = arguments.get("where") or []
+        fields = arguments.get("fields") or []
+        limit = int(arguments.get("limit", 1000))
+        docs, unreadable = await self._get_script_docs(paths)
+        matches = []
+        matched = 0
+        for path in paths:
+            doc = docs.get(path)
+            if doc is None or not all(_match_predicate(doc, p) for p in where):
+                continue
+            matched += 1
+            if len(matches) < limit:
+                matches.append({"path": path, **_project_fields(doc, fields)} if fields else path)
+        return {
+            "Data": {
+                "scanned": len(paths),
+                "matched": matched,
+                "truncated": matched > len(matches),
+                "results": matches,
+                "unreadable": unreadable,
+                "seconds": round(time.monotonic() - started, 3)
+            },
+            "IsError": False,
+            "Msg": None
+        }
+    
+    @staticmethod
+    def _load_manifest(root: str) -> Dict[str, Any]:
+        """读取镜像清单，不存在时返回空清单"""
+        try:
+            with open(os.path.join(root, MIRROR_MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"files": {}}
+    
+    @staticmethod
+    def _save_manifest(root: str, manifest: Dict[str, Any]):
+        """原子写入镜像清单"""
+        path = os.path.join(root, MIRROR_MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+    
+    async def _sync_directory(self, arguments: dict) -> dict:
+        """sync_directory：将封包目录镜像到本地(pull)或将本地修改写回封包(push)"""
+        started = time.monotonic()
+        root = os.path.abspath(arguments.get("local_dir", ""))
+        if not arguments.get("local_dir"):
+            raise Exception("需要提供local_dir")
+        os.makedirs(root, exist_ok=True)
+        manifest = await asyncio.to_thread(self._load_manifest, root)
+        mode = arguments.get("mode", "pull")
+        if mode == "pull":
+            summary = await self._mirror_pull(root, manifest, arguments)
+        elif mode == "push":
+            summary = await self._mirror_push(root, manifest, arguments)
+        else:
+            raise Exception(f"未知的同步模式: {mode}")
+        if not arguments.get("dry_run"):
+            await asyncio.to_thread(self._save_manifest, root, manifest)
+        conflicts = summary.get("conflicts", [])
+        summary["conflicts"] = conflicts[:100]
+        summary["conflict_count"] = len(conflicts)
+        summary["seconds"] = round(time.monotonic() - started, 3)
+        return {"Data": {"mode": mode, "local_dir": root, **summary}, "IsError": False, "Msg": None}
+    
+    async def _mirror_pull(self, root: str, manifest: Dict[str, Any], arguments: dict) -> Dict[str, Any]:
+        """
+        拉取封包目录到本地镜像
+        
+        启用离线读取时按封包CRC跳过未变化的文件，否则读取全部内容并按SHA-1比较，只写入有变化的文件；
+        本地修改过且上游也有变化的文件记为冲突，不覆盖
+        """
+        dir_names = arguments.get("dir_names") or manifest.get("dir_names") or []
+        if not dir_names:
+            raise Exception("需要提供dir_names")
+        file_type = arguments.get("file_type", manifest.get("file_type", ""))
+        dry_run = bool(arguments.get("dry_run"))
+        files: Dict[str, Dict[str, Any]] = manifest.setdefault("files", {})
+        
+        listed: List[str] = []
+        for dir_name in dir_names:
+            listing = await self._call_api_tool("get_file_list", {"dir_name": dir_name, "file_type": file_type})
+            if isinstance(listing, dict) and listing.get("IsError"):
+                raise Exception(f"获取文件列表失败 {dir_name}: {listing.get('Msg')}")
+            listed.extend(_extract_path_list(listing))
+        listed = list(dict.fromkeys(listed))
+        
+        pack = await self._get_offline_pack() if self.offline_pvf else None
+        if pack is not None and manifest.get("pack_path") != pack.pack_path:
+            # 清单中的CRC来自其它封包，不能用于比较
+            for entry in files.values():
+                entry["crc"] = None
+        # 本地已删除的文件即使上游未变化也重新拉取
+        absent = await asyncio.to_thread(lambda: {
+            key for key, entry in files.items() if not os.path.exists(_mirror_path(root, entry["path"]))
+        })
+        to_fetch = []
+        crcs: Dict[str, Optional[int]] = {}
+        for path in listed:
+            key = _normalize_pvf_path(path)
+            crc = pack.crc(path) if pack is not None and key not in self._offline_dirty else None
+            crcs[key] = crc
+            previous = files.get(key)
+            if previous is None or crc is None or previous.get("crc") != crc or key in absent:
+                to_fetch.append(path)
+        
+        summary = {"listed": len(listed), "fetched": 0, "written": 0, "unchanged": 0, "deleted": 0,
+                   "unreadable": 0, "conflicts": []}
+        summary["unchanged"] = len(listed) - len(to_fetch)
+        
+        def apply_group(contents: Dict[str, str], group: List[str]):
+            for path in group:
+                key = _normalize_pvf_path(path)
+                content = contents.get(key)
+                if content is None:
+                    summary["unreadable"] += 1
+                    continue
+                digest = _content_hash(content)
+                previous = files.get(key)
+                if previous is not None and previous["sha1"] == digest and key not in absent:
+                    previous["crc"] = crcs.get(key)
+                    summary["unchanged"] += 1
+                    continue
+                local = _mirror_path(root, path)
+                if previous is not None and _local_modified(local, previous["sha1"]):
+                    summary["conflicts"].append(path)
+                    continue
+                if not dry_run:
+                    _write_local_text(local, content)
+                    files[key] = {"path": path, "sha1": digest, "crc": crcs.get(key)}
+                summary["written"] += 1
+        
+        for index in range(0, len(to_fetch), DEFAULT_SYNC_GROUP_SIZE):
+            group = to_fetch[index:index + DEFAULT_SYNC_GROUP_SIZE]
+            result = await self._read_contents_upstream(group)
+            contents = {_normalize_pvf_path(k): v for k, v in _extract_contents_map(result).items()}
+            summary["fetched"] += len(contents)
+            await asyncio.to_thread(apply_group, contents, group)
+            del result, contents
+        
+        # 上游已删除的文件：本地未修改时删除，否则记为冲突
+        prefixes = tuple(_mirror_prefix(d) for d in dir_names)
+        suffix = (file_type or "").lower()
+        present = {_normalize_pvf_path(p) for p in listed}
+        removed = [key for key in files
+                   if key.startswith(prefixes) and key.endswith(suffix) and key not in present]
+        if removed and arguments.get("delete", True):
+            def delete_local():
+                for key in removed:
+                    local = _mirror_path(root, files[key]["path"])
+                    modified = _local_modified(local, files[key]["sha1"])
+                    if modified:
+                        summary["conflicts"].append(files[key]["path"])
+                        continue
+                    if not dry_run:
+                        if modified is not None:
+                            os.remove(local)
+                        del files[key]
+                    summary["deleted"] += 1
+            
+            await asyncio.to_thread(delete_local)
+        
+        if not dry_run:
+            manifest.update({
+                "pack_path": pack.pack_path if pack is not None else self._pack_path,
+                "dir_names": dir_names,
+                "file_type": file_type,
+                "synced_at": time.strftime("%Y-%m-%d %H:%M:%S")
+            })
+        return summary
+    
+    async def _mirror_push(self, root: str, manifest: Dict[str, Any], arguments: dict) -> Dict[str, Any]:
+        """
+        将镜像中本地修改或新增的文件通过import_files_batch写回封包
+        
+        写回前确认上游内容仍与清单一致，上游已变化的文件记为冲突(force为true时仍写回)
+        """
+        files: Dict[str, Dict[str, Any]] = manifest.get("files", {})
+        dir_names = manifest.get("dir_names") or []
+        if not files or not dir_names:
+            raise Exception("镜像清单为空，请先使用pull模式同步")
+        file_type = (manifest.get("file_type") or "").lower()
+        dry_run = bool(arguments.get("dry_run"))
+        
+        def scan() -> Tuple[List[Tuple[str, str, str]], List[str], List[Dict[str, str]]]:
+            """返回 (修改/新增的 (PVF路径, 内容, 摘要))、本地已删除的键及无法读取的文件"""
+            changed = []
+            errors = []
+            seen = set()
+            for dir_name in dir_names:
+                base = _mirror_path(root, dir_name) if _mirror_prefix(dir_name) else root
+                for dirpath, _, filenames in os.walk(base):
+                    for filename in filenames:
+                        local = os.path.join(dirpath, filename)
+                        path = os.path.relpath(local, root).replace(os.sep, "/")
+                        key = _normalize_pvf_path(path)
+                        if key in seen or key.startswith(MIRROR_MANIFEST.lower()):
+                            continue
+                        if file_type and not key.endswith(file_type):
+                            continue
+                        seen.add(key)
+                        try:
+                            content = _read_local_text(local)
+                        except UnicodeDecodeError as e:
+                            errors.append({"path": path, "error": f"不是UTF-8编码的文本: {e}"})
+                            continue
+                        if content is None:
+                            seen.discard(key)
+                            continue
+                        digest = _content_hash(content)
+                        previous = files.get(key)
+                        if previous is None or previous["sha1"] != digest:
+                            changed.append((previous["path"] if previous else path, content, digest))
+            prefixes = tuple(_mirror_prefix(d) for d in dir_names)
+            missing = [key for key in files if key.startswith(prefixes) and key not in seen]
+            return changed, missing, errors
+        
+        changed, missing, errors = await asyncio.to_thread(scan)
+        summary = {"changed": len(changed), "pushed": 0, "deleted": 0, "failed": len(errors), "conflicts": [],
+                   "errors": errors[:100]}
+        
+        if not arguments.get("force") and changed:
+            existing = [path for path, _, _ in changed if _normalize_pvf_path(path) in files]
+            remote = {}
+            for index in range(0, len(existing), DEFAULT_SYNC_GROUP_SIZE):
+                result = await self._read_contents_upstream(existing[index:index + DEFAULT_SYNC_GROUP_SIZE])
+                remote.update({_normalize_pvf_path(k): v for k, v in _extract_contents_map(result).items()})
+            kept = []
+            for path, content, digest in changed:
+                key = _normalize_pvf_path(path)
+                if key in files and (key not in remote or _content_hash(remote[key]) != files[key]["sha1"]):
+                    summary["conflicts"].append(path)
+                else:
+                    kept.append((path, content, digest))
+            changed = kept
+        
+        if dry_run:
+            summary["pushed"] = len(changed)
+            summary["deleted"] = len(missing) if arguments.get("delete") else 0
+            return summary
+        
+        for index in range(0, len(changed), DEFAULT_SYNC_GROUP_SIZE):
+            group = changed[index:index + DEFAULT_SYNC_GROUP_SIZE]
+            result = await self._call_api_tool("import_files_batch", {
+                "files": [{"FilePath": path, "FileContent": content} for path, content, _ in group]
+            })
+            failed = set()
+            if isinstance(result, dict) and result.get("IsError"):
+                chunk_errors = result.get("ChunkErrors")
+                if not chunk_errors:
+                    summary["failed"] += len(group)
+                    continue
+                for error in chunk_errors:
+                    failed.update(range(error["start"], error["start"] + error["count"]))
+            for position, (path, _, digest) in enumerate(group):
+                if position in failed:
+                    summary["failed"] += 1
+                else:
+                    # 写回后封包中的CRC未知，下次pull时重新比较内容
+                    files[_normalize_pvf_path(path)] = {"path": path, "sha1": digest, "crc": None}
+                    summary["pushed"] += 1
+        
+        if missing and arguments.get("delete"):
+            paths = [files[key]["path"] for key in missing]
+            result = await self._call_api_tool("delete_files_batch", {"file_paths": paths})
+            if isinstance(result, dict) and result.get("IsError"):
+                summary["failed"] += len(paths)
+            else:
+                for key in missing:
+                    del files[key]
+                summary["deleted"] = len(missing)
+        return summary
+    
+    async def _edit_files_batch(self, arguments: dict) -> dict:
+        """批量编辑事务：由WebApi读取原文件，本地修改，仅上传有变化的文件，上传失败时用原内容回滚"""
+        started = time.monotonic()
+        paths = list(dict.fromkeys(arguments.get("file_paths", [])))
+        field_patches = arguments.get("field_patches") or []
+        pattern = None
+        if arguments.get("pattern"):
+            source = arguments["pattern"] if arguments.get("is_regex") else re.escape(arguments["pattern"])
+            try:
+                pattern = re.compile(source, re.IGNORECASE if arguments.get("ignore_case") else 0)
+            except re.error as e:
+                raise Exception(f"正则表达式无效: {e}")
+        if pattern is None and not field_patches:
+            raise Exception("需要提供pattern或field_patches")
+        replacement = arguments.get("replacement", "")
+        if pattern is not None and not arguments.get("is_regex"):
+            replacement = replacement.replace("\\", "\\\\")
+        
+        # 编辑前内容同时是回滚的基准，直接读取WebApi，不使用内容缓存和离线反编译的文本
+        result = await self._read_contents_upstream(paths)
+        contents = {_normalize_pvf_path(k): v for k, v in _extract_contents_map(result).items()}
+        unreadable = [p for p in paths if _normalize_pvf_path(p) not in contents]
+        if unreadable:
+            return {
+                "Data": {"unreadable": unreadable},
+                "IsError": True,
+                "Msg": f"{len(unreadable)} 个文件读取失败，未做任何修改"
+            }
+        
+        def apply_all() -> List[Tuple[str, str, str, int]]:
+            edits = []
+            for path in paths:
+                old = contents[_normalize_pvf_path(path)]
+                new, changes = _apply_file_edit(old, pattern, replacement, int(arguments.get("count", 0)),
+                                                field_patches)
+                if new != old:
+                    edits.append((path, old, new, changes))
+            return edits
+        
+        edits = await asyncio.to_thread(apply_all)
+        diff_lines = int(arguments.get("diff_lines", 10))
+        summary = {
+            "files": len(paths),
+            "changed": len(edits),
+            "unchanged": len(paths) - len(edits),
+            "uploaded_bytes": sum(len(new.encode("utf-8")) for _, _, new, _ in edits),
+            "changes": [
+                {"path": path, "changes": changes, "diff": _summarize_diff(old, new, diff_lines)}
+                for path, old, new, changes in edits
+            ],
+            "dry_run": bool(arguments.get("dry_run")),
+            "rolled_back": False
+        }
+        if not edits or arguments.get("dry_run"):
+            summary["seconds"] = round(time.monotonic() - started, 3)
+            return {"Data": summary, "IsError": False, "Msg": None}
+        
+        error = None
+        try:
+            written = await self._call_api_tool("import_files_batch", {
+                "files": [{"FilePath": path, "FileContent": new} for path, _, new, _ in edits]
+            })
+            if isinstance(written, dict) and written.get("IsError"):
+                error = written.get("Msg") or "批量写入失败"
+        except Exception as e:
+            error = str(e)
+        
+        if error is not None:
+            logger.warning(f"批量编辑写入失败，回滚 {len(edits)} 个文件: {error}")
+            try:
+                restored = await self._call_api_tool("import_files_batch", {
+                    "files": [{"FilePath": path, "FileContent": old} for path, old, _, _ in edits]
+                })
+                summary["rolled_back"] = not (isinstance(restored, dict) and restored.get("IsError"))
+                if not summary["rolled_back"]:
+                    error += f"; 回滚失败: {restored.get('Msg')}"
+            except Exception as e:
+                error += f"; 回滚失败: {e}"
+        summary["seconds"] = round(time.monotonic() - started, 3)
+        return {"Data": summary, "IsError": error is not None, "Msg": error}
+    
+    async def _build_lst_index(self, include_names: bool = False) -> dict:
+        """从全部LST文件构建物品代码索引(调用方需持有_lst_index_lock)"""
+        started = time.monotonic()
+        await self._ensure_pack_current(force=True)
+        pack_path = self._pack_path
+        lst_files = _extract_path_list(await self._request_upstream("get_all_lst_file_list", {}))
+        
+        async def fetch(lst_file: str) -> dict:
+            async with self._chunk_semaphore:
+                return await self._request_upstream("get_lst_file_info", {"file_path": lst_file})
+        
+        infos = await asyncio.gather(*(fetch(f) for f in lst_files))
+        entries: Dict[str, List[Tuple[int, str]]] = {}
+        for lst_file, info in zip(lst_files, infos):
+            # LST中的路径相对于LST所在目录
+            base = _normalize_pvf_path(lst_file).rsplit("/", 1)[0] + "/" if "/" in lst_file else ""
+            items = entries.setdefault(_lst_name(lst_file), [])
+            for code, path in _extract_lst_entries(info):
+                path = path.replace("\\", "/").lstrip("/")
+                if base and not _normalize_pvf_path(path).startswith(base):
+                    path = base + path
+                items.append((code, path))
+        
+        names = None
+        if include_names:
+            paths = list(dict.fromkeys(p for items in entries.values() for _, p in items))
+            result = await self._request_upstream("get_item_infos_batch", {"file_paths": paths})
+            records = _split_batch_result(result, paths) or []
+            names = {}
+            for path, record in zip(paths, records):
+                if isinstance(record, dict):
+                    name = record.get("ItemName", record.get("Name"))
+                    if isinstance(name, str):
+                        names[path] = name
+        
+        self.lst_index.replace_all(pack_path, entries, names)
+        await asyncio.to_thread(self.lst_index.save)
+        return {
+            "Data": {"seconds": round(time.monotonic() - started, 3), **self.lst_index.stats()},
+            "IsError": False,
+            "Msg": None
+        }
+    
+    async def _ensure_lst_index(self) -> bool:
+        """确保物品代码索引对应当前封包，必要时从持久化文件加载或自动重建"""
+        index = self.lst_index
+        if not index.loaded and not index.db_path:
+            return False
+        async with self._lst_index_lock:
+            if not index.loaded:
+                await asyncio.to_thread(index.load)
+            await self._ensure_pack_current(force=self._pack_path is None)
+            if index.matches(self._pack_path):
+                return True
+            if not self.lst_index_auto:
+                return False
+            try:
+                logger.info("物品代码索引不存在或已过期，正在重建")
+                await self._build_lst_index(index.include_names)
+            except Exception as e:
+                logger.warning(f"重建物品代码索引失败: {e}")
+                return False
+            return index.matches(self._pack_path)
+    
+    async def _item_code_to_file_info_indexed(self, arguments: dict) -> dict:
+        """item_code_to_file_info：优先查本地物品代码索引"""
+        tool_name = "item_code_to_file_info"
+        code = arguments.get("item_code")
+        if isinstance(code, int) and await self._ensure_lst_index():
+            record = self.lst_index.code_record(tool_name, _split_lst_names(arguments.get("lst_names", "")), code)
+            if record is not None:
+                return {"Data": record, "IsError": False, "Msg": None, "Source": "lst_index"}
+        result = await self._request_upstream(tool_name, arguments)
+        if isinstance(result, dict) and not result.get("IsError"):
+            self.lst_index.observe_shape(tool_name, result.get("Data"))
+        return result
+    
+    async def _get_item_info_indexed(self, arguments: dict) -> dict:
+        """get_item_info：优先查本地物品代码索引"""
+        tool_name = "get_item_info"
+        if await self._ensure_lst_index():
+            record = self.lst_index.path_record(tool_name, arguments.get("file_path", ""))
+            if record is not None:
+                return {"Data": record, "IsError": False, "Msg": None, "Source": "lst_index"}
+        result = await self._request_upstream(tool_name, arguments)
+        if isinstance(result, dict) and not result.get("IsError"):
+            self.lst_index.observe_shape(tool_name, result.get("Data"))
+        return result
+    
+    async def _lookup_batch_indexed(self, tool_name: str, arguments: dict, list_arg: str, lookup, fallback) -> dict:
+        """
+        批量查询优先使用本地物品代码索引，索引未覆盖的键交给fallback处理后按顺序合并
+        
+        本地记录按上游返回的逐项记录形态输出，尚未观察到该形态时全部交给fallback
+        
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            list_arg: 键列表所在的参数名
+            lookup: 单键本地查询函数，未命中返回None
+            fallback: 处理未命中键的协程函数
+        """
+        keys = arguments.get(list_arg, [])
+        if not keys or not await self._ensure_lst_index():
+            return await fallback(arguments)
+        found = [lookup(k) for k in keys]
+        misses = list(dict.fromkeys(k for k, v in zip(keys, found) if v is None))
+        if not misses:
+            return {"Data": found, "IsError": False, "Msg": None, "Source": "lst_index"}
+        result = await fallback({**arguments, list_arg: misses})
+        values = _split_batch_result(result, misses)
+        if values is None:
+            return result
+        for value in values:
+            if _record_shape(value) is not None:
+                self.lst_index.observe_shape(tool_name, value)
+                break
+        fetched = dict(zip(misses, values))
+        return _merge_batch_response(result, keys, [v if v is not None else fetched.get(k)
+                                                    for k, v in zip(keys, found)],
+                                     isinstance(_unwrap_data(result), dict))
+    
+    async def _search_pvf(self, arguments: dict) -> dict:
+        """search_pvf：本地索引可用时本地搜索脚本内容，否则回退到pvfUtility"""
+        index = self.search_index
+        # 本地索引仅覆盖脚本内容搜索(search_type=1)
+        if arguments.get("use_local_index", True) and arguments.get("search_type", 1) == 1:
+            if not index.loaded:
+                await asyncio.to_thread(index.load)
+            if index.ready:
+                await self._ensure_pack_current(force=self._pack_path is None)
+            # 尚未确认上游返回路径列表时先由上游响应，以免本地结果形态与上游不同；
+            # 搜索目录超出建立索引时的范围时同样由上游响应
+            if index.paths_shape and not index.is_stale(self._pack_path) and \
+                    index.covers(arguments.get("search_folder", "")):
+                try:
+                    await self._refresh_search_index()
+                    return {
+                        "Data": await asyncio.to_thread(
+                            index.search,
+                            arguments.get("keyword", ""),
+                            arguments.get("search_folder", ""),
+                            arguments.get("use_regex", False),
+                            arguments.get("whole_word", False)
+                        ),
+                        "IsError": False,
+                        "Msg": None,
+                        "Source": "local_index"
+                    }
+                except Exception as e:
+                    logger.warning(f"本地索引搜索失败，回退到pvfUtility: {e}")
+        result = await self._request_upstream("search_pvf", arguments)
+        if isinstance(result, dict) and not result.get("IsError") and arguments.get("search_type", 1) == 1:
+            index.observe_result(result.get("Data"))
+        return result
+    
+    async def _refresh_search_index(self):
+        """重新拉取写入后标记为dirty的文件并更新索引"""
+        index = self.search_index
+        if not index.dirty:
+            return
+        # 先取出dirty：读取期间的新写入重新标记，留给下次刷新
+        taken = dict(index.dirty)
+        index.dirty.clear()
+        dirty = sorted(taken.values())
+        try:
+            result = await self._read_contents_upstream(dirty)
+            if isinstance(result, dict) and result.get("IsError"):
+                raise Exception(result.get("Msg") or "刷新索引内容失败")
+        except BaseException:
+            index.restore_dirty(taken)
+            raise
+        fetched = {_normalize_pvf_path(p): c for p, c in _extract_contents_map(result).items()}
+        # 分词、压缩及写入SQLite在线程中执行，不阻塞事件循环
+        await asyncio.to_thread(index.apply_updates, {p: fetched.get(_normalize_pvf_path(p)) for p in dirty})
+    
+    async def _ensure_pack_current(self, force: bool = False):
+        """按间隔校验当前载入的封包，必要时清空缓存"""
+        if not force and self.pack_check_interval <= 0:
+            return
+        if not force and time.monotonic() - self._last_pack_check < self.pack_check_interval:
+            return
+        try:
+            result = await self._request_upstream("get_pvf_pack_file_path", {})
+        except Exception as e:
+            logger.warning(f"校验封包路径失败: {e}")
+            return
+        self._observe_pack_path(result)
+    
+    async def _request_upstream(self, tool_name: str, arguments: dict) -> dict:
+        """向pvfUtility WebApi发送请求，超大批量请求自动分块并发"""
+        list_arg = BATCH_LIST_ARGS.get(tool_name)
+        if list_arg and self.batch_chunk_size > 0:
+            items = arguments.get(list_arg) or []
+            if len(items) > self.batch_chunk_size:
+                return await self._request_chunked(tool_name, arguments, list_arg, items)
+        return await self._send_request(tool_name, arguments)
+    
+    async def _read_contents_upstream(self, file_list: List[str]) -> dict:
+        """
+        直接由WebApi批量读取文件内容，绕过内容缓存和离线读取器
+        
+        用作写回、回滚、镜像清单和搜索索引的基准内容，保证与pvfUtility反编译的文本一致
+        """
+        if self._pending_writes:
+            await self._flush_writes()
+        token = _UPSTREAM_ONLY.set(True)
+        try:
+            return await self._request_upstream("get_file_contents_batch", {"file_list": file_list})
+        finally:
+            _UPSTREAM_ONLY.reset(token)
+    
+    async def _request_chunked(self, tool_name: str, arguments: dict, list_arg: str,
+                               items: List[Any]) -> dict:
+        """
+        将批量请求按batch_chunk_size分块，以有限并发发送并按顺序合并
+        
+        Args:
+            tool_name: 工具名称
+            arguments: 工具参数
+            list_arg: 键列表所在的参数名
+            items: 键列表
+        """
+        positions = None
+        if tool_name == "import_files_batch":
+            # 分块并发写入无法保证顺序，同一路径只保留最后一次写入
+            items, positions = _dedupe_import_entries(items)
+        
+        size = self.batch_chunk_size
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        
+        async def send(chunk: List[Any]) -> dict:
+            async with self._chunk_semaphore:
+                return await self._send_request(tool_name, {**arguments, list_arg: chunk})
+        
+        logger.info(f"{tool_name}: {len(items)} 条拆分为 {len(chunks)} 块，最大并发 {self.batch_concurrency}")
+        outcomes = await asyncio.gather(*(send(c) for c in chunks), return_exceptions=True)
+        return _merge_chunk_results(chunks, outcomes, positions)
+    
+    async def _read_json(self, response: aiohttp.ClientResponse) -> Tuple[Any, int]:
+        """
+        解析响应JSON，避免response.json()产生的字节、字符串两份中间副本
+        
+        超大或长度未知的响应在ijson可用时边接收边解析，不缓存完整响应体
+        
+        Returns:
+            (JSON对象, 响应体字节数)，增量解析且长度未知时字节数为0
+        """
+        length = response.content_length
+        if ijson is not None and self.stream_json_threshold > 0 and (
+                length is None or length >= self.stream_json_threshold):
+            async for document in ijson.items(response.content, "", use_float=True):
+                return document, length or 0
+            raise Exception("API调用失败: 响应内容为空")
+        body = await response.read()
+        return _json_loads(body), len(body)
+    
+    async def _fetch(self, method: str, url: str, timeout: aiohttp.ClientTimeout, **kwargs) -> Any:
+        """执行HTTP请求并解析JSON响应，记录接口耗时、收发字节数和错误"""
+        self.metrics.record_client_upstream(_CURRENT_CLIENT.get())
+        endpoint = url[len(self.base_url):].split("?", 1)[0]
+        started = time.perf_counter()
+        bytes_in = bytes_out = 0
+        error = True
+        self.upstream_stats["in_flight"] += 1
+        try:
+            async with self.session.request(method, url, timeout=timeout, **kwargs) as response:
+                bytes_out = int(response.request_info.headers.get("Content-Length") or 0)
+                if response.status >= 500 or response.status == 429:
+                    raise TransientUpstreamError(f"API调用失败: HTTP {response.status}")
+                if response.status != 200:
+                    raise Exception(f"API调用失败: HTTP {response.status}")
+                result, bytes_in = await self._read_json(response)
+                error = isinstance(result, dict) and bool(result.get("IsError"))
+                return result
+        finally:
+            self.upstream_stats["in_flight"] -= 1
+            self.metrics.record_endpoint(endpoint, time.perf_counter() - started, bytes_in, bytes_out, error)
+    
+    @staticmethod
+    def _timeout_class(tool_name: str) -> str:
+        """返回工具对应的超时分级"""
+        if tool_name in FAST_TOOLS:
+            return "fast"
+        if tool_name in HEAVY_TOOLS:
+            return "heavy"
+        return "default"
+    
+    @staticmethod
+    def _admission_class(tool_name: str) -> str:
+        """返回工具对应的准入分级"""
+        if tool_name == "save_as_pvf":
+            return "exclusive"
+        if tool_name in WRITE_TOOLS:
+            return "write"
+        if tool_name == "search_pvf":
+            return "search"
+        if tool_name in FAST_TOOLS:
+            return "fast"
+        if tool_name in HEAVY_TOOLS:
+            return "bulk"
+        return "read"
+    
+    @asynccontextmanager
+    async def _locked_paths(self, tool_name: str, arguments: dict):
+        """写入同一路径的请求依次执行；批量写入按排序后的路径依次加锁，避免相互等待"""
+        if tool_name in ("import_file", "delete_file"):
+            paths = [arguments.get("file_path", "")]
+        elif tool_name == "import_files_batch":
+            paths = [f.get("FilePath", "") for f in arguments.get("files") or []]
+        elif tool_name == "delete_files_batch":
+            paths = arguments.get("file_paths") or []
+        else:
+            yield
+            return
+        # 先登记全部路径的引用，等待期间锁不会被其它请求移除
+        entries = []
+        for key in sorted({_normalize_pvf_path(p) for p in paths}):
+            entry = self._path_locks.get(key)
+            if entry is None:
+                entry = self._path_locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            entries.append((key, entry))
+        acquired = 0
+        try:
+            for _, entry in entries:
+                await entry[0].acquire()
+                acquired += 1
+            yield
+        finally:
+            for index, (key, entry) in enumerate(entries):
+                if index < acquired:
+                    entry[0].release()
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._path_locks[key]
+    
+    async def _send_request(self, tool_name: str, arguments: dict) -> dict:
+        """
+        向pvfUtility WebApi发送单个请求
+        
+        相同的只读请求(工具和参数均相同)在进行中时，后续调用直接等待同一个请求的结果，
+        返回的结果对象为各调用方共享，调用方不应修改
+        """
+        if tool_name in WRITE_TOOLS:
+            return await self._send_request_now(tool_name, arguments)
+        
+        key = (tool_name, json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str),
+               _UPSTREAM_ONLY.get())
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_request_now(tool_name, arguments))
+            self._inflight[key] = task
+            
+            def _done(finished: asyncio.Task):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+                # 避免所有调用方都被取消时出现"异常未被获取"的警告
+                if not finished.cancelled():
+                    finished.exception()
+            
+            task.add_done_callback(_done)
+        else:
+            self.coalesced_requests += 1
+        # shield：单个调用方被取消不影响其它等待同一请求的调用方
+        return await asyncio.shield(task)
+    
+    async def _get_offline_pack(self) -> Optional[PvfPack]:
+        """获取离线PVF读取器，封包路径变化或文件被修改时重新打开"""
+        if self.offline_pvf == "auto":
+            await self._ensure_pack_current(force=self._pack_path is None)
+            pack_path = self._pack_path
+        else:
+            pack_path = self.offline_pvf
+        if not pack_path:
+            return None
+        pack = self._offline_pack
+        if pack is not None and pack.pack_path == pack_path and not pack.is_modified():
+            return pack
+        async with self._offline_lock:
+            pack = self._offline_pack
+            if pack is None or pack.pack_path != pack_path or pack.is_modified():
+                self._offline_pack = None
+                if pack is not None:
+                    # 旧的读取器仍在其它线程中读取时，由最后一个读取结束后关闭
+                    pack.close()
+                try:
+                    self._offline_pack = await asyncio.to_thread(PvfPack, pack_path, self.pvf_encoding)
+                    self._offline_dirty.clear()
+                    self._offline_error = None
+                except Exception as e:
+                    if self._offline_error != str(e):
+                        logger.warning(f"打开离线PVF封包失败，回退到WebApi: {e}")
+                    self._offline_error = str(e)
+            return self._offline_pack
+    
+    def _offline_answer(self, pack: PvfPack, tool_name: str, arguments: dict) -> Optional[dict]:
+        """
+        由离线读取器响应只读工具(在线程中执行)
+        
+        Returns:
+            与WebApi形态一致、以Source标记的结果；涉及已写入路径、无法在本地反编译、
+            请求了非默认编码、兼容反编译器或非默认列表格式(return_type)，或封包已关闭时返回None
+        """
+        if not pack.acquire():
+            return None
+        try:
+            return self._offline_answer_acquired(pack, tool_name, arguments)
+        finally:
+            pack.release()
+    
+    def _offline_answer_acquired(self, pack: PvfPack, tool_name: str, arguments: dict) -> Optional[dict]:
+        dirty = self._offline_dirty
+        if tool_name in ("get_file_content", "get_file_contents_batch") and (
+                arguments.get("use_compatible_decompiler")
+                or (arguments.get("encoding_type") or "UTF8").upper() != "UTF8"):
+            # 本地反编译器只实现默认输出
+            return None
+        
+        def touches_dirty_folder(folder: str) -> bool:
+            prefix = _normalize_pvf_path(folder)
+            prefix = prefix + "/" if prefix else ""
+            return any(p.startswith(prefix) for p in dirty)
+        
+        if tool_name == "get_pvf_pack_file_path":
+            if self.offline_pvf == "auto":
+                return None
+            data: Any = pack.pack_path
+        elif tool_name == "get_pvf_root_directory":
+            if dirty:
+                return None
+            data = pack.root_directories()
+        elif tool_name == "get_file_list":
+            # 只有默认的returnType返回路径字符串列表
+            if arguments.get("return_type", 0) != 0 or touches_dirty_folder(arguments.get("dir_name", "")):
+                return None
+            data = pack.list_files(arguments.get("dir_name", ""), arguments.get("file_type", ""))
+        elif tool_name == "get_all_lst_file_list":
+            if any(p.endswith(".lst") for p in dirty):
+                return None
+            data = pack.list_files("", ".lst")
+        elif tool_name == "file_exists":
+            path = arguments.get("file_path", "")
+            if _normalize_pvf_path(path) in dirty:
+                return None
+            data = pack.file_exists(path)
+        elif tool_name == "folder_exists":
+            path = arguments.get("folder_path", "")
+            if touches_dirty_folder(path):
+                return None
+            data = pack.folder_exists(path)
+        elif tool_name == "get_file_content":
+            path = arguments.get("file_path", "")
+            if _normalize_pvf_path(path) in dirty:
+                return None
+            data = pack.decompile(path)
+            if data is None:
+                return None
+        elif tool_name == "get_file_contents_batch":
+            data = {}
+            for path in arguments.get("file_list", []):
+                if _normalize_pvf_path(path) in dirty:
+                    return None
+                content = pack.decompile(path)
+                if content is None and pack.file_exists(path):
+                    return None
+                data[path] = content
+        else:
+            return None
+        return {"Data": data, "IsError": False, "Msg": None, "Source": "offline_pvf"}
+    
+    async def _send_request_now(self, tool_name: str, arguments: dict) -> dict:
+        """立即发送请求，启用离线读取时优先本地响应，否则按接口分级应用超时请求WebApi"""
+        if self.offline_pvf and tool_name in OFFLINE_TOOLS and not _UPSTREAM_ONLY.get():
+            pack = await self._get_offline_pack()
+            if pack is not None:
+                result = await asyncio.to_thread(self._offline_answer, pack, tool_name, arguments)
+                if result is not None:
+                    return result
+        timeout = self._timeouts[self._timeout_class(tool_name)]
+        try:
+            # 排队等待不计入请求超时
+            async with self._locked_paths(tool_name, arguments), \
+                    self.scheduler.slot(self._admission_class(tool_name)):
+                return await self._request_with_retry(tool_name, arguments, timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"API调用超时: {tool_name} 超过 {timeout.total} 秒未响应")
+    
+    async def _request_with_retry(self, tool_name: str, arguments: dict, timeout: aiohttp.ClientTimeout) -> dict:
+        """
+        经熔断器发送请求，只读请求遇到暂时性错误时按带抖动的指数退避重试
+        
+        写类工具(导入/删除/另存为)不重试也不对冲；重型接口超时后不再重试
+        """
+        read_only = tool_name not in WRITE_TOOLS
+        attempts = self.retries + 1 if read_only else 1
+        hedge = read_only and self.hedge_delay > 0 and tool_name not in HEAVY_TOOLS
+        for attempt in range(attempts):
+            probe = self.breaker.check()
+            try:
+                if hedge:
+                    result = await self._hedged_request(tool_name, arguments, timeout)
+                else:
+                    result = await self._http_request(tool_name, arguments, timeout)
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.release()
+                raise
+            except Exception as e:
+                if not _is_transient_error(e):
+                    # 上游可达，只是请求本身失败
+                    self.breaker.record_neutral()
+                    raise
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts or (isinstance(e, asyncio.TimeoutError) and tool_name in HEAVY_TOOLS):
+                    raise
+                delay = random.uniform(0, min(self.retry_max_backoff, self.retry_backoff * 2 ** attempt))
+                self.resilience_stats["retries"] += 1
+                logger.warning(f"{tool_name} 请求失败({type(e).__name__}: {e})，{delay:.2f} 秒后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+            else:
+                if isinstance(result, dict) and result.get("IsError"):
+                    self.breaker.record_neutral()
+                else:
+                    self.breaker.record_success()
+                return result
+    
+    async def _hedged_request(self, tool_name: str, arguments: dict, timeout: aiohttp.ClientTimeout) -> dict:
+        """
+        发送请求，超过hedge_delay未返回时并发发送第二个相同请求，返回先成功的结果并取消另一个
+        
+        第二个请求同样占用一个准入名额，没有空闲名额时不发送，继续等待第一个请求
+        """
+        first = asyncio.ensure_future(self._http_request(tool_name, arguments, timeout))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done:
+                return first.result()
+            admission = self._admission_class(tool_name)
+            if not self.scheduler.try_acquire(admission):
+                self.resilience_stats["hedge_skipped"] += 1
+                return await first
+            self.resilience_stats["hedged"] += 1
+            second = asyncio.ensure_future(self._http_request(tool_name, arguments, timeout))
+            # 在完成回调中释放：任务在开始执行前被取消时协程内的finally不会运行
+            second.add_done_callback(lambda _: self.scheduler.release(admission))
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.resilience_stats["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _http_request(self, tool_name: str, arguments: dict, timeout: aiohttp.ClientTimeout) -> dict:
+        """按接口登记表构造并执行HTTP请求"""
+        endpoint = UPSTREAM_ENDPOINTS.get(tool_name)
+        if endpoint is None:
+            raise Exception(f"未知的工具: {tool_name}")
+        
+        url = f"{self.base_url}{endpoint.path}"
+        if endpoint.params:
+            # 过滤空参数
+            params = {}
+            for name, arg, default, convert in endpoint.params:
+                value = arguments.get(arg, default)
+                if convert is not None:
+                    value = convert(value)
+                if value is not None and value != "":
+                    params[name] = value
+            if params:
+                url += "?" + urlencode(params)
+        
+        if endpoint.body is None:
+            return await self._fetch(endpoint.method, url, timeout)
+        if endpoint.text_body:
+            return await self._fetch(endpoint.method, url, timeout, data=endpoint.body(arguments),
+                                     headers={'Content-Type': 'text/plain'})
+        return await self._fetch(endpoint.method, url, timeout, json=endpoint.body(arguments))
+    
+    def _initialization_options(self) -> InitializationOptions:
+        """MCP会话初始化选项"""
+        return InitializationOptions(
+            server_name="pvfutility-mcp",
+            server_version="1.0.0",
+            capabilities=self.server.get_capabilities(
+                notification_options=NotificationOptions(),
+                experimental_capabilities={}
+            )
+        )
+    
+    async def serve_stdio(self):
+        """通过标准输入输出为单个客户端提供服务"""
+        from mcp.server.stdio import stdio_server
+        
+        async with stdio_server() as (read_stream, write_stream):
+            await self.server.run(read_stream, write_stream, self._initialization_options())
+    
+    async def serve_http(self, transport: str, host: str = DEFAULT_HTTP_HOST, port: int = DEFAULT_HTTP_PORT):
+        """
+        以长期运行的网络服务为多个客户端提供服务
+        
+        所有客户端共享同一个服务器实例，即同一连接池、缓存和索引
+        
+        Args:
+            transport: "sse"(端点 /sse 与 /messages/) 或 "streamable-http"(端点 /mcp)
+            host: 监听地址
+            port: 监听端口
+        """
+        try:
+            import uvicorn
+            from starlette.applications import Starlette
+            from starlette.routing import Mount, Route
+        except ImportError as e:
+            raise Exception(f"网络传输模式需要可选依赖组http (starlette、uvicorn): {e}")
+        
+        if transport == "sse":
+            from mcp.server.sse import SseServerTransport
+            
+            sse = SseServerTransport("/messages/")
+            
+            async def handle_sse(scope, receive, send):
+                # SSE响应由传输直接写入ASGI send，不经过Starlette的Request/Response
+                async with sse.connect_sse(scope, receive, send) as (read_stream, write_stream):
+                    await self.server.run(read_stream, write_stream, self._initialization_options())
+            
+            app = Starlette(routes=[
+                Route("/sse", endpoint=_AsgiEndpoint(handle_sse), methods=["GET"]),
+                Mount("/messages/", app=sse.handle_post_message)
+            ])
+            endpoint = "/sse"
+        elif transport == "streamable-http":
+            try:
+                from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+            except ImportError:
+                raise Exception("当前mcp版本不支持streamable-http传输，请升级mcp或使用sse")
+            import contextlib
+            
+            manager = StreamableHTTPSessionManager(app=self.server)
+            
+            @contextlib.asynccontextmanager
+            async def lifespan(_app):
+                async with manager.run():
+                    yield
+            
+            app = Starlette(routes=[Mount("/mcp", app=manager.handle_request)], lifespan=lifespan)
+            endpoint = "/mcp"
+        else:
+            raise Exception(f"未知的传输方式: {transport}")
+        
+        logger.info(f"MCP服务器以 {transport} 模式监听 http://{host}:{port}{endpoint}")
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+        await uvicorn.Server(config).serve()
+
+# 模块导入耗时(标准库、MCP及其依赖和模块自身的定义，不含延迟导入的aiohttp等)
+_IMPORT_SECONDS = time.perf_counter() - _MODULE_STARTED
+
+
+async def main():
+    """主函数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="pvfUtility WebApi MCP服务器")
+    parser.add_argument("--base-url", default="http://localhost:27000", 
+                       help="pvfUtility WebApi基础URL (默认: http://localhost:27000)")
+    parser.add_argument("--cache-max-bytes", type=int, default=DEFAULT_CACHE_MAX_BYTES,
+                       help=f"文件内容缓存上限字节数，0为禁用 (默认: {DEFAULT_CACHE_MAX_BYTES})")
+    parser.add_argument("--pack-check-interval", type=float, default=DEFAULT_PACK_CHECK_INTERVAL,
+                       help=f"缓存命中前校验封包路径的间隔秒数，0为不主动校验 (默认: {DEFAULT_PACK_CHECK_INTERVAL})")
+    parser.add_argument("--record-cache-entries", type=int, default=DEFAULT_RECORD_CACHE_ENTRIES,
+                       help=f"物品信息查询结果缓存条目上限，0为禁用 (默认: {DEFAULT_RECORD_CACHE_ENTRIES})")
+    parser.add_argument("--batch-chunk-size", type=int, default=DEFAULT_BATCH_CHUNK_SIZE,
+                       help=f"批量工具单次请求的最大条目数，0为不分块 (默认: {DEFAULT_BATCH_CHUNK_SIZE})")
+    parser.add_argument("--batch-concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY,
+                       help=f"分块请求的最大并发数 (默认: {DEFAULT_BATCH_CONCURRENCY})")
+    parser.add_argument("--search-index", default=None,
+                       help="search_pvf本地索引的持久化文件路径 (默认: 仅保存在内存中)")
+    parser.add_argument("--search-index-max-age", type=float, default=0.0,
+                       help="本地索引有效期秒数，过期后回退到pvfUtility搜索，0为不过期 (默认: 0)")
+    parser.add_argument("--lst-index", default=None,
+                       help="物品代码索引的持久化文件路径，指定后物品代码查询走本地索引并在封包变化时自动重建")
+    parser.add_argument("--ref-graph", default=None,
+                       help="引用图(build_reference_graph)的持久化文件路径，未指定时仅保存在内存中")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                       help=f"连接池总连接数上限，0为不限制 (默认: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--pool-per-host", type=int, default=DEFAULT_POOL_PER_HOST,
+                       help=f"单主机连接数上限，0为不限制 (默认: {DEFAULT_POOL_PER_HOST})")
+    parser.add_argument("--keepalive-timeout", type=float, default=DEFAULT_KEEPALIVE_TIMEOUT,
+                       help=f"空闲连接保活秒数 (默认: {DEFAULT_KEEPALIVE_TIMEOUT})")
+    parser.add_argument("--dns-cache-ttl", type=int, default=DEFAULT_DNS_CACHE_TTL,
+                       help=f"DNS缓存秒数，0为禁用 (默认: {DEFAULT_DNS_CACHE_TTL})")
+    parser.add_argument("--fast-timeout", type=float, default=DEFAULT_FAST_TIMEOUT,
+                       help=f"元数据类接口(FileIsExists/getVersion等)超时秒数，0为不限制 (默认: {DEFAULT_FAST_TIMEOUT})")
+    parser.add_argument("--request-timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                       help=f"普通接口超时秒数，0为不限制 (默认: {DEFAULT_REQUEST_TIMEOUT})")
+    parser.add_argument("--heavy-timeout", type=float, default=DEFAULT_HEAVY_TIMEOUT,
+                       help=f"搜索/另存为/批量读写接口超时秒数，0为不限制 (默认: {DEFAULT_HEAVY_TIMEOUT})")
+    parser.add_argument("--stream-json-threshold", type=int, default=DEFAULT_STREAM_JSON_THRESHOLD,
+                       help=f"响应超过该字节数时使用ijson增量解析，0为禁用 (默认: {DEFAULT_STREAM_JSON_THRESHOLD})")
+    parser.add_argument("--compact-json", action="store_true",
+                       help="工具结果输出紧凑JSON，不使用缩进")
+    parser.add_argument("--output-mode", choices=list(OUTPUT_MODES), default=None,
+                       help="工具结果的默认输出格式，调用时可用output_mode参数覆盖 (默认: pretty，指定--compact-json时为compact)")
+    parser.add_argument("--embed-threshold", type=int, default=DEFAULT_EMBED_THRESHOLD,
+                       help=f"gzip/msgpack格式下结果超过该字节数时以内嵌资源返回 (默认: {DEFAULT_EMBED_THRESHOLD})")
+    parser.add_argument("--result-ttl", type=float, default=DEFAULT_RESULT_TTL,
+                       help=f"分页结果集有效期秒数 (默认: {DEFAULT_RESULT_TTL})")
+    parser.add_argument("--result-sets", type=int, default=DEFAULT_RESULT_SETS,
+                       help=f"同时保留的分页结果集数量上限 (默认: {DEFAULT_RESULT_SETS})")
+    parser.add_argument("--offline-pvf", default=None,
+                       help="直接读取的.pvf文件路径，只读工具无需pvfUtility WebApi；auto表示读取pvfUtility当前载入的封包")
+    parser.add_argument("--pvf-encoding", default="cp950",
+                       help="离线读取时封包字符串的编码，可为Python编码名或TW/CN/KR/JP (默认: cp950)")
+    parser.add_argument("--write-behind", action="store_true",
+                       help="缓冲import_file/delete_file，合并同一路径的重复写入并以批量请求提交")
+    parser.add_argument("--write-batch-size", type=int, default=DEFAULT_WRITE_BATCH_SIZE,
+                       help=f"写缓冲达到该条目数时立即提交 (默认: {DEFAULT_WRITE_BATCH_SIZE})")
+    parser.add_argument("--write-delay", type=float, default=DEFAULT_WRITE_DELAY,
+                       help=f"写缓冲最长等待秒数 (默认: {DEFAULT_WRITE_DELAY})")
+    parser.add_argument("--stats-file", default=None,
+                       help="退出时将运行统计(get_server_stats)写入该JSON文件")
+    parser.add_argument("--profile-tools", default="",
+                       help="使用cProfile分析的工具名，逗号分隔，all表示全部工具；只统计工具协程自身的执行，"
+                            "结果通过get_server_stats查看")
+    parser.add_argument("--sample-interval", type=float, default=0.0,
+                       help="采样分析器的采样间隔毫秒数，开销低可在生产环境常开，0为禁用 (默认: 0)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                       help=f"只读请求遇到连接错误、超时或5xx时的最大重试次数 (默认: {DEFAULT_RETRIES})")
+    parser.add_argument("--retry-backoff", type=float, default=DEFAULT_RETRY_BACKOFF,
+                       help=f"重试退避基数秒数，按指数增长并随机抖动 (默认: {DEFAULT_RETRY_BACKOFF})")
+    parser.add_argument("--retry-max-backoff", type=float, default=DEFAULT_RETRY_MAX_BACKOFF,
+                       help=f"单次重试等待上限秒数 (默认: {DEFAULT_RETRY_MAX_BACKOFF})")
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD,
+                       help=f"连续失败多少次后熔断，0为禁用 (默认: {DEFAULT_BREAKER_THRESHOLD})")
+    parser.add_argument("--breaker-reset", type=float, default=DEFAULT_BREAKER_RESET,
+                       help=f"熔断冷却秒数 (默认: {DEFAULT_BREAKER_RESET})")
+    parser.add_argument("--hedge-delay", type=float, default=0.0,
+                       help="只读请求超过该秒数未返回时发送对冲请求，0为禁用 (默认: 0)")
+    parser.add_argument("--background-startup", action=argparse.BooleanOptionalAction, default=True,
+                       help="在后台导入aiohttp并建立会话，不阻塞MCP握手；--no-background-startup在握手前完成 (默认: 启用)")
+    parser.add_argument("--warm-up", action="store_true",
+                       help="启动后在后台预取版本号、根目录、LST列表和字符串表")
+    parser.add_argument("--transport", choices=["stdio", "sse", "streamable-http"], default="stdio",
+                       help="传输方式：stdio为每个客户端单独启动进程；sse/streamable-http为多个客户端共享一个服务进程 (默认: stdio)")
+    parser.add_argument("--host", default=DEFAULT_HTTP_HOST,
+                       help=f"网络传输模式的监听地址 (默认: {DEFAULT_HTTP_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_HTTP_PORT,
+                       help=f"网络传输模式的监听端口 (默认: {DEFAULT_HTTP_PORT})")
+    parser.add_argument("--upstream-concurrency", type=int, default=0,
+                       help="同时发往pvfUtility WebApi的最大请求数，所有客户端共享，0为仅受连接池限制 (默认: 0)")
+    parser.add_argument("--admission-limits", default="",
+                       help="各准入分级的并发上限，如 fast=16,write=4,read=8,bulk=4,search=1，0为不限制，未指定的分级使用默认值")
+    args = parser.parse_args()
+    
+    admission_limits = dict(DEFAULT_ADMISSION_LIMITS)
+    for item in filter(None, (part.strip() for part in args.admission_limits.split(","))):
+        name, _, value = item.partition("=")
+        if name.strip() not in admission_limits or not value.strip().isdigit():
+            parser.error(f"无效的准入分级设置: {item}")
+        admission_limits[name.strip()] = int(value)
+    
+    async with PvfUtilityMCPServer(
+        args.base_url,
+        cache_max_bytes=args.cache_max_bytes,
+        pack_check_interval=args.pack_check_interval,
+        record_cache_entries=args.record_cache_entries,
+        batch_chunk_size=args.batch_chunk_size,
+        batch_concurrency=args.batch_concurrency,
+        search_index_path=args.search_index,
+        search_index_max_age=args.search_index_max_age,
+        lst_index_path=args.lst_index,
+        ref_graph_path=args.ref_graph,
+        pool_size=args.pool_size,
+        pool_per_host=args.pool_per_host,
+        keepalive_timeout=args.keepalive_timeout,
+        dns_cache_ttl=args.dns_cache_ttl,
+        fast_timeout=args.fast_timeout,
+        request_timeout=args.request_timeout,
+        heavy_timeout=args.heavy_timeout,
+        stream_json_threshold=args.stream_json_threshold,
+        pretty_json=not args.compact_json,
+        output_mode=args.output_mode,
+        embed_threshold=args.embed_threshold,
+        result_ttl=args.result_ttl,
+        result_sets=args.result_sets,
+        offline_pvf=args.offline_pvf,
+        pvf_encoding=args.pvf_encoding,
+        write_behind=args.write_behind,
+        write_batch_size=args.write_batch_size,
+        write_delay=args.write_delay,
+        stats_file=args.stats_file,
+        profile_tools=[t.strip() for t in args.profile_tools.split(",") if t.strip()],
+        sample_interval=args.sample_interval / 1000.0,
+        retries=args.retries,
+        retry_backoff=args.retry_backoff,
+        retry_max_backoff=args.retry_max_backoff,
+        breaker_threshold=args.breaker_threshold,
+        breaker_reset=args.breaker_reset,
+        hedge_delay=args.hedge_delay,
+        upstream_concurrency=args.upstream_concurrency,
+        admission_limits=admission_limits,
+        background_startup=args.background_startup,
+        warm_up=args.warm_up
+    ) as mcp_server:
+        # 运行MCP服务器
+        if args.transport == "stdio":
+            await mcp_server.serve_stdio()
+        else:
+            await mcp_server.serve_http(args.transport, args.host, args.port)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
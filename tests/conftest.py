@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""测试公共夹具：合成PVF封包及模拟WebApi"""
+
+import asyncio
+import struct
+import zlib
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+from benchmark_mcp_server import MockPvfUtility
+from mcp_server import PVF_KEY, PVF_SCRIPT_MAGIC, PvfUtilityMCPServer
+
+# 合成封包的字符串表，下标即字符串ID
+PACK_STRINGS = ["[name]", "Sword", "[attack]", "sword.equ", "name_key", "etc/names.str", "劍"]
+
+
+def pvf_encrypt(data: bytes, crc: int) -> bytes:
+    """逐个uint32循环左移6位后与(PVF_KEY ^ crc)异或，为_pvf_decrypt的逆运算"""
+    data += b"\x00" * (-len(data) % 4)
+    key = (PVF_KEY ^ crc) & 0xFFFFFFFF
+    out = bytearray()
+    for (word,) in struct.iter_unpack("<I", data):
+        word = ((word << 6) | (word >> 26)) & 0xFFFFFFFF
+        out += struct.pack("<I", word ^ key)
+    return bytes(out)
+
+
+def script(*units) -> bytes:
+    """由 (类型, 值) 单元组装二进制脚本，浮点值使用类型4"""
+    body = PVF_SCRIPT_MAGIC
+    for kind, value in units:
+        body += struct.pack("<Bf" if kind == 4 else "<Bi", kind, value)
+    return body
+
+
+def string_table(strings) -> bytes:
+    encoded = [s.encode("cp950") for s in strings]
+    offsets = [4 * (len(encoded) + 1)]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return struct.pack(f"<i{len(offsets)}I", len(encoded), *offsets) + b"".join(encoded)
+
+
+def build_pack(files) -> bytes:
+    """
+    按离线读取器解析的格式组装.pvf文件
+
+    Args:
+        files: [(路径, 明文数据)]
+    """
+    tree = b""
+    blocks = b""
+    for number, (path, data) in enumerate(files):
+        crc = zlib.crc32(data)
+        encoded = path.encode("cp950")
+        tree += struct.pack("<Ii", number, len(encoded)) + encoded
+        tree += struct.pack("<iIi", len(data), crc, len(blocks))
+        blocks += pvf_encrypt(data, crc)
+    tree += b"\x00" * (-len(tree) % 4)
+    tree_crc = zlib.crc32(tree)
+    uuid = b"0" * 36
+    header = struct.pack("<i", len(uuid)) + uuid + struct.pack("<iiIi", 1, len(tree), tree_crc, len(files))
+    return header + pvf_encrypt(tree, tree_crc) + blocks
+
+
+# 已知内容的小封包：装备LST、一个装备脚本、字符串链接及一个文本文件
+SMALL_PACK_FILES = [
+    ("stringtable.bin", string_table(PACK_STRINGS)),
+    ("equipment/equipment.lst", script((2, 100), (7, 3))),
+    ("Equipment/Sword.equ", script((5, 0), (7, 1), (5, 2), (2, 12), (2, -3), (4, 1.5), (9, 0), (10, 4))
+     + b"\x02\x00"),
+    ("n_string.lst", script((2, 0), (7, 5))),
+    ("etc/names.str", "name_key>劍之名\r\n".encode("cp950")),
+    ("etc/readme.txt", b"hello\r\n"),
+]
+
+
+@pytest.fixture
+def small_pack(tmp_path):
+    """写入合成封包并返回其路径"""
+    path = tmp_path / "small.pvf"
+    path.write_bytes(build_pack(SMALL_PACK_FILES))
+    return str(path)
+
+
+@asynccontextmanager
+async def serve_mock(mock):
+    """在本机随机端口上运行模拟WebApi，返回其基础URL"""
+    runner = web.AppRunner(mock.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        port = site._server.sockets[0].getsockname()[1]
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def run_with_server(test, mock=None, **server_kwargs):
+    """启动模拟WebApi及连接到它的服务器，执行 test(server, mock)"""
+    mock = mock or MockPvfUtility(files=40, file_size=256)
+
+    async def run():
+        async with serve_mock(mock) as base_url:
+            async with PvfUtilityMCPServer(base_url, **server_kwargs) as server:
+                await test(server, mock)
+
+    asyncio.run(run())
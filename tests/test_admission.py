@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""准入调度测试：分级优先级、独占请求、上游并发上限及对冲请求的名额"""
+
+import asyncio
+
+from benchmark_mcp_server import MockPvfUtility
+from conftest import run_with_server
+from mcp_server import AdmissionScheduler
+
+
+def test_admission_priority_and_exclusive():
+    async def run():
+        scheduler = AdmissionScheduler(total=1)
+        order = []
+
+        async def job(name):
+            async with scheduler.slot(name):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await scheduler.acquire("bulk")
+        tasks = [asyncio.ensure_future(job(name)) for name in ("bulk", "read", "exclusive", "fast")]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["classes"]["read"]["waiting"] == 1
+        scheduler.release("bulk")
+        await asyncio.gather(*tasks)
+        assert order == ["exclusive", "fast", "read", "bulk"]
+        assert scheduler.running_total == 0
+
+    asyncio.run(run())
+
+
+def test_admission_cancelled_waiter_is_skipped():
+    async def run():
+        scheduler = AdmissionScheduler({"read": 1})
+        await scheduler.acquire("read")
+        waiter = asyncio.ensure_future(scheduler.acquire("read"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        scheduler.release("read")
+        assert scheduler.running["read"] == 0
+        await asyncio.wait_for(scheduler.acquire("read"), 1)
+        assert scheduler.running["read"] == 1
+
+    asyncio.run(run())
+
+
+def test_upstream_concurrency_limit():
+    mock = MockPvfUtility(files=40, file_size=256, latency=0.02)
+    active = {"now": 0, "peak": 0}
+    handle = mock.handle
+
+    async def counting(request):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        try:
+            return await handle(request)
+        finally:
+            active["now"] -= 1
+
+    mock.handle = counting
+
+    async def test(server, _):
+        paths = [f"skill/skill_{i}.skl" for i in range(8)]
+        await asyncio.gather(*(server._call_api_tool("get_file_content", {"file_path": p}) for p in paths))
+        assert active["peak"] == 2
+        assert server.scheduler.stats()["classes"]["read"]["queued"] >= 6
+
+    run_with_server(test, mock, upstream_concurrency=2, cache_max_bytes=0)
+
+
+def test_hedge_needs_a_free_admission_slot():
+    async def test(server, mock):
+        await server._call_api_tool("get_file_content", {"file_path": "skill/skill_0.skl"})
+        assert server.resilience_stats["hedged"] == 0 and server.resilience_stats["hedge_skipped"] == 1
+        server.scheduler.total = 2
+        await server._call_api_tool("get_file_content", {"file_path": "skill/skill_1.skl"})
+        assert server.resilience_stats["hedged"] == 1
+        assert mock.calls["GetFileContent"] == 3
+        # 被取消的对冲请求在完成回调中归还名额
+        await asyncio.sleep(0)
+        assert server.scheduler.running_total == 0
+
+    run_with_server(test, MockPvfUtility(files=40, file_size=256, latency=0.05),
+                    upstream_concurrency=1, hedge_delay=0.01, cache_max_bytes=0)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""分块批量请求测试：分块结果按原始顺序合并，失败记录在ChunkErrors中"""
+
+from mcp_server import _dedupe_import_entries, _merge_chunk_results
+
+
+def test_merge_chunk_results_maps_errors_to_original_positions():
+    entries = [{"FilePath": "a.equ"}, {"FilePath": "b.equ"}, {"FilePath": "A.equ"}, {"FilePath": "c.equ"}]
+    deduped, positions = _dedupe_import_entries(entries)
+    assert [e["FilePath"] for e in deduped] == ["b.equ", "A.equ", "c.equ"]
+    assert positions == [1, 0, 1, 2]
+    chunks = [deduped[:2], deduped[2:]]
+    merged = _merge_chunk_results(chunks, [Exception("boom"), {"Data": ["c"], "IsError": False}], positions)
+    assert merged["Data"] == [None, None, None, "c"]
+    assert merged["IsError"] and merged["Msg"] == "1/2 个分块请求失败"
+    assert merged["ChunkErrors"] == [{"chunk": 0, "start": 0, "count": 3, "error": "boom"}]
+
+
+def test_merge_chunk_results_splits_runs_of_one_chunk():
+    deduped, positions = _dedupe_import_entries(
+        [{"FilePath": "a"}, {"FilePath": "b"}, {"FilePath": "c"}, {"FilePath": "b"}])
+    chunks = [deduped[:1], deduped[1:]]
+    merged = _merge_chunk_results(chunks, [{"Data": True}, {"Data": False, "IsError": True, "Msg": "x"}], positions)
+    # 去重后的第二块(c, b)对应原始列表的下标1至3
+    assert merged["ChunkErrors"] == [{"chunk": 1, "start": 1, "count": 3, "error": "x"}]
+    assert merged["Data"] is False and merged["Msg"] == "1/2 个分块请求失败"
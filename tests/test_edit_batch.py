@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""批量编辑测试：文本替换和标签修改"""
+
+import re
+
+from mcp_server import _apply_file_edit, _patch_script_field, _summarize_diff
+
+SCRIPT = "#PVF_File\r\n\r\n[name]\r\n\t`Sword`\r\n\r\n[minimum level]\r\n\t10\r\n\r\n[grade]\r\n\t2\r\n"
+
+
+def test_patch_script_field_keeps_blank_lines():
+    content, count = _patch_script_field(SCRIPT, "minimum level", 55)
+    assert count == 1
+    assert content == SCRIPT.replace("\t10\r\n", "\t55\r\n")
+    assert _patch_script_field(SCRIPT, "[missing]", 1) == (SCRIPT, 0)
+
+
+def test_apply_file_edit_counts_every_change():
+    content, changes = _apply_file_edit(SCRIPT, re.compile("Sword"), "Axe", 0,
+                                        [{"field": "[grade]", "value": "3"}])
+    assert changes == 2
+    assert "`Axe`" in content and "[grade]\r\n\t3\r\n" in content
+    assert _summarize_diff(SCRIPT, content, 10) == [
+        "@@ -4 +4 @@", "-\t`Sword`", "+\t`Axe`", "@@ -10 +10 @@", "-\t2", "+\t3"]
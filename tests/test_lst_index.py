@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""物品代码本地索引测试：本地结果按观察到的上游记录形态输出"""
+
+from mcp_server import LstIndex
+
+
+def build(db_path=None):
+    index = LstIndex(db_path)
+    index.replace_all("pack", {"equipment": [(100, "equipment/sword.equ")],
+                               "stackable": [(100, "stackable/potion.stk")]})
+    return index
+
+
+def test_records_follow_the_upstream_shape():
+    index = build()
+    # 尚未观察到上游形态时不在本地回答
+    assert index.code_record("item_code_to_file_info", ["equipment"], 100) is None
+    index.observe_shape("item_code_to_file_info", [{"ItemCode": 1, "FilePath": "x.equ"}])
+    assert index.code_record("item_code_to_file_info", ["equipment", "stackable"], 100) == [
+        {"ItemCode": 100, "FilePath": "equipment/sword.equ"},
+        {"ItemCode": 100, "FilePath": "stackable/potion.stk"}]
+    assert index.code_record("item_code_to_file_info", ["equipment"], 7) is None
+    # 未索引名称时无法填充ItemName，交给上游
+    index.observe_shape("get_item_info", {"ItemCode": 1, "ItemName": "x"})
+    assert index.path_record("get_item_info", "Equipment/Sword.equ") is None
+
+
+def test_record_shapes_persist(tmp_path):
+    db_path = str(tmp_path / "lst.db")
+    index = build(db_path)
+    index.observe_shape("get_item_info", {"ItemCode": 1, "FilePath": "x"})
+    index.save()
+    loaded = LstIndex(db_path)
+    assert loaded.load()
+    assert loaded.path_record("get_item_info", "equipment/sword.equ") == {
+        "ItemCode": 100, "FilePath": "equipment/sword.equ"}
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""目录镜像同步测试：以模拟WebApi作为上游拉取和写回"""
+
+import json
+import os
+
+from benchmark_mcp_server import MockPvfUtility
+from conftest import run_with_server
+
+
+async def sync(server, local_dir, **arguments):
+    result = await server._call_api_tool("sync_directory", {"local_dir": str(local_dir), **arguments})
+    assert not result["IsError"]
+    return result["Data"]
+
+
+def test_pull_restores_locally_deleted_files(tmp_path):
+    async def test(server, mock):
+        first = await sync(server, tmp_path, dir_names=["equipment"])
+        assert first["written"] == 11
+        os.remove(tmp_path / "equipment" / "equipment_3.equ")
+        second = await sync(server, tmp_path)
+        assert second["written"] == 1 and second["unchanged"] == 10
+        restored = (tmp_path / "equipment" / "equipment_3.equ").read_bytes().decode("utf-8")
+        assert restored == mock.files["equipment/equipment_3.equ"]
+
+    run_with_server(test, MockPvfUtility(files=40, file_size=256))
+
+
+def test_push_reports_non_utf8_files_and_continues(tmp_path):
+    async def test(server, mock):
+        await sync(server, tmp_path, dir_names=["skill"])
+        (tmp_path / "skill" / "skill_1.skl").write_bytes(b"\xff\xfe\x00broken")
+        (tmp_path / "skill" / "skill_2.skl").write_text("edited", encoding="utf-8")
+        pushed = await sync(server, tmp_path, mode="push")
+        assert pushed["pushed"] == 1 and pushed["failed"] == 1
+        assert [e["path"] for e in pushed["errors"]] == ["skill/skill_1.skl"]
+        assert mock.files["skill/skill_2.skl"] == "edited"
+        assert mock.files["skill/skill_1.skl"].startswith("#PVF_File")
+        # 无法读取的本地文件不视为已删除，拉取时按本地修改处理
+        pulled = await sync(server, tmp_path, delete=True)
+        assert pulled["conflicts"] == [] and pulled["deleted"] == 0
+
+    run_with_server(test)
+
+
+def test_root_directory_mirror(tmp_path):
+    async def test(server, mock):
+        pulled = await sync(server, tmp_path, dir_names=["/"], file_type=".stk")
+        assert pulled["written"] == 10
+        manifest = json.loads((tmp_path / ".pvf_manifest.json").read_text(encoding="utf-8"))
+        assert all(not key.startswith("/") for key in manifest["files"])
+        await server._call_api_tool("delete_file", {"file_path": "stackable/stackable_0.stk"})
+        assert (await sync(server, tmp_path))["deleted"] == 1
+        assert not (tmp_path / "stackable" / "stackable_0.stk").exists()
+        (tmp_path / "stackable" / "stackable_5.stk").write_text("edited", encoding="utf-8")
+        pushed = await sync(server, tmp_path, mode="push")
+        assert pushed["changed"] == 1 and pushed["pushed"] == 1 and not pushed["errors"]
+        assert mock.files["stackable/stackable_5.stk"] == "edited"
+
+    run_with_server(test)
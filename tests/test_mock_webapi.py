@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""以benchmark_mcp_server中的模拟WebApi作为上游的集成测试：分块写入、搜索索引、目录树及写缓冲"""
+
+import asyncio
+import re
+
+from benchmark_mcp_server import MockPvfUtility
+from conftest import run_with_server
+
+
+def test_chunked_import_keeps_last_write_per_path():
+    async def test(server, mock):
+        files = [{"FilePath": f"equipment/new_{i % 3}.equ", "FileContent": f"v{i}"} for i in range(7)]
+        result = await server._call_api_tool("import_files_batch", {"files": files})
+        assert result["Data"] is True and not result["IsError"]
+        assert [mock.files[f"equipment/new_{i}.equ"] for i in range(3)] == ["v6", "v4", "v5"]
+        # 去重后3个条目按每块2个分为2块
+        assert mock.calls["ImportFiles"] == 2
+
+    run_with_server(test, batch_chunk_size=2)
+
+
+def test_search_index_matches_upstream_results():
+    async def test(server, mock):
+        await server._call_api_tool("build_search_index", {})
+        queries = [
+            {"keyword": "rare"},
+            {"keyword": "RARE"},
+            {"keyword": "Item 1"},
+            {"keyword": "item 1", "whole_word": True},
+            {"keyword": "[minimum level]", "search_folder": "monster"},
+            {"keyword": r"grade\]\s+[34]", "use_regex": True},
+            {"keyword": "zz"}
+        ]
+        # 建立索引时向上游探测一次结果形态，之后的搜索直接由索引响应
+        assert mock.calls["SearchPvf"] == 1
+        for query in queries:
+            local = await server._call_api_tool("search_pvf", dict(query))
+            assert local["Source"] == "local_index"
+            upstream = await server._call_api_tool("search_pvf", {**query, "use_local_index": False})
+            expected = upstream["Data"]
+            if query.get("whole_word"):
+                # 模拟WebApi不支持全字匹配，在其结果上筛选
+                expected = [p for p in expected if re.search(r"(?<!\w)item 1(?!\w)", mock.files[p], re.I)]
+            assert local["Data"] == sorted(expected), query
+
+    run_with_server(test)
+
+
+def test_search_index_tracks_writes():
+    async def test(server, mock):
+        await server._call_api_tool("build_search_index", {})
+        await server._call_api_tool("search_pvf", {"keyword": "rare"})
+        await server._call_api_tool("import_file", {"file_path": "equipment/equipment_0.equ",
+                                                    "file_content": "[name]\r\n`Unique Needle`\r\n"})
+        await server._call_api_tool("delete_file", {"file_path": "monster/monster_1.mob"})
+        found = await server._call_api_tool("search_pvf", {"keyword": "unique needle"})
+        assert found == {"Data": ["equipment/equipment_0.equ"], "IsError": False, "Msg": None,
+                         "Source": "local_index"}
+        assert "monster/monster_1.mob" not in (await server._call_api_tool("search_pvf", {"keyword": "Item 1"}))["Data"]
+        assert not server.search_index.dirty
+
+    run_with_server(test)
+
+
+def test_search_outside_the_index_scope_goes_upstream():
+    async def test(server, mock):
+        await server._call_api_tool("build_search_index", {"dir_names": ["monster"]})
+        assert (await server._call_api_tool("search_pvf", {"keyword": "rare", "search_folder": "monster"})
+                )["Source"] == "local_index"
+        outside = await server._call_api_tool("search_pvf", {"keyword": "rare", "search_folder": "equipment"})
+        assert "Source" not in outside
+        assert outside["Data"] == [p for p, c in mock.files.items() if p.startswith("equipment") and "rare" in c]
+
+    run_with_server(test)
+
+
+class FailingContentsMock(MockPvfUtility):
+    """批量读取内容时第二次请求失败的模拟WebApi"""
+
+    async def handle(self, request):
+        if request.match_info["name"] == "GetFileContents" and self.calls.get("GetFileContents") == 1:
+            self.calls["GetFileContents"] += 1
+            return self._error("读取失败")
+        return await super().handle(request)
+
+
+def test_search_index_not_installed_after_chunk_errors():
+    async def test(server, mock):
+        result = await server._call_api_tool("build_search_index", {})
+        assert result["IsError"] and result["ChunkErrors"]
+        assert not server.search_index.ready
+        found = await server._call_api_tool("search_pvf", {"keyword": "rare"})
+        assert "Source" not in found
+
+    run_with_server(test, mock=FailingContentsMock(files=40, file_size=256), batch_chunk_size=10)
+
+
+def test_path_tree_answers_from_listing():
+    async def test(server, mock):
+        listing = await server._call_api_tool("get_file_list", {"dir_name": "equipment"})
+        assert sorted(listing["Data"]) == sorted(p for p in mock.files if p.startswith("equipment/"))
+        calls = dict(mock.calls)
+        assert (await server._call_api_tool("file_exists", {"file_path": "Equipment/equipment_3.equ"}))["Data"]
+        assert not (await server._call_api_tool("file_exists", {"file_path": "equipment/missing.equ"}))["Data"]
+        lst = await server._call_api_tool("get_file_list", {"dir_name": "equipment", "file_type": ".lst"})
+        assert lst["Data"] == ["equipment/equipment.lst"]
+        assert mock.calls == calls
+        # 未填充的目录逐个询问上游
+        assert (await server._call_api_tool("file_exists", {"file_path": "skill/skill_0.skl"}))["Data"]
+        assert mock.calls["FileIsExists"] == calls.get("FileIsExists", 0) + 1
+
+    run_with_server(test)
+
+
+def test_write_behind_reports_superseded_writes():
+    async def test(server, mock):
+        path = "stackable/stackable_2.stk"
+        first, second, third = await asyncio.gather(
+            server._call_api_tool("import_file", {"file_path": path, "file_content": "one"}),
+            server._call_api_tool("delete_file", {"file_path": path}),
+            server._call_api_tool("import_file", {"file_path": path, "file_content": "three"})
+        )
+        assert first["Data"] is False and first["WriteBehind"]["superseded"]
+        assert first["WriteBehind"]["op"] == "import" and not first["WriteBehind"]["applied"]
+        assert second["WriteBehind"]["op"] == "delete" and not second["WriteBehind"]["applied"]
+        assert third == {"Data": True, "IsError": False, "Msg": None,
+                         "WriteBehind": {"batched": 1, "superseded": False, "applied": True, "op": "import"}}
+        assert mock.files[path] == "three"
+        assert mock.calls["ImportFiles"] == 1 and "DeleteFiles" not in mock.calls
+        assert server.write_stats["superseded"] == 2
+
+    run_with_server(test, write_behind=True, write_delay=0.05)
+
+
+def test_item_code_lookup_filters_by_lst():
+    async def test(server, mock):
+        # 每个目录的LST都从10000开始编号
+        result = await server._call_api_tool("item_code_to_file_info", {"lst_names": "skill", "item_code": 10000})
+        assert result["Data"] == [{"ItemCode": 10000, "FilePath": "skill/skill_0.skl"}]
+
+    run_with_server(test)
+
+
+def test_edit_reads_pre_images_from_the_webapi():
+    async def test(server, mock):
+        path = "equipment/equipment_1.equ"
+        await server._call_api_tool("get_file_content", {"file_path": path})
+        # 绕过服务器修改上游，缓存中的内容已过期
+        mock.files[path] = "[name]\r\n\t`Item 1 v2`\r\n"
+        result = await server._call_api_tool("edit_files_batch", {"file_paths": [path], "pattern": "Item 1",
+                                                                  "replacement": "Item One"})
+        assert not result["IsError"]
+        assert mock.files[path] == "[name]\r\n\t`Item One v2`\r\n"
+
+    run_with_server(test)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""离线PVF读取器测试：解密、文件树、脚本单元解码及与WebApi结果的隔离"""
+
+import asyncio
+import os
+import random
+
+from benchmark_mcp_server import MockPvfUtility
+from conftest import PACK_STRINGS, pvf_encrypt, serve_mock
+from mcp_server import PvfPack, PvfUtilityMCPServer, _pvf_decrypt
+
+SWORD_TEXT = (
+    "#PVF_File\r\n"
+    "\r\n[name]\r\n`Sword`\r\n"
+    "\r\n[attack]\r\n12\t-3\t1.50\t"
+    "<0::name_key`劍之名`>\r\n"
+)
+
+
+def test_decrypt_known_vector():
+    # rotl6(0x12345678) ^ PVF_KEY == 0x0CB20E15
+    assert _pvf_decrypt((0x0CB20E15).to_bytes(4, "little"), 0) == (0x12345678).to_bytes(4, "little")
+    # 不足4字节的尾部不参与解密
+    assert _pvf_decrypt(b"\x01\x02\x03", 0) == b""
+
+
+def test_decrypt_matches_per_word_reference():
+    rng = random.Random(7)
+    for _ in range(20):
+        plain = bytes(rng.randrange(256) for _ in range(4 * rng.randint(1, 64)))
+        crc = rng.randrange(2 ** 32)
+        assert _pvf_decrypt(pvf_encrypt(plain, crc), crc) == plain
+
+
+def test_file_tree(small_pack):
+    pack = PvfPack(small_pack)
+    try:
+        assert pack.file_exists("equipment/sword.equ")
+        assert pack.file_exists("\\EQUIPMENT\\SWORD.EQU")
+        assert not pack.file_exists("equipment/axe.equ")
+        assert pack.folder_exists("Equipment")
+        assert pack.folder_exists("etc")
+        assert not pack.folder_exists("monster")
+        assert pack.root_directories() == ["equipment", "etc"]
+        assert pack.list_files("equipment") == ["equipment/equipment.lst", "equipment/sword.equ"]
+        assert pack.list_files("etc", ".txt") == ["etc/readme.txt"]
+        assert pack.read_raw("etc/readme.txt") == b"hello\r\n"
+    finally:
+        pack.close()
+
+
+def test_script_units(small_pack):
+    pack = PvfPack(small_pack)
+    try:
+        assert pack.strings[6] == "劍"
+        assert pack.lst_entries("equipment/equipment.lst") == {100: "sword.equ"}
+        # 不完整的尾部单元被忽略
+        assert pack.decompile("equipment/sword.equ") == SWORD_TEXT
+        assert pack.decompile("etc/readme.txt") == "hello\r\n"
+        assert pack.decompile("missing.equ") is None
+    finally:
+        pack.close()
+
+
+def test_close_waits_for_readers(small_pack):
+    pack = PvfPack(small_pack)
+    assert pack.acquire()
+    pack.close()
+    assert not pack._mmap.closed
+    assert not pack.acquire()
+    pack.release()
+    assert pack._mmap.closed and pack._file.closed
+
+
+def test_offline_answers_are_tagged_and_limited_to_defaults(small_pack):
+    server = PvfUtilityMCPServer(offline_pvf=small_pack)
+    pack = PvfPack(small_pack)
+    try:
+        result = server._offline_answer(pack, "get_file_content", {"file_path": "equipment/sword.equ"})
+        assert result == {"Data": SWORD_TEXT, "IsError": False, "Msg": None, "Source": "offline_pvf"}
+        for extra in ({"encoding_type": "KR"}, {"use_compatible_decompiler": True}):
+            for tool, args in (("get_file_content", {"file_path": "equipment/sword.equ"}),
+                               ("get_file_contents_batch", {"file_list": ["equipment/sword.equ"]})):
+                assert server._offline_answer(pack, tool, {**args, **extra}) is None
+        pack.close()
+        assert server._offline_answer(pack, "get_file_content", {"file_path": "etc/readme.txt"}) is None
+    finally:
+        pack.close()
+
+
+def test_offline_content_is_not_cached(small_pack):
+    async def run():
+        server = PvfUtilityMCPServer(offline_pvf=small_pack)
+        result = await server._get_file_content_cached({"file_path": "equipment/sword.equ"})
+        assert result["Source"] == "offline_pvf"
+        assert server.content_cache.stats()["entries"] == 0
+        batch = await server._get_file_contents_batch_cached({"file_list": ["etc/readme.txt"]})
+        assert batch["Source"] == "offline_pvf"
+        assert server.content_cache.stats()["entries"] == 0
+        server._offline_pack.close()
+
+    asyncio.run(run())
+
+
+def test_reopen_closes_previous_pack(small_pack):
+    async def run():
+        server = PvfUtilityMCPServer(offline_pvf=small_pack)
+        first = await server._get_offline_pack()
+        stat = os.stat(small_pack)
+        os.utime(small_pack, (stat.st_atime, stat.st_mtime + 10))
+        second = await server._get_offline_pack()
+        assert second is not first
+        assert first.closed and first._mmap.closed
+        second.close()
+
+    asyncio.run(run())
+
+
+def pack_mock():
+    """内容与合成封包一致的模拟WebApi：脚本为pvfUtility反编译后的文本"""
+    mock = MockPvfUtility(files=1)
+    mock.files = {"equipment/equipment.lst": "#PVF_File\r\n100\t`sword.equ`\r\n",
+                  "equipment/sword.equ": SWORD_TEXT,
+                  "n_string.lst": "#PVF_File\r\n0\t`etc/names.str`\r\n",
+                  "etc/names.str": "name_key>劍之名\r\n",
+                  "etc/readme.txt": "hello\r\n",
+                  "stringtable.bin": ""}
+    mock.lst = {"equipment/equipment.lst": {"100": "sword.equ"}, "n_string.lst": {"0": "etc/names.str"}}
+    mock.strings = list(PACK_STRINGS)
+    return mock
+
+
+# 离线读取器响应的每种工具及参数形态
+OFFLINE_CASES = [
+    ("get_pvf_root_directory", {}),
+    ("get_file_list", {"dir_name": "equipment"}),
+    ("get_file_list", {"dir_name": "etc", "file_type": ".txt"}),
+    ("get_all_lst_file_list", {}),
+    ("file_exists", {"file_path": "equipment/sword.equ"}),
+    ("file_exists", {"file_path": "equipment/missing.equ"}),
+    ("folder_exists", {"folder_path": "etc"}),
+    ("folder_exists", {"folder_path": "missing"}),
+    ("get_file_content", {"file_path": "equipment/sword.equ"}),
+    ("get_file_contents_batch", {"file_list": ["equipment/sword.equ", "etc/readme.txt"]}),
+]
+
+
+def test_offline_answers_match_the_webapi(small_pack):
+    async def run():
+        async with serve_mock(pack_mock()) as base_url:
+            async with PvfUtilityMCPServer(base_url) as server:
+                pack = PvfPack(small_pack)
+                try:
+                    for tool, args in OFFLINE_CASES:
+                        offline = server._offline_answer(pack, tool, args)
+                        upstream = await server._request_upstream(tool, dict(args))
+                        assert offline.pop("Source") == "offline_pvf"
+                        assert offline == upstream, (tool, args)
+                finally:
+                    pack.close()
+
+    asyncio.run(run())
+
+
+def test_unreproducible_shapes_are_left_to_the_webapi(small_pack):
+    server = PvfUtilityMCPServer(offline_pvf=small_pack)
+    pack = PvfPack(small_pack)
+    try:
+        for tool, args in (("get_file_list", {"dir_name": "equipment", "return_type": 1}),
+                           ("get_lst_file_info", {"file_path": "equipment/equipment.lst"}),
+                           ("get_string_table", {})):
+            assert server._offline_answer(pack, tool, args) is None, tool
+    finally:
+        pack.close()
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""工具结果输出格式测试"""
+
+import base64
+import gzip
+import json
+
+from mcp_server import PvfUtilityMCPServer
+
+
+def test_embed_threshold_counts_utf8_bytes():
+    server = PvfUtilityMCPServer(embed_threshold=1000)
+    # 约400个字符、1200字节
+    result = {"Data": "劍" * 400, "IsError": False, "Msg": None}
+    contents = server._encode_result("get_file_content", result, "gzip")
+    assert [c.type for c in contents] == ["text", "resource"]
+    summary = json.loads(contents[0].text)
+    assert summary["Bytes"] > 1000 > len(json.dumps(result, ensure_ascii=False))
+    assert json.loads(gzip.decompress(base64.b64decode(contents[1].resource.blob))) == result
+
+    small = server._encode_result("get_file_content", {"Data": "劍" * 100}, "gzip")
+    assert [c.type for c in small] == ["text"]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""目录树快照测试"""
+
+from mcp_server import PathTree
+
+
+def test_path_tree_infers_recursion():
+    tree = PathTree()
+    tree.fill("a", ["a/x.equ", "a/b/y.equ"])
+    assert tree.recursive is True
+    assert tree.file_exists("a/b/y.equ") and tree.file_exists("a/b/z.equ") is False
+    assert tree.list_files("a/b") == ["a/b/y.equ"]
+
+    tree = PathTree()
+    tree.fill("a", ["a/x.equ"])
+    assert tree.file_exists("a/b/y.equ") is None
+    tree.record_file("a/b/y.equ", True)
+    assert tree.recursive is False
+    assert tree.list_files("a") == ["a/x.equ"]
+    tree.remove_file("a/x.equ")
+    assert tree.file_exists("a/x.equ") is False and tree.list_files("a") == []
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""性能统计测试：耗时直方图及只分析被调用协程自身的cProfile"""
+
+import asyncio
+import cProfile
+import pstats
+
+from mcp_server import LatencyHistogram, _ProfiledAwaitable
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in (1, 3, 3, 40, 900):
+        histogram.record(ms / 1000, error=ms == 900)
+    stats = histogram.stats()
+    assert stats["count"] == 5 and stats["errors"] == 1
+    assert stats["p50_ms"] == 5 and stats["max_ms"] == 900
+    assert stats["buckets"] == {"<=1": 1, "<=5": 2, "<=50": 1, "<=1000": 1}
+
+
+async def profiled_work():
+    await asyncio.sleep(0.01)
+    return sum(range(1000))
+
+
+async def other_work(done):
+    while not done.is_set():
+        sum(range(1000))
+        await asyncio.sleep(0)
+
+
+def test_profile_excludes_other_coroutines():
+    async def run():
+        profiler = cProfile.Profile()
+        done = asyncio.Event()
+        other = asyncio.ensure_future(other_work(done))
+        assert await _ProfiledAwaitable(profiled_work(), profiler) == 499500
+        done.set()
+        await other
+        return {func[2] for func in pstats.Stats(profiler).stats}
+
+    functions = asyncio.run(run())
+    assert "profiled_work" in functions
+    assert "other_work" not in functions
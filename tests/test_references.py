@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""引用图测试：代码引用只在标签所属分类的LST中解析"""
+
+from benchmark_mcp_server import MockPvfUtility
+from conftest import run_with_server
+from mcp_server import LstIndex, ReferenceGraph, _extract_references
+
+DROP_SCRIPT = (
+    "#PVF_File\r\n"
+    "[item]\r\n\t100\t2\r\n"
+    "[monster]\r\n\t100\r\n"
+    "[minimum level]\r\n\t100\r\n"
+    "[effect]\r\n\t`effect/hit.ani`\r\n"
+)
+
+
+def build():
+    lst_index = LstIndex()
+    lst_index.replace_all("pack", {
+        "equipment": [(100, "equipment/sword.equ")],
+        "avatar": [(100, "avatar/hat.equ")],
+        "monster": [(100, "monster/goblin.mob")],
+        "dungeon": [(2, "dungeon/cave.dgn")]
+    })
+    graph = ReferenceGraph()
+    docs = {"dungeon/drop.dgn": _extract_references("dungeon/drop.dgn", DROP_SCRIPT)}
+    graph.replace_all("pack", ["dungeon"], docs)
+    return graph, lst_index
+
+
+def test_codes_resolve_only_in_the_tag_lst():
+    graph, lst_index = build()
+    forward = graph.forward("dungeon/drop.dgn", lst_index)
+    codes = sorted((r["tag"], r["code"], r["lst"], r["target"]) for r in forward["references"] if r["kind"] == "code")
+    # [item]下的2不在equipment/stackable中，不会按dungeon解析；avatar的100不计入
+    assert codes == [("[item]", 100, "equipment", "equipment/sword.equ"),
+                     ("[monster]", 100, "monster", "monster/goblin.mob")]
+    assert forward["unresolved_codes"] == 1
+    assert all(r["heuristic"] for r in forward["references"] if r["kind"] == "code")
+    paths = [r for r in forward["references"] if r["kind"] == "path"]
+    assert paths[0]["target"] == "dungeon/effect/hit.ani" and "heuristic" not in paths[0]
+
+
+def test_reverse_code_referrers_are_marked_heuristic():
+    graph, lst_index = build()
+    assert graph.reverse("equipment/sword.equ", lst_index)["referrers"] == [
+        {"kind": "code", "source": "dungeon/drop.dgn", "tag": "[item]", "code": 100, "lst": "equipment",
+         "heuristic": True}]
+    assert graph.reverse("avatar/hat.equ", lst_index)["referrers"] == []
+    assert graph.reverse("dungeon/cave.dgn", lst_index)["referrers"] == []
+
+
+def test_lookalike_tags_do_not_resolve():
+    script = ("#PVF_File\r\n"
+              "[box size]\r\n\t100\r\n"
+              "[dropbox]\r\n\t100\r\n"
+              "[monster level]\r\n\t100\r\n"
+              "[reward exp]\r\n\t100\r\n")
+    assert _extract_references("dungeon/lookalike.dgn", script) == ((), ())
+    paths, codes = _extract_references("dungeon/drop.dgn", "[drop item]\r\n\t100\r\n[summon monster]\r\n\t100\r\n")
+    assert codes == (("item", 100, "[drop item]"), ("monster", 100, "[summon monster]"))
+
+
+class FailingListingMock(MockPvfUtility):
+    """列出monster目录时失败的模拟WebApi"""
+
+    async def handle(self, request):
+        if request.match_info["name"] == "GetFileList" and request.query.get("dirName") == "monster":
+            return self._error("获取文件列表失败")
+        return await super().handle(request)
+
+
+def test_reference_graph_not_built_after_listing_failure():
+    async def test(server, mock):
+        result = await server._call_api_tool("build_reference_graph", {})
+        assert result["IsError"] and result["Data"]["failed_directories"] == ["monster"]
+        assert result["Data"]["files"] == 0
+        assert "GetFileContents" not in mock.calls
+
+    run_with_server(test, mock=FailingListingMock(files=40, file_size=256))
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""重试与熔断测试：以模拟WebApi作为上游"""
+
+from conftest import run_with_server
+
+
+def test_breaker_treats_upstream_errors_as_neutral():
+    async def test(server, mock):
+        server.breaker.record_failure()
+        result = await server._call_api_tool("get_file_content", {"file_path": "skill/missing.skl"})
+        assert result["IsError"]
+        # IsError既不重置连续失败计数也不计入
+        assert server.breaker.failures == 1
+        server.breaker.record_failure()
+        assert server.breaker.state == "open"
+
+    run_with_server(test, breaker_threshold=2, cache_max_bytes=0)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""search_pvf本地索引测试：候选筛选、增量更新、持久化及索引范围"""
+
+from mcp_server import SearchIndex
+
+
+def test_search_index_candidates():
+    index = SearchIndex()
+    index.replace_all("pack", {"a/x.equ": "[Name] Fireball", "a/y.equ": "firewall", "b/z.equ": "fire"})
+    assert index.search("FIRE") == ["a/x.equ", "a/y.equ", "b/z.equ"]
+    assert index.search("ball") == ["a/x.equ"]
+    assert index.search("fi", search_folder="b") == ["b/z.equ"]
+    assert index.search("fire", whole_word=True) == ["b/z.equ"]
+    index.apply_updates({"a/y.equ": None})
+    assert index.search("wall") == []
+    assert index.stats()["files"] == 2
+
+
+def test_search_index_persists(tmp_path):
+    db_path = str(tmp_path / "search.db")
+    index = SearchIndex(db_path)
+    index.replace_all("pack", {"a/x.equ": "fireball"})
+    index.observe_result(["a/x.equ"])
+    index.save()
+    index.apply_updates({"a/y.equ": "firewall"})
+
+    loaded = SearchIndex(db_path)
+    assert loaded.load() and loaded.pack_path == "pack" and loaded.paths_shape
+    assert loaded.search("fire") == ["a/x.equ", "a/y.equ"]
+
+
+def test_search_index_answers_only_its_scope():
+    index = SearchIndex()
+    assert not index.covers("")
+    index.replace_all("pack", {"monster/a.mob": "fire", "monster/boss/b.mob": "fire"}, dir_names=["Monster"])
+    assert index.covers("monster") and index.covers("monster/boss")
+    assert not index.covers("") and not index.covers("equipment") and not index.covers("monsterx")
+    index.replace_all("pack", {"monster/a.mob": "fire"}, file_type=".mob")
+    assert not index.covers("monster")
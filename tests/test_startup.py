@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""启动测试：延迟导入及后台建立会话"""
+
+import os
+import subprocess
+import sys
+
+from conftest import run_with_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_defers_optional_modules():
+    code = "import sys, mcp_server; print(sorted(m for m in ('aiohttp', 'sqlite3', 'mmap') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout
+    assert output.strip() == "[]"
+
+
+def test_background_startup_waits_for_the_session():
+    async def test(server, mock):
+        assert server.session is None
+        result = await server._call_api_tool("get_version", {})
+        assert result["Data"] == "benchmark"
+        assert "session_ready" in server.startup_times
+
+    run_with_server(test, background_startup=True)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""写缓冲测试：批量提交结果按条目分发"""
+
+import asyncio
+
+from mcp_server import PvfUtilityMCPServer
+
+
+def test_resolve_writes_applies_chunk_errors():
+    async def run():
+        server = PvfUtilityMCPServer()
+        loop = asyncio.get_running_loop()
+        entries = [{"op": "import", "futures": [(loop.create_future(), "import")]} for _ in range(3)]
+        outcome = {"Data": True, "IsError": True, "Msg": "1/2 个分块请求失败",
+                   "ChunkErrors": [{"chunk": 1, "start": 2, "count": 1, "error": "boom"}]}
+        server._resolve_writes(entries, outcome, 3)
+        results = [entry["futures"][0][0].result() for entry in entries]
+        assert [r["Data"] for r in results] == [True, True, False]
+        assert results[2]["Msg"] == "boom" and results[2]["IsError"]
+
+    asyncio.run(run())